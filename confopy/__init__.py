@@ -1 +1,3 @@
 # coding: utf-8
+
+__version__ = u"0.5.0"
@@ -8,6 +8,7 @@ Description:
 __author__  = "Oliver Zscheyge"
 __email__   = "oliverzscheyge@gmail.com"
 
+import os
 import os.path as op
 import sys
 # Hack to find packages/modules with "confopy" prefix
@@ -17,10 +18,15 @@ sys.path.append(op.split(op.dirname(op.realpath(__file__)))[:-1][0])
 import argparse as AP
 
 import confopy.config as C
+import confopy.parallel as P
+import confopy.timing as T
 from confopy.pdfextract import *
 from confopy.model import DocumentConverter
 from confopy.model.validate import validate
-from confopy.analysis import Analyzer
+from confopy.analysis import Analyzer, ReferenceStore
+from confopy.analysis.lexicon import compile_lexicon, read_wordlist
+from confopy.analysis.lookup import CachedLookup
+from confopy.analysis.spellcheck import lexicon_path
 
 from confopy.localization import load_language
 
@@ -69,25 +75,64 @@ def report(args, output=u""):
     # Convert files to Documents
     dc = DocumentConverter()
     docs = list()
-    for f in args.files:
-        if op.isfile(f):
-            if f.lower().endswith(PDF_SUFFIX):
-                doc = PDF2document(f)
-                docs.append(doc)
-            elif f.lower().endswith(XML_SUFFIX):
-                docs.extend(dc.to_Documents(f))
+    with T.timed(u"documents"):
+        pdfs = [f for f in args.files if op.isfile(f) and f.lower().endswith(PDF_SUFFIX)]
+        converted = dict(zip(pdfs, P.convert(pdfs, args.jobs, args.language)))
+        for f in args.files:
+            if op.isfile(f):
+                if f.lower().endswith(PDF_SUFFIX):
+                    docs.append(converted[f])
+                elif f.lower().endswith(XML_SUFFIX):
+                    docs.extend(dc.to_Documents(f))
 
     # Fetch and execute report
-    load_language(args.language)
+    with T.timed(u"language %s" % args.language):
+        load_language(args.language)
     analyzer = Analyzer.instance()
     rep = analyzer.get(report=args.report)
     if rep:
-        output += rep.execute(docs, args)
+        with T.timed(u"report %s" % args.report):
+            output += rep.execute(docs, args)
         pass
     else:
         output += 'No report named "%s" available!' % args.report
     return output
 
+def rebuild_reference(args, output=u""):
+    # Evaluate all metrics on all reference corpora of the language
+    load_language(args.language)
+    analyzer = Analyzer.instance(args.language)
+    metrics = [analyzer.get(metric=ID) for ID in sorted(analyzer.metrics().keys())]
+    store = ReferenceStore.instance()
+    buf = list()
+    for corp_ID in sorted(analyzer.corpora().keys()):
+        corp = analyzer.get(corpus=corp_ID)
+        values = store.rebuild(corp, metrics)
+        buf.append(u'Reference values for corpus "%s":' % corp_ID)
+        for m in metrics:
+            buf.append(u"  %s %.4f" % (m.ID.ljust(20), values[m.ID]))
+    output += u"\n".join(buf)
+    return output
+
+
+def build_lexicon(args, output=u""):
+    # Compile a word list or the words of the reference corpora
+    path = lexicon_path(args.language)
+    if args.compilelexicon != u"":
+        words = read_wordlist(args.compilelexicon)
+        source = op.abspath(args.compilelexicon)
+    else:
+        load_language(args.language)
+        analyzer = Analyzer.instance(args.language)
+        corpora = [analyzer.get(corpus=ID) for ID in sorted(analyzer.corpora().keys())]
+        words = [w for corp in corpora for w in corp.words() if w.isalpha()]
+        source = u", ".join([corp.ID for corp in corpora])
+    if not op.isdir(op.dirname(path)):
+        os.makedirs(op.dirname(path))
+    count = compile_lexicon(words, path, {u"source": source})
+    output += u"Compiled %d words of %s to %s" % (count, source, path)
+    return output
+
 
 """ MAIN
 """
@@ -109,6 +154,12 @@ def main(args):
         analyzer = Analyzer.instance(args.language)
         output = analyzer.rulelist(args.language)
 
+    elif args.rebuildreference:
+        output = rebuild_reference(args)
+
+    elif args.compilelexicon is not None:
+        output = build_lexicon(args)
+
     elif args.validate:
         output = validate(args.files)
 
@@ -116,7 +167,11 @@ def main(args):
         output = pdf2xml(args)
 
     elif args.report is not "":
-        output = report(args)
+        try:
+            output = report(args)
+        finally:
+            P.close()
+            CachedLookup.save_all()
 
 
     # Write output
@@ -128,12 +183,25 @@ def main(args):
         sys.stdout.write(output.encode("utf8"))
         sys.stdout.write(u"\n".encode("utf8"))
 
+    if T.enabled():
+        sys.stderr.write(T.summary().encode("utf8"))
+        sys.stderr.write(u"\n".encode("utf8"))
+
 
 if __name__ == "__main__":
     parser = AP.ArgumentParser(description="Language and structure checker for scientific documents.")
     parser.add_argument("files", metavar="file",
                         type=str, nargs="*",
                         help="Document file to analyze (PDF).")
+    parser.add_argument("-c", "--cohort",
+                        type=str, default=None,
+                        help="Adds the analyzed documents to a cohort (e.g. a semester) in the result store. See report \"history\".")
+    parser.add_argument("-cl", "--compilelexicon",
+                        type=str, nargs="?", const="", default=None, metavar="WORDLIST",
+                        help="Compiles a word list (UTF-8, one word per line, e.g. an expanded hunspell dictionary) or, without WORDLIST, the words of the reference corpus to the spelling lexicon of the language and exits. The lexicon replaces PyEnchant.")
+    parser.add_argument("-j", "--jobs",
+                        type=int, default=1,
+                        help="Number of worker processes for PDF extraction and metric evaluation of multiple documents. Default: 1")
     parser.add_argument("-l", "--language",
                         type=str, default=C.DEFAULT_LANG,
                         help="Language to use for PDF extraction and document analysis. Default: " + C.DEFAULT_LANG)
@@ -149,9 +217,15 @@ if __name__ == "__main__":
     parser.add_argument("-r", "--report",
                         type=str, default="",
                         help="Analyses the given document according to the specified report.")
+    parser.add_argument("-rb", "--rebuildreference",
+                        action="store_true", default=False,
+                        help="Recomputes the stored metric values of the reference corpus (e.g. TIGER) and exits.")
     parser.add_argument("-rl", "--reportlist",
                         action="store_true", default=False,
                         help="Lists all available reports by language and exits.")
+    parser.add_argument("-t", "--timing",
+                        action="store_true", default=False,
+                        help="Prints a breakdown of the run time to stderr.")
     parser.add_argument("-ul", "--rulelist",
                         action="store_true", default=False,
                         help="Lists all rules and exits.")
@@ -162,4 +236,8 @@ if __name__ == "__main__":
                         action="store_true", default=False,
                         help="Converts the PDF file(s) to Confopy XML (structure orientated).")
     args = parser.parse_args()
+    if args.cohort is not None:
+        args.cohort = args.cohort.decode("utf8")
+    if args.timing:
+        T.enable()
     main(args)
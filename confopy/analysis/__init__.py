@@ -3,6 +3,8 @@
 #from confopy.analysis.metric import *
 #from confopy.analysis.report import *
 from confopy.analysis.analyzer import *
+from confopy.analysis.context import *
+from confopy.analysis.reference import *
 #from confopy.analysis.rule import *
 from confopy.analysis.spellcheck import *
 from confopy.analysis.statistics import *
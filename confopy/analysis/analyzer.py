@@ -7,7 +7,7 @@ Description:
 '''
 
 from localizable import Localizable
-from corpus import Corpus, NO_WORDS
+from corpus import Corpus, LazyCorpus, NO_WORDS
 from metric import Metric
 from rule import Rule
 from report import Report
@@ -47,11 +47,13 @@ class Analyzer(object):
         """Registers a given metric, rule, report or corpus with the Analyzer.
         Args:
             obj: A metric, rule, report or corpus object to register.
+                 Corpora may be registered as LazyCorpus.
         """
         if isinstance(obj, Metric) or \
            isinstance(obj, Rule) or \
            isinstance(obj, Report) or \
-           isinstance(obj, Corpus):
+           isinstance(obj, Corpus) or \
+           isinstance(obj, LazyCorpus):
             lang = obj.language
             analyzer = Analyzer.instance(lang)
             analyzer._register(obj)
@@ -63,18 +65,21 @@ class Analyzer(object):
             self._rules[obj.ID] = obj
         elif isinstance(obj, Report):
             self._reports[obj.ID] = obj
-        elif isinstance(obj, Corpus):
+        elif isinstance(obj, Corpus) or isinstance(obj, LazyCorpus):
             self._corpora[obj.ID] = obj
 
-    def get(self, metric=None, rule=None, report=None, corpus=None):
+    def get(self, metric=None, rule=None, report=None, corpus=None, load=True):
         """Gets a given metric, rule, report or corpus by its ID.
         Args:
             metric: ID of the metric to get.
             rule:   ID of the rule to get.
             report: ID of the report to get.
             corpus: ID of the corpus to get.
+            load:   Construct corpora registered as LazyCorpus. Otherwise
+                    the LazyCorpus is returned if it isn't loaded yet.
         Return:
             Metric, Rule, Report or Corpus object.
+            Corpora registered as LazyCorpus are constructed on first access.
         """
         if metric:
             return self._metrics.get(metric, None)
@@ -83,7 +88,11 @@ class Analyzer(object):
         elif report:
             return self._reports.get(report, None)
         elif corpus:
-            return self._corpora.get(corpus, None)
+            corp = self._corpora.get(corpus, None)
+            if isinstance(corp, LazyCorpus) and (load or corp.loaded()):
+                corp = corp.load()
+                self._corpora[corpus] = corp
+            return corp
         return None
 
     def metrics(self):
@@ -98,6 +107,12 @@ class Analyzer(object):
         return {k: self._rules[k] for k in self._rules}
         #return {k: self._rules[k] for k in self._rules if self._rules[k].language == lang}
 
+    def corpora(self):
+        """Yields all registered corpora.
+        Not yet accessed corpora are still LazyCorpus objects.
+        """
+        return {k: self._corpora[k] for k in self._corpora}
+
     def reports(self):
         """Yields all registered reports.
         """
@@ -216,4 +231,22 @@ Reports for language "de":
     assert analyzer.reportlist(u"de") == expected_reportlist
     assert analyzer.reportlist() == expected_reportlist
 
+    print u"  Testing lazy corpus..."
+    calls = list()
+    def factory():
+        calls.append(1)
+        return Corpus(u"test-corpus", u"de")
+    analyzer.register(LazyCorpus(u"test-corpus", u"de", factory, checksum=lambda: u"abc"))
+    assert calls == []
+    lazy = analyzer.get(corpus=u"test-corpus", load=False)
+    assert isinstance(lazy, LazyCorpus)
+    assert lazy.checksum() == u"abc"
+    assert calls == []
+    corp = analyzer.get(corpus=u"test-corpus")
+    assert isinstance(corp, Corpus)
+    assert analyzer.get(corpus=u"test-corpus") is corp
+    assert analyzer.get(corpus=u"test-corpus", load=False) is corp
+    assert lazy.checksum() == u""
+    assert calls == [1]
+
     print u"Passed all tests!"
@@ -0,0 +1,227 @@
+# coding: utf-8
+'''
+File: compiled_tagger.py
+Author: Oliver Zscheyge
+Description:
+    Compiled, memory-mapped version of trained nltk backoff taggers
+    (e.g. BigramTagger with UnigramTagger backoff).
+
+    Words and tags are interned in string tables (see mmapstore.py).
+    Words are found via an open addressing hash table of word IDs.
+    Unigram stages store one tag ID per word, bigram stages the
+    (previous tag ID, tag ID) pairs of each word.
+'''
+
+import zlib
+
+import nltk
+import numpy as np
+
+from mmapstore import Interner, MappedStore, string_sections, write_store
+
+KIND = u"tagger"
+VERSION = 1
+
+NONE = -1
+# Previous tag of the first word of a sentence
+START = -1
+
+
+def _hash(encoded):
+    return zlib.crc32(encoded) & 0xffffffff
+
+def _stage_order(tagger):
+    if isinstance(tagger, nltk.UnigramTagger):
+        return 1
+    if isinstance(tagger, nltk.NgramTagger) and tagger._n == 2:
+        return 2
+    raise ValueError(u"Can't compile %s (only unigram and bigram taggers)" % type(tagger).__name__)
+
+
+def compile_tagger(tagger, path, meta=None):
+    """Writes the context --> tag tables of a trained nltk tagger and its
+    backoff taggers to a compiled tagger file.
+    Args:
+        tagger: nltk.UnigramTagger or nltk.BigramTagger, its backoff
+                taggers have to be unigram or bigram taggers, too.
+        path:   Target file.
+        meta:   JSON serializable dictionary with additional info about
+                the tagger (e.g. the corpus it was trained on).
+    Raises:
+        ValueError if tagger can't be compiled.
+    """
+    words = Interner()
+    tags = Interner()
+    orders = [_stage_order(t) for t in tagger._taggers]
+    stages = list()
+    for (t, order) in zip(tagger._taggers, orders):
+        contexts = dict()
+        for (context, tag) in t._context_to_tag.items():
+            if order == 1:
+                word = words(unicode(context))
+                contexts[word] = tags(tag)
+            else:
+                (prev, word) = context
+                prev = tags(prev[0]) if prev else START
+                contexts.setdefault(words(unicode(word)), list()).append((prev, tags(tag)))
+        stages.append(contexts)
+
+    sections = string_sections(u"words", words.strings)
+    sections.update(string_sections(u"tags", tags.strings))
+
+    size = 1
+    while size < 2 * len(words):
+        size *= 2
+    slots = np.empty(size, dtype="<i4")
+    slots.fill(NONE)
+    for (ID, word) in enumerate(words.strings):
+        i = _hash(word.encode(u"utf-8")) & (size - 1)
+        while slots[i] != NONE:
+            i = (i + 1) & (size - 1)
+        slots[i] = ID
+    sections[u"slots"] = slots
+
+    for (s, (contexts, order)) in enumerate(zip(stages, orders)):
+        prefix = u"s%d." % s
+        if order == 1:
+            col = np.empty(len(words), dtype="<i4")
+            col.fill(NONE)
+            for (word, tag) in contexts.items():
+                col[word] = tag
+            sections[prefix + u"tag"] = col
+        else:
+            offsets = np.zeros(len(words) + 1, dtype="<u4")
+            prev_col = list()
+            tag_col = list()
+            for word in xrange(len(words)):
+                for (prev, tag) in sorted(contexts.get(word, list())):
+                    prev_col.append(prev)
+                    tag_col.append(tag)
+                offsets[word + 1] = len(tag_col)
+            sections[prefix + u"offsets"] = offsets
+            sections[prefix + u"prev"] = np.array(prev_col, dtype="<i4")
+            sections[prefix + u"tag"] = np.array(tag_col, dtype="<i4")
+
+    write_store(path, KIND, VERSION, {u"orders": orders, u"source": meta or dict()}, sections)
+
+
+class CompiledTagger(object):
+    """Tagger reading a compiled tagger file. tag() yields the same
+    output as the nltk tagger the file was compiled from.
+    The tables of a word are only read on its first occurrence.
+    """
+    def __init__(self, path):
+        """Initializer.
+        Raises:
+            IOError, StoreError if path is no compiled tagger.
+        """
+        super(CompiledTagger, self).__init__()
+        store = MappedStore(path, KIND, VERSION)
+        self.meta = store.meta[u"source"]
+        self._orders = store.meta[u"orders"]
+        self._words = store.strings(u"words")
+        self._tags = store.strings(u"tags")
+        self._slots = store.array(u"slots")
+        self._stages = list()
+        for (s, order) in enumerate(self._orders):
+            names = [u"tag"] if order == 1 else [u"offsets", u"prev", u"tag"]
+            self._stages.append([store.array(u"s%d.%s" % (s, name)) for name in names])
+        self._entries = dict()
+
+    def _word_ID(self, word):
+        encoded = word.encode(u"utf-8")
+        mask = len(self._slots) - 1
+        i = _hash(encoded) & mask
+        while True:
+            ID = int(self._slots[i])
+            if ID == NONE or self._words.encoded(ID) == encoded:
+                return ID
+            i = (i + 1) & mask
+
+    def _entry(self, word):
+        """Return:
+            List of the contexts of word, one per stage: the tag (unigram
+            stages) or a dictionary previous tags --> tag like the nltk
+            tables (bigram stages).
+        """
+        entry = self._entries.get(word, None)
+        if entry is not None:
+            return entry
+        ID = self._word_ID(word)
+        entry = list()
+        for (order, arrays) in zip(self._orders, self._stages):
+            if order == 1:
+                tag = NONE if ID == NONE else int(arrays[0][ID])
+                entry.append(None if tag == NONE else self._tags[tag])
+            else:
+                contexts = dict()
+                if ID != NONE:
+                    (offsets, prevs, tags) = arrays
+                    for i in xrange(offsets[ID], offsets[ID + 1]):
+                        prev = int(prevs[i])
+                        prev = () if prev == START else (self._tags[prev], )
+                        contexts[prev] = self._tags[int(tags[i])]
+                entry.append(contexts)
+        self._entries[word] = entry
+        return entry
+
+    def tag(self, tokens):
+        """Tags a sentence.
+        Args:
+            tokens: List of words (unicode strings).
+        Return:
+            List of (word, tag) tuples, tag being None for unknown words.
+        """
+        tags = list()
+        for word in tokens:
+            tag = None
+            for (order, context) in zip(self._orders, self._entry(word)):
+                if order == 1:
+                    tag = context
+                else:
+                    tag = context.get(tuple(tags[-1:]), None)
+                if tag is not None:
+                    break
+            tags.append(tag)
+        return zip(tokens, tags)
+
+
+
+if __name__ == '__main__':
+    print u"Test for %s" % __file__
+    import os
+    import tempfile
+
+    print u"  Testing compile_tagger and CompiledTagger..."
+    train = [[(u"Der", u"ART"), (u"Hase", u"NN"), (u"springt", u"VVFIN"), (u".", u"$.")],
+             [(u"Springt", u"VVFIN"), (u"der", u"ART"), (u"Hase", u"NN"), (u"?", u"$.")],
+             [(u"Der", u"PDS"), (u"springt", u"VVFIN"), (u"über", u"APPR"), (u"den", u"ART"), (u"Bach", u"NN"), (u".", u"$.")],
+             [(u"über", u"ADV"), (u"Bach", u"NE"), (u"lacht", u"VVFIN"), (u"der", u"ART"), (u"Igel", u"NN"), (u".", u"$.")]]
+    unigram = nltk.UnigramTagger(train)
+    bigram = nltk.BigramTagger(train, backoff=unigram)
+    (fd, path) = tempfile.mkstemp()
+    os.close(fd)
+    sents = [u"Der Hase springt über den Bach .".split(),
+             u"Der springt über Bach , der Igel lacht .".split(),
+             u"über der Baum Hase Der Bach".split(),
+             [], [u"Unbekannt"]]
+    for tagger in [bigram, unigram]:
+        compile_tagger(tagger, path, {u"corpus": u"test"})
+        compiled = CompiledTagger(path)
+        assert compiled.meta == {u"corpus": u"test"}
+        for s in sents:
+            assert compiled.tag(s) == tagger.tag(s)
+            assert compiled.tag(s) == tagger.tag(s)
+    compile_tagger(bigram, path)
+    assert CompiledTagger(path).tag([u"den", u"Bach"])[1] == (u"Bach", u"NN")
+    assert CompiledTagger(path).tag([u"über", u"Bach"])[1] == (u"Bach", u"NE")
+
+    print u"  Testing unsupported taggers..."
+    try:
+        compile_tagger(nltk.TrigramTagger(train), path)
+        assert False, u"Trigram tagger compiled!"
+    except ValueError:
+        pass
+    os.remove(path)
+
+    print u"Passed all tests!"
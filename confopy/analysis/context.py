@@ -0,0 +1,241 @@
+# coding: utf-8
+'''
+File: context.py
+Author: Oliver Zscheyge
+Description:
+    Per node cache of linguistic analysis results (words, sentences,
+    POS tags, lemmata, tenses) shared by all metrics.
+'''
+
+import hashlib
+import weakref
+
+from corpus import NO_WORDS, Corpus
+from tagging import TaggingService
+
+
+class AnalysisContext(object):
+    """Computes the words, sentences, tagged words, lemmata and tenses of a
+    Node at most once.
+    Contexts are kept per node (identity) and are discarded as soon as the
+    text of the node changes (content hash) or other collaborators (corpus,
+    lemmatizer, conjugator) are given.
+    """
+
+    _contexts = weakref.WeakKeyDictionary()
+
+    @staticmethod
+    def of(node, corpus=None, lemmatizer=None, conjugator=None):
+        """Yields the AnalysisContext of a given node.
+        Args:
+            node:       The Node (or Corpus) to analyze.
+            corpus:     Corpus providing the tagger and the sentence tokenizer.
+                        May also be a function returning the corpus, which
+                        is only called if tagger or tokenizer are needed.
+            lemmatizer: Function mapping a verb to its lemma.
+            conjugator: Function mapping a verb to its list of tenses.
+            Collaborators not given (None) match those of a cached context.
+        Return:
+            AnalysisContext instance.
+        """
+        checksum = AnalysisContext.checksum(node)
+        context = AnalysisContext._contexts.get(node, None)
+        if context is None or context.checksum != checksum \
+                or not context._uses(corpus, lemmatizer, conjugator):
+            context = AnalysisContext(node, corpus, lemmatizer, conjugator, checksum)
+            AnalysisContext._contexts[node] = context
+        return context
+
+    @staticmethod
+    def checksum(node):
+        """Content hash of a node.
+        Return:
+            Hex digest (string) of the node's raw text.
+        """
+        return hashlib.md5(node.raw().encode(u"utf-8")).hexdigest()
+
+    def __init__(self, node, corpus=None, lemmatizer=None, conjugator=None, checksum=u""):
+        """Initializer. Use AnalysisContext.of(node) instead.
+        """
+        super(AnalysisContext, self).__init__()
+        self._node = weakref.ref(node)
+        self._corpus = corpus
+        self._collaborators = (corpus, lemmatizer, conjugator)
+        self.lemmatizer = lemmatizer
+        self.conjugator = conjugator
+        self.checksum = checksum
+        self._cache = dict()
+        self._lemmata = dict()
+        self._tenses = dict()
+
+    def _uses(self, corpus, lemmatizer, conjugator):
+        given = (corpus, lemmatizer, conjugator)
+        return all(g is None or g is c for (g, c) in zip(given, self._collaborators))
+
+    @property
+    def corpus(self):
+        if callable(self._corpus):
+            self._corpus = self._corpus()
+        return self._corpus
+
+    def _cached(self, key, constructor):
+        if key not in self._cache:
+            self._cache[key] = constructor()
+        return self._cache[key]
+
+    def words(self):
+        """Return:
+            List of all words (including punctuation) of the node.
+        """
+        return self._cached(u"words", lambda: self._node().words())
+
+    def content_words(self):
+        """Return:
+            List of words of the node without punctuation (see NO_WORDS).
+        """
+        return self._cached(u"content_words", lambda: [w for w in self.words() if w not in NO_WORDS])
+
+    def sents(self):
+        """Return:
+            List of sentences (lists of words) of the node.
+        """
+        return self._cached(u"sents", lambda: self._node().sents(tokenizer=self.corpus.sent_tokenizer()))
+
+    def content_sents(self):
+        """Return:
+            List of sentences without punctuation (see NO_WORDS).
+        """
+        return self._cached(u"content_sents", lambda: [[w for w in s if w not in NO_WORDS] for s in self.sents()])
+
+    def tagged_words(self):
+        """Return:
+            List of (word, tag) tuples. Uses the tagger of the corpus.
+            Document nodes are tagged sentence by sentence as part of their
+            whole document (see TaggingService), corpora sentence by
+            sentence of their own sentences.
+        """
+        def constructor():
+            node = self._node()
+            if isinstance(node, Corpus):
+                tagger = self.corpus.tagger(True)
+                return [wt for sent in node.sents() for wt in tagger.tag(sent)]
+            return TaggingService.of(self.corpus).tagged_words(node)
+        return self._cached(u"tagged_words", constructor)
+
+    def lemmas(self):
+        """Return:
+            List of lemmata in the same order as tagged_words().
+            Only verbs are reduced to their lemma, all other words are
+            kept as they are.
+        """
+        def constructor():
+            return [self.lemma(w) if is_verb(t) else w for (w, t) in self.tagged_words()]
+        return self._cached(u"lemmas", constructor)
+
+    def tenses(self):
+        """Return:
+            List of tenses in the same order as tagged_words().
+            Entries for words not being verbs are empty lists.
+        """
+        def constructor():
+            return [self.tense(w) if is_verb(t) else [] for (w, t) in self.tagged_words()]
+        return self._cached(u"tenses", constructor)
+
+    def lemma(self, word):
+        """Memoized lemmatizer call.
+        """
+        if word not in self._lemmata:
+            self._lemmata[word] = self.lemmatizer(word)
+        return self._lemmata[word]
+
+    def tense(self, word):
+        """Memoized conjugator call.
+        """
+        if word not in self._tenses:
+            self._tenses[word] = self.conjugator(word)
+        return self._tenses[word]
+
+
+def is_verb(tag):
+    """Checks whether a (STTS) POS tag denotes a verb.
+    Return:
+        Boolean.
+    """
+    return bool(tag) and tag.startswith(u"V")
+
+
+if __name__ == '__main__':
+    print u"Test for %s" % __file__
+    from confopy.model.document import Paragraph
+
+    class _Counting(object):
+        """Fake corpus counting tagger and tokenizer usage.
+        """
+        def __init__(self):
+            self.calls = 0
+        def tagger(self, include_edgelabels=True):
+            return self
+        def sent_tokenizer(self):
+            return self
+        def tag(self, words):
+            self.calls += 1
+            return [(w, u"VVFIN" if w.endswith(u"t") else u"NN") for w in words]
+        def tokenize(self, text):
+            self.calls += 1
+            return text.split(u". ")
+
+    print u"  Testing AnalysisContext caching..."
+    corp = _Counting()
+    para = Paragraph(text=u"Der Hase springt. Er lacht, oder?")
+    context = AnalysisContext.of(para, corp, lambda w: w.upper(), lambda w: [(u"present", )])
+    assert context.words() == [u"Der", u"Hase", u"springt", u".", u"Er", u"lacht", u",", u"oder", u"?"]
+    assert context.content_words() == [u"Der", u"Hase", u"springt", u"Er", u"lacht", u"oder"]
+    assert len(context.sents()) == 2
+    assert context.content_sents()[0] == [u"Der", u"Hase", u"springt"]
+    assert context.lemmas()[2] == u"SPRINGT"
+    assert context.lemmas()[1] == u"Hase"
+    assert context.tenses()[5] == [(u"present", )]
+    assert context.tenses()[0] == []
+    assert AnalysisContext.of(para, corp).tagged_words() is context.tagged_words()
+    assert corp.calls == 2
+    other = AnalysisContext.of(para, corp, lambda w: w.lower(), None)
+    assert other is not context
+    assert other.lemmas()[2] == u"springt"
+    assert AnalysisContext.of(para, _Counting()) is not other
+
+    print u"  Testing lazy corpus resolution..."
+    resolved = list()
+    def lazy_corp():
+        resolved.append(corp)
+        return corp
+    para = Paragraph(text=u"Noch ein Satz.")
+    context = AnalysisContext.of(para, lazy_corp, None, None)
+    assert context.content_words() == [u"Noch", u"ein", u"Satz"]
+    assert resolved == []
+    assert len(context.tagged_words()) == 4
+    assert len(context.sents()) == 1
+    assert resolved == [corp]
+
+    print u"  Testing corpus tagging..."
+    class _Sents(Corpus):
+        def __init__(self):
+            super(_Sents, self).__init__(u"sents", u"de")
+        def sents(self, recursive=True, tokenizer=None):
+            return [[u"Der", u"Hase", u"springt", u"."], [u"Er", u"lacht", u"."]]
+        def words(self, recursive=True, tokenizer=None):
+            return [w for s in self.sents() for w in s]
+        def raw(self):
+            return u""
+    sents_corp = _Sents()
+    calls = corp.calls
+    tagged = AnalysisContext.of(sents_corp, corp).tagged_words()
+    assert [w for (w, _) in tagged] == sents_corp.words()
+    assert tagged[2] == (u"springt", u"VVFIN")
+    assert corp.calls == calls + 2
+
+    print u"  Testing AnalysisContext invalidation..."
+    para.text = u"Neuer Text"
+    context = AnalysisContext.of(para, corp, None, None)
+    assert context.words() == [u"Neuer", u"Text"]
+
+    print u"Passed all tests!"
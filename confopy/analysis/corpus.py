@@ -9,6 +9,7 @@ Description:
 from nltk.corpus.reader.api import CorpusReader
 from localizable import Localizable
 from confopy.model import Document
+from confopy.timing import timed
 
 NO_WORDS = [
       u"."
@@ -69,3 +70,56 @@ class Corpus(Localizable, CorpusReader, Document):
         """
         return list()
 
+    def checksum(self):
+        """Returns a checksum (unicode string) identifying the corpus data.
+        Empty if the corpus can't be identified.
+        """
+        return u""
+
+
+
+class LazyCorpus(Localizable):
+    """Placeholder for a Corpus which is expensive to construct.
+    Register it with the Analyzer instead of the corpus itself: the
+    corpus is only constructed once it is requested via
+    Analyzer.get(corpus=ID).
+    """
+
+    def __init__(self, ID, language, factory, brief=u"", description=u"", checksum=None):
+        """Initializer.
+        Args:
+            ID:       ID of the corpus (unicode string).
+            language: Language code, e.g. u"de" or u"en".
+            factory:  Function without arguments constructing the Corpus.
+            checksum: Function without arguments returning the checksum of
+                      the corpus data without constructing the corpus.
+                      Optional.
+        """
+        super(LazyCorpus, self).__init__(ID, language, brief, description)
+        self._factory = factory
+        self._checksum = checksum
+        self._corpus = None
+
+    def load(self):
+        """Constructs the corpus (only on the first call).
+        Return:
+            The Corpus.
+        """
+        if self._corpus is None:
+            with timed(u"corpus %s" % self.ID):
+                self._corpus = self._factory()
+        return self._corpus
+
+    def loaded(self):
+        return self._corpus is not None
+
+    def checksum(self):
+        """Checksum of the corpus data (see Corpus.checksum). The corpus is
+        only constructed if there is no checksum function or it fails.
+        """
+        if self._corpus is None and self._checksum is not None:
+            try:
+                return self._checksum()
+            except (IOError, OSError):
+                pass
+        return self.load().checksum()
@@ -0,0 +1,148 @@
+# coding: utf-8
+'''
+File: lexicon.py
+Author: Oliver Zscheyge
+Description:
+    Compiled spelling lexicon: a memory-mapped, sorted word list
+    (see mmapstore.py) used by the SpellChecker instead of PyEnchant.
+'''
+
+import codecs
+
+from mmapstore import MappedStore, string_sections, write_store
+
+KIND = u"lexicon"
+VERSION = 1
+
+
+def read_wordlist(path):
+    """Reads a word list, e.g. a hunspell dictionary expanded with unmunch.
+    Args:
+        path: UTF-8 encoded text file, one word per line.
+    Return:
+        Generator of unicode strings.
+    """
+    with codecs.open(path, "r", u"utf-8") as f:
+        for line in f:
+            word = line.strip()
+            if word != u"":
+                yield word
+
+def compile_lexicon(words, path, meta=None):
+    """Writes a compiled lexicon.
+    Args:
+        words: Iterable of unicode strings (duplicates are dropped).
+        path:  Target file.
+        meta:  JSON serializable dictionary with additional info about
+               the source of the words.
+    Return:
+        Number of distinct words in the lexicon.
+    """
+    # Sorted by UTF-8 bytes (= code point order), the order Lexicon searches in
+    encoded = sorted(set([w.encode(u"utf-8") for w in words]))
+    strings = [w.decode(u"utf-8") for w in encoded]
+    write_store(path, KIND, VERSION, meta or dict(), string_sections(u"words", strings))
+    return len(strings)
+
+
+class Lexicon(object):
+    """Read-only view on a compiled lexicon.
+    Lookups binary search the sorted UTF-8 strings directly in the mapped
+    file, so opening a lexicon is cheap and no words are decoded.
+    """
+    def __init__(self, path):
+        """Initializer.
+        Raises:
+            IOError, StoreError if path is no compiled lexicon.
+        """
+        super(Lexicon, self).__init__()
+        store = MappedStore(path, KIND, VERSION)
+        self.meta = store.meta
+        self._words = store.strings(u"words")
+
+    def __len__(self):
+        return len(self._words)
+
+    def __contains__(self, word):
+        key = word.encode(u"utf-8")
+        encoded = self._words.encoded
+        lo = 0
+        hi = len(self._words)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            candidate = encoded(mid)
+            if candidate < key:
+                lo = mid + 1
+            elif candidate > key:
+                hi = mid
+            else:
+                return True
+        return False
+
+    def check(self, word):
+        """Checks the spelling of a word.
+        Like hunspell, capitalized (first letter or all letters) forms of
+        lower case words are accepted.
+        Args:
+            word: Unicode string.
+        Return:
+            Boolean.
+        """
+        if word in self:
+            return True
+        if word[:1].isupper():
+            if (word[0].lower() + word[1:]) in self:
+                return True
+            if word.isupper() and len(word) > 1:
+                return word.lower() in self or word.capitalize() in self
+        return False
+
+    def words(self):
+        """Return:
+            Generator of all words (unicode strings) in sorted order.
+        """
+        for i in xrange(len(self)):
+            yield self._words[i]
+
+
+
+if __name__ == '__main__':
+    print u"Test for %s" % __file__
+    import os
+    import tempfile
+
+    print u"  Testing compile_lexicon and Lexicon..."
+    (fd, wordlist) = tempfile.mkstemp()
+    os.write(fd, u"Hase\nspringen\n\n  über \nÄpfel\nHase\nzählen\nUSA\n".encode(u"utf-8"))
+    os.close(fd)
+    words = list(read_wordlist(wordlist))
+    assert words[2] == u"über"
+    (fd, path) = tempfile.mkstemp()
+    os.close(fd)
+    assert compile_lexicon(words, path, {u"source": u"test"}) == 6
+    lexicon = Lexicon(path)
+    assert lexicon.meta == {u"source": u"test"}
+    assert len(lexicon) == 6
+    assert list(lexicon.words()) == sorted(set(words))
+    for w in words:
+        assert w in lexicon
+    for w in [u"", u"A", u"Hasen", u"Apfel", u"zz", u"hase"]:
+        assert w not in lexicon
+
+    print u"  Testing Lexicon.check..."
+    assert lexicon.check(u"Hase")
+    assert lexicon.check(u"Springen")
+    assert lexicon.check(u"ÜBER")
+    assert lexicon.check(u"HASE")
+    assert lexicon.check(u"USA")
+    assert not lexicon.check(u"hase")
+    assert not lexicon.check(u"Usa")
+    assert not lexicon.check(u"Hasen")
+
+    compile_lexicon([], path)
+    assert len(Lexicon(path)) == 0
+    assert u"Hase" not in Lexicon(path)
+    os.remove(path)
+    os.remove(wordlist)
+
+    print u"Passed all tests!"
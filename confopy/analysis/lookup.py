@@ -0,0 +1,218 @@
+# coding: utf-8
+'''
+File: lookup.py
+Author: Oliver Zscheyge
+Description:
+    Bounded, persistent memoization of expensive word lookups
+    (e.g. lemmatizer and conjugator calls).
+'''
+
+import os.path as op
+from collections import OrderedDict
+from cPickle import UnpicklingError, dumps, loads
+
+import confopy.config as C
+from confopy.storage import cache_path, write_atomic
+
+_MISSING = object()
+
+
+class LRUCache(object):
+    """Dictionary keeping at most max_size entries. The least recently
+    used entries are evicted first.
+    """
+    def __init__(self, max_size):
+        super(LRUCache, self).__init__()
+        self.max_size = max_size
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key, default=None):
+        """Looks up a key and marks it as recently used.
+        """
+        value = self._entries.pop(key, _MISSING)
+        if value is _MISSING:
+            return default
+        self._entries[key] = value
+        return value
+
+    def put(self, key, value):
+        """Adds an entry as the most recently used one.
+        """
+        self._entries.pop(key, None)
+        self._entries[key] = value
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def items(self):
+        """Return:
+            List of (key, value) tuples, least recently used first.
+        """
+        return self._entries.items()
+
+
+class CachedLookup(object):
+    """Memoizes a function of a single (hashable) argument in an LRUCache
+    which is kept in the Confopy cache directory between runs.
+    Seeded entries are never evicted, so results don't depend on the
+    cache history. Stored entries are only used if they stem from the same
+    source (e.g. seed corpus and library version), otherwise the cache is
+    seeded again.
+    """
+
+    # Bump if the pickled representation changes
+    FORMAT = 2
+    SUFFIX = u".lookup.pkl"
+
+    _instances = list()
+
+    @staticmethod
+    def save_all():
+        """Stores all CachedLookups with new entries.
+        """
+        for lookup in CachedLookup._instances:
+            lookup.save()
+
+    def __init__(self, name, func, max_size=C.LOOKUP_CACHE_SIZE, seed=None, source=None):
+        """Initializer.
+        Args:
+            name:     Unique name of the lookup, used as file name.
+            func:     Function to memoize.
+            max_size: Maximum number of entries (besides seeded ones).
+            seed:     Function returning an iterable of (argument, result)
+                      tuples which take precedence over func. Called if
+                      nothing is stored yet. Optional.
+            source:   Function returning a unicode string identifying the
+                      data the results depend on (e.g. checksum of the seed
+                      corpus and version of the library func calls).
+                      Entries stored for another source are dropped.
+                      Optional.
+        """
+        super(CachedLookup, self).__init__()
+        self.name = name
+        self.func = func
+        self.max_size = max_size
+        self._seed = seed
+        self._source_func = source
+        self._source = u""
+        self._seeded = dict()
+        self._cache = None
+        self._dirty = False
+        CachedLookup._instances.append(self)
+
+    def _path(self):
+        return cache_path(self.name + CachedLookup.SUFFIX)
+
+    def _load(self):
+        self._cache = LRUCache(self.max_size)
+        if self._source_func is not None:
+            self._source = self._source_func()
+        try:
+            with open(self._path(), "rb") as f:
+                (fmt, source, seeded, items) = loads(f.read())
+            if fmt == CachedLookup.FORMAT and source == self._source:
+                self._seeded = dict(seeded)
+                for (key, value) in items:
+                    self._cache.put(key, value)
+                return
+        except (IOError, OSError, EOFError, ValueError, TypeError, UnpicklingError):
+            pass
+        if self._seed is not None:
+            self._seeded = dict(self._seed())
+            self._dirty = True
+
+    def __call__(self, arg):
+        if self._cache is None:
+            self._load()
+        value = self._seeded.get(arg, _MISSING)
+        if value is not _MISSING:
+            return value
+        value = self._cache.get(arg, _MISSING)
+        if value is _MISSING:
+            value = self.func(arg)
+            self._cache.put(arg, value)
+            self._dirty = True
+        return value
+
+    def __len__(self):
+        if self._cache is None:
+            return 0
+        return len(self._seeded) + len(self._cache)
+
+    def save(self):
+        """Stores the cache if it has new entries.
+        """
+        if not self._dirty:
+            return
+        try:
+            write_atomic(self._path(), dumps((CachedLookup.FORMAT, self._source, self._seeded.items(), self._cache.items()), -1))
+            self._dirty = False
+        except (IOError, OSError):
+            pass
+
+
+
+if __name__ == '__main__':
+    print u"Test for %s" % __file__
+    import shutil
+    import tempfile
+
+    print u"  Testing LRUCache..."
+    cache = LRUCache(2)
+    cache.put(u"a", 1)
+    cache.put(u"b", 2)
+    assert cache.get(u"a") == 1
+    cache.put(u"c", 3)
+    assert u"b" not in cache
+    assert cache.items() == [(u"a", 1), (u"c", 3)]
+    assert cache.get(u"b", 42) == 42
+    assert len(cache) == 2
+
+    print u"  Testing CachedLookup..."
+    C.CACHE_DIR = tempfile.mkdtemp()
+    calls = list()
+    def upper(word):
+        calls.append(word)
+        return word.upper()
+    def seed():
+        return [(u"ist", u"SEIN")]
+    lookup = CachedLookup(u"test", upper, 3, seed)
+    assert lookup(u"ist") == u"SEIN"
+    assert lookup(u"hat") == u"HAT"
+    assert lookup(u"hat") == u"HAT"
+    assert calls == [u"hat"]
+    CachedLookup.save_all()
+    assert op.isfile(op.join(C.CACHE_DIR, u"test" + CachedLookup.SUFFIX))
+
+    lookup = CachedLookup(u"test", upper, 3, seed)
+    assert lookup(u"hat") == u"HAT"
+    assert calls == [u"hat"]
+    for word in [u"a", u"b", u"c"]:
+        lookup(word)
+    # Seeded entries are never evicted
+    assert len(lookup) == 4
+    assert lookup(u"ist") == u"SEIN"
+    assert lookup(u"hat") == u"HAT"
+    assert calls == [u"hat", u"a", u"b", u"c", u"hat"]
+
+    print u"  Testing CachedLookup sources..."
+    lookup = CachedLookup(u"test", upper, 3, seed, lambda: u"corpus-1")
+    assert lookup(u"ist") == u"SEIN"
+    lookup(u"hat")
+    lookup.save()
+    lookup = CachedLookup(u"test", upper, 3, seed, lambda: u"corpus-1")
+    del calls[:]
+    assert lookup(u"hat") == u"HAT"
+    assert calls == []
+    # Changed source: stored entries are dropped, the cache is seeded again
+    lookup = CachedLookup(u"test", upper, 3, lambda: [(u"hat", u"HABEN")], lambda: u"corpus-2")
+    assert lookup(u"hat") == u"HABEN"
+    assert lookup(u"ist") == u"IST"
+    shutil.rmtree(C.CACHE_DIR)
+
+    print u"Passed all tests!"
@@ -8,6 +8,8 @@ Description:
 '''
 
 from localizable import Localizable
+from corpus import Corpus
+from confopy.model import Paragraph
 
 #import nltk
 #
@@ -21,14 +23,114 @@ from localizable import Localizable
 
 class Metric(Localizable):
     """Superclass for all Metrics.
+    Metrics are computed from statistics (e.g. word and sentence counts) of
+    the single texts (paragraphs, captions, ...) of a node. The statistics
+    are merged up the document tree, so the values of a document and all
+    its sections come out of one traversal (see evaluate_tree).
+    Subclasses implement statistics() and value(). Metrics which can't be
+    merged override evaluate() instead.
     """
+
+    # Bump if the computation of a metric changes. Stored values of other
+    # versions are ignored (see results.ResultStore)
+    VERSION = 1
+
     def __init__(self, ID, language, brief=u"", description=u""):
         super(Metric, self).__init__(ID=ID, language=language, brief=brief, description=description)
 
+    def fingerprint(self):
+        """Return:
+            Unicode string identifying external data the metric values
+            depend on (e.g. the spelling dictionary), empty by default.
+            Part of the key of stored reference values.
+        """
+        return u""
+
     def evaluate(self, node):
+        """Return:
+            Metric value of node including its descendants.
+        """
+        return evaluate_tree([self], node)[node][0]
+
+    def statistics(self, node):
+        """Sufficient statistics of the text of a single node.
+        Args:
+            node: Node without children (e.g. Paragraph) with non-empty
+                  text or Corpus.
+        Return:
+            Dictionary name --> number or set.
+        """
+        return dict()
+
+    def merge(self, a, b):
+        """Combines the statistics of two consecutive texts.
+        Numbers are added, sets are united.
+        Return:
+            New dictionary.
+        """
+        merged = dict(a)
+        for (key, val) in b.items():
+            if key not in merged:
+                merged[key] = val
+            elif isinstance(val, (set, frozenset)):
+                merged[key] = merged[key] | val
+            else:
+                merged[key] = merged[key] + val
+        return merged
+
+    def value(self, stats):
+        """Return:
+            Metric value for (merged) statistics.
+        """
         return 0.0
 
 
+def _mergeable(metric):
+    # Metrics overriding evaluate() don't provide statistics
+    return getattr(type(metric).evaluate, "im_func", None) is Metric.evaluate.im_func
+
+def evaluate_tree(metrics, root):
+    """Evaluates metrics on a node and all sections below it in a single
+    bottom-up traversal. The statistics of every text are computed once
+    per metric and merged up the tree.
+    Args:
+        metrics: List of Metrics.
+        root:    Node (e.g. Document) or Corpus.
+    Return:
+        Dictionary node --> list of values (one per metric) for root and
+        all its descendant sections.
+    """
+    mergeable = [_mergeable(m) for m in metrics]
+    stats = dict()
+    stats[root] = _collect([m for (m, ok) in zip(metrics, mergeable) if ok], root, stats)
+    results = dict()
+    for (node, node_stats) in stats.items():
+        node_stats = iter(node_stats)
+        results[node] = [m.value(next(node_stats)) if ok else m.evaluate(node) for (m, ok) in zip(metrics, mergeable)]
+    return results
+
+def _collect(metrics, node, stats):
+    """Return:
+        List of the merged statistics (one per metric) of node and its
+        descendants. Those of sections are also stored in stats.
+    """
+    if isinstance(node, Corpus):
+        return [m.statistics(node) for m in metrics]
+    merged = [dict() for m in metrics]
+    if node.text != u"":
+        unit = node
+        if node.children():
+            # Own text of an inner node, precedes the texts of the children
+            unit = Paragraph(node.text)
+        merged = [m.statistics(unit) for m in metrics]
+    for c in node.children():
+        child = _collect(metrics, c, stats)
+        merged = [m.merge(a, b) for (m, a, b) in zip(metrics, merged, child)]
+    if node.is_section():
+        stats[node] = merged
+    return merged
+
+
 
 #def nltk_test():
 #    print "nltk %s" % (nltk.__version__, )
@@ -64,3 +166,53 @@ class Metric(Localizable):
     #pattern_test()
 
 
+
+if __name__ == '__main__':
+    print u"Test for %s" % __file__
+    from confopy.model import Document, Section
+
+    class _WordsMetric(Metric):
+        """Average word count of the texts, words as a set.
+        """
+        def __init__(self):
+            super(_WordsMetric, self).__init__(u"test-words", u"xx")
+            self.calls = 0
+        def statistics(self, node):
+            self.calls += 1
+            words = node.text.split()
+            return {u"words": len(words), u"texts": 1, u"distinct": set(words)}
+        def value(self, stats):
+            if stats.get(u"texts", 0) > 0:
+                return (float(stats[u"words"]) / stats[u"texts"], len(stats[u"distinct"]))
+            return (0.0, 0)
+
+    class _LengthMetric(Metric):
+        def __init__(self):
+            super(_LengthMetric, self).__init__(u"test-length", u"xx")
+        def evaluate(self, node):
+            return len(node.raw())
+
+    print u"  Testing Metric.merge..."
+    metric = _WordsMetric()
+    assert metric.merge({u"a": 1, u"s": set([1])}, {u"a": 2, u"b": 3, u"s": set([2])}) == {u"a": 3, u"b": 3, u"s": set([1, 2])}
+
+    print u"  Testing evaluate_tree..."
+    para1 = Paragraph(u"a b c")
+    para2 = Paragraph(u"c d")
+    para3 = Paragraph(u"e")
+    sec11 = Section(title=u"1.1", children=[para2])
+    sec1 = Section(title=u"1", children=[para1, sec11])
+    sec2 = Section(title=u"2", children=[para3])
+    doc = Document(children=[sec1, sec2, Section(title=u"3")])
+    length = _LengthMetric()
+    values = evaluate_tree([metric, length], doc)
+    assert metric.calls == 3
+    assert len(values) == 5
+    assert values[doc] == [(2.0, 5), len(doc.raw())]
+    assert values[sec1] == [(2.5, 4), len(sec1.raw())]
+    assert values[sec11][0] == (2.0, 2)
+    assert values[doc.children()[-1]][0] == (0.0, 0)
+    assert metric.evaluate(sec2) == (1.0, 1)
+    assert evaluate_tree([metric], para1) == {para1: [(3.0, 3)]}
+
+    print u"Passed all tests!"
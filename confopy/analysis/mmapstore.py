@@ -0,0 +1,234 @@
+# coding: utf-8
+'''
+File: mmapstore.py
+Author: Oliver Zscheyge
+Description:
+    Versioned binary container of named arrays and string tables.
+    Files are memory-mapped when read, so opening a store costs
+    next to nothing and only the accessed pages are loaded.
+
+    Layout:
+        MAGIC | uint32 header length | JSON header | aligned sections
+'''
+
+import json
+import mmap
+import os
+import struct
+
+import numpy as np
+
+from confopy.storage import atomic_file
+
+MAGIC = "CONFOPY\x00"
+_ALIGN = 8
+_LEN_FMT = "<I"
+
+
+class StoreError(Exception):
+    """Raised for files that are no (compatible) stores.
+    """
+    pass
+
+
+class Interner(object):
+    """Assigns consecutive integer IDs to unicode strings.
+    """
+    def __init__(self):
+        super(Interner, self).__init__()
+        self._ids = dict()
+        self.strings = list()
+
+    def __call__(self, string):
+        """Return:
+            Integer ID of string.
+        """
+        ID = self._ids.get(string, None)
+        if ID is None:
+            ID = len(self.strings)
+            self._ids[string] = ID
+            self.strings.append(string)
+        return ID
+
+    def __len__(self):
+        return len(self.strings)
+
+
+def string_sections(name, strings):
+    """Converts a list of unicode strings to the two sections of a
+    StringTable.
+    Args:
+        name:    Name of the string table.
+        strings: List of unicode strings.
+    Return:
+        Dictionary section name --> numpy array.
+    """
+    encoded = [s.encode(u"utf-8") for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype="<u4")
+    if len(encoded) > 0:
+        offsets[1:] = np.cumsum([len(e) for e in encoded])
+    blob = np.frombuffer("".join(encoded), dtype="u1")
+    return {name + u".offsets": offsets, name + u".blob": blob}
+
+def write_store(path, kind, version, meta, sections):
+    """Writes a store file.
+    Args:
+        path:     Target file. Written atomically.
+        kind:     Unicode string naming the content type of the store.
+        version:  Integer format version of the content.
+        meta:     JSON serializable dictionary with additional info.
+        sections: Dictionary name --> numpy array (1 dimensional).
+    """
+    names = sorted(sections.keys())
+    header = {u"kind": kind, u"version": version, u"meta": meta, u"sections": dict()}
+    # Header size depends on the offsets, so compute them with placeholders
+    # first and fix the offsets afterwards.
+    def layout(header_len):
+        offset = _aligned(len(MAGIC) + struct.calcsize(_LEN_FMT) + header_len)
+        for name in names:
+            arr = sections[name]
+            header[u"sections"][name] = [offset, arr.dtype.str, len(arr)]
+            offset = _aligned(offset + arr.nbytes)
+        return json.dumps(header, sort_keys=True)
+    header_str = layout(0)
+    while True:
+        new_header_str = layout(len(header_str))
+        if len(new_header_str) == len(header_str):
+            header_str = new_header_str
+            break
+        header_str = new_header_str
+
+    with atomic_file(path) as f:
+        f.write(MAGIC)
+        f.write(struct.pack(_LEN_FMT, len(header_str)))
+        f.write(header_str)
+        pos = len(MAGIC) + struct.calcsize(_LEN_FMT) + len(header_str)
+        for name in names:
+            offset = header[u"sections"][name][0]
+            f.write("\x00" * (offset - pos))
+            f.write(sections[name].tostring())
+            pos = offset + sections[name].nbytes
+
+def _aligned(offset):
+    return offset + (-offset % _ALIGN)
+
+
+class MappedStore(object):
+    """Read-only, memory-mapped view on a store file.
+    """
+    def __init__(self, path, kind=None, version=None):
+        """Initializer.
+        Args:
+            path:    Store file to open.
+            kind:    Expected kind. Optional.
+            version: Expected version. Optional.
+        Raises:
+            IOError if path can't be read.
+            StoreError if the file is no store of the given kind/version.
+        """
+        super(MappedStore, self).__init__()
+        self.path = path
+        prefix_len = len(MAGIC) + struct.calcsize(_LEN_FMT)
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size < prefix_len:
+                raise StoreError(u"%s is no Confopy store" % path)
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mm[:len(MAGIC)] != MAGIC:
+            raise StoreError(u"%s is no Confopy store" % path)
+        (header_len, ) = struct.unpack(_LEN_FMT, self._mm[len(MAGIC):prefix_len])
+        try:
+            header = json.loads(self._mm[prefix_len:prefix_len + header_len])
+        except ValueError:
+            raise StoreError(u"%s has a corrupt header" % path)
+        self.kind = header[u"kind"]
+        self.version = header[u"version"]
+        self.meta = header[u"meta"]
+        self._sections = header[u"sections"]
+        if (kind is not None and kind != self.kind) or \
+           (version is not None and version != self.version):
+            raise StoreError(u"%s is a %s store of version %s (expected: %s, %s)" % (path, self.kind, self.version, kind, version))
+
+    def array(self, name):
+        """Return:
+            Read-only numpy array of the section with the given name.
+        """
+        (offset, dtype, count) = self._sections[name]
+        return np.frombuffer(self._mm, dtype=dtype, count=count, offset=offset)
+
+    def strings(self, name):
+        """Return:
+            StringTable stored under the given name.
+        """
+        (blob_offset, _, _) = self._sections[name + u".blob"]
+        return StringTable(self._mm, blob_offset, self.array(name + u".offsets"))
+
+
+class StringTable(object):
+    """Interned strings of a store, decoded on first access.
+    """
+    def __init__(self, buf, blob_offset, offsets):
+        super(StringTable, self).__init__()
+        self._buf = buf
+        self._blob_offset = blob_offset
+        self._offsets = offsets
+        self._decoded = dict()
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, ID):
+        string = self._decoded.get(ID, None)
+        if string is None:
+            string = self.encoded(ID).decode(u"utf-8")
+            self._decoded[ID] = string
+        return string
+
+    def encoded(self, ID):
+        """Return:
+            The UTF-8 encoded string (byte string) with the given ID.
+            Not cached.
+        """
+        start = self._blob_offset + int(self._offsets[ID])
+        end = self._blob_offset + int(self._offsets[ID + 1])
+        return self._buf[start:end]
+
+
+
+if __name__ == '__main__':
+    print u"Test for %s" % __file__
+    import tempfile
+
+    print u"  Testing Interner..."
+    intern = Interner()
+    assert [intern(s) for s in [u"a", u"b", u"a", u"ä"]] == [0, 1, 0, 2]
+    assert len(intern) == 3
+
+    print u"  Testing write_store and MappedStore..."
+    (fd, path) = tempfile.mkstemp()
+    os.close(fd)
+    sections = string_sections(u"words", intern.strings)
+    sections[u"ids"] = np.array([2, 0, 1], dtype="<i4")
+    sections[u"empty"] = np.zeros(0, dtype="<i2")
+    write_store(path, u"test", 1, {u"foo": u"bar"}, sections)
+    store = MappedStore(path, u"test", 1)
+    assert store.meta == {u"foo": u"bar"}
+    words = store.strings(u"words")
+    assert len(words) == 3
+    assert [words[i] for i in store.array(u"ids")] == [u"ä", u"a", u"b"]
+    assert words.encoded(2) == u"ä".encode(u"utf-8")
+    assert len(store.array(u"empty")) == 0
+    try:
+        MappedStore(path, u"test", 2)
+        assert False, u"Version mismatch not detected!"
+    except StoreError:
+        pass
+    with open(path, "wb") as f:
+        pass
+    try:
+        MappedStore(path)
+        assert False, u"Empty file not detected!"
+    except StoreError:
+        pass
+    os.remove(path)
+
+    print u"Passed all tests!"
@@ -0,0 +1,203 @@
+# coding: utf-8
+'''
+File: reference.py
+Author: Oliver Zscheyge
+Description:
+    Persistent store for metric values of reference corpora.
+'''
+
+import json
+import sys
+
+import confopy
+from confopy.storage import cache_path, write_atomic
+from corpus import LazyCorpus
+
+
+class ReferenceStore(object):
+    """Metric values of reference corpora (e.g. TIGER), computed once and
+    kept on disk.
+    Values are keyed by the checksum of the corpus file and by the metric
+    ID, the metric's VERSION and fingerprint and the Confopy version.
+    Bumping VERSION invalidates all stored values.
+    """
+
+    VERSION = 3
+    FILE = u"reference_values.json"
+
+    _instance = None
+
+    @staticmethod
+    def instance():
+        """Yields the process wide ReferenceStore.
+        """
+        if ReferenceStore._instance is None:
+            ReferenceStore._instance = ReferenceStore()
+        return ReferenceStore._instance
+
+    def __init__(self, path=None):
+        """Initializer.
+        Args:
+            path: File to store the values in.
+                  Default: FILE in the Confopy cache directory.
+        """
+        super(ReferenceStore, self).__init__()
+        self._path = path
+        self._values = None
+
+    def _file(self):
+        if self._path is None:
+            self._path = cache_path(ReferenceStore.FILE)
+        return self._path
+
+    def _load(self):
+        if self._values is not None:
+            return self._values
+        self._values = dict()
+        try:
+            with open(self._file(), "rb") as f:
+                data = json.load(f)
+            if data.get(u"version", None) == ReferenceStore.VERSION:
+                self._values = data.get(u"values", dict())
+        except (IOError, OSError, ValueError):
+            pass
+        return self._values
+
+    def _save(self):
+        data = {u"version": ReferenceStore.VERSION, u"values": self._load()}
+        path = self._path or ReferenceStore.FILE
+        try:
+            path = self._file()
+            write_atomic(path, json.dumps(data, indent=1, sort_keys=True))
+        except (IOError, OSError) as e:
+            sys.stderr.write(u"Could not write reference values to %s: %s\n" % (path, e))
+
+    def get(self, corpus, metric):
+        """Looks up a stored metric value.
+        Args:
+            corpus: The reference Corpus.
+            metric: The Metric.
+        Return:
+            Float or None if the value is not known yet.
+        """
+        return self._load().get(corpus.checksum(), dict()).get(_metric_key(metric), None)
+
+    def value(self, corpus, metric):
+        """Metric value of a reference corpus.
+        Evaluates the metric on the corpus and stores the result in case the
+        value is not known yet.
+        Args:
+            corpus: The reference Corpus. A LazyCorpus is only loaded if the
+                    value is not known yet.
+            metric: The Metric.
+        Return:
+            Float.
+        """
+        val = self.get(corpus, metric)
+        if val is None:
+            val = metric.evaluate(_loaded(corpus))
+            self._put(corpus, metric, val)
+            self._save()
+        return val
+
+    def rebuild(self, corpus, metrics):
+        """(Re-)evaluates the given metrics on a reference corpus and stores
+        the results.
+        Args:
+            corpus:  The reference Corpus.
+            metrics: List of Metrics.
+        Return:
+            Dictionary metric ID --> value.
+        """
+        values = dict()
+        for m in metrics:
+            values[m.ID] = m.evaluate(_loaded(corpus))
+            self._put(corpus, m, values[m.ID])
+        self._save()
+        return values
+
+    def _put(self, corpus, metric, value):
+        checksum = corpus.checksum()
+        if checksum:
+            self._load().setdefault(checksum, dict())[_metric_key(metric)] = value
+
+
+def _loaded(corpus):
+    if isinstance(corpus, LazyCorpus):
+        return corpus.load()
+    return corpus
+
+def _metric_key(metric):
+    key = u"%s@%s/%s" % (metric.ID, getattr(metric, u"VERSION", 1), confopy.__version__)
+    fingerprint = getattr(metric, u"fingerprint", lambda: u"")()
+    if fingerprint:
+        key += u"#" + fingerprint
+    return key
+
+
+if __name__ == '__main__':
+    print u"Test for %s" % __file__
+    import os
+    import tempfile
+
+    class _Corpus(object):
+        def checksum(self):
+            return u"abc"
+
+    class _Metric(object):
+        def __init__(self):
+            self.ID = u"foo"
+            self.calls = 0
+        def evaluate(self, node):
+            self.calls += 1
+            return 4.2
+
+    print u"  Testing ReferenceStore..."
+    (fd, path) = tempfile.mkstemp()
+    os.close(fd)
+    corp = _Corpus()
+    metric = _Metric()
+    store = ReferenceStore(path)
+    assert store.get(corp, metric) is None
+    assert store.value(corp, metric) == 4.2
+    assert store.value(corp, metric) == 4.2
+    assert metric.calls == 1
+    assert ReferenceStore(path).get(corp, metric) == 4.2
+    store.rebuild(corp, [metric])
+    assert metric.calls == 2
+
+    print u"  Testing metric versions..."
+    metric.VERSION = 2
+    assert store.get(corp, metric) is None
+    assert store.value(corp, metric) == 4.2
+    assert metric.calls == 3
+    metric.fingerprint = lambda: u"lexicon:abc"
+    assert store.get(corp, metric) is None
+    assert store.value(corp, metric) == 4.2
+    assert metric.calls == 4
+
+    print u"  Testing LazyCorpus..."
+    loads = list()
+    def factory():
+        loads.append(1)
+        return corp
+    lazy = LazyCorpus(u"test", u"de", factory, checksum=corp.checksum)
+    assert store.value(lazy, metric) == 4.2
+    assert loads == []
+    other = _Metric()
+    other.ID = u"bar"
+    assert store.value(lazy, other) == 4.2
+    assert loads == [1]
+
+    print u"  Testing uncreatable cache directory..."
+    import confopy.config as C
+    cache_dir = C.CACHE_DIR
+    # A directory below a regular file can't be created (not even by root)
+    C.CACHE_DIR = os.path.join(path, u"confopy")
+    store = ReferenceStore()
+    assert store.value(corp, metric) == 4.2
+    assert store.get(corp, metric) == 4.2
+    C.CACHE_DIR = cache_dir
+    os.remove(path)
+
+    print u"Passed all tests!"
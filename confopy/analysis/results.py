@@ -0,0 +1,405 @@
+# coding: utf-8
+'''
+File: results.py
+Author: Oliver Zscheyge
+Description:
+    Metric values of multiple documents as a metrics x documents matrix.
+    Reports derive exceedances, statistics and before/after comparisons
+    from it with vectorized numpy operations.
+    All values computed by reports are recorded in a SQLite database
+    (ResultStore) to compare cohorts of documents without re-analysis.
+'''
+
+import hashlib
+import os
+import os.path as op
+import sqlite3
+import sys
+import time
+
+import numpy as np
+
+import confopy.config as C
+from statistics import RunningStats, matrix_stats, round_array
+
+
+class ResultMatrix(object):
+    """Values of multiple metrics on multiple documents.
+    Attributes:
+        IDs:    List of metric IDs, one per row.
+        values: numpy array of floats, one row per metric and one column
+                per document.
+    """
+    def __init__(self, IDs, values, doc_count):
+        """Initializer.
+        Args:
+            IDs:       List of metric IDs.
+            values:    List (one per metric) of lists (one value per
+                       document), e.g. as returned by parallel.evaluate.
+            doc_count: Number of documents.
+        """
+        super(ResultMatrix, self).__init__()
+        self.IDs = list(IDs)
+        self.values = np.array(values, dtype=float).reshape(len(self.IDs), doc_count)
+        self._rows = dict([(ID, i) for (i, ID) in enumerate(self.IDs)])
+
+    def __len__(self):
+        return len(self.IDs)
+
+    def doc_count(self):
+        return self.values.shape[1]
+
+    def row(self, ID):
+        """Return:
+            numpy array of the values of a metric (one per document).
+        Raises:
+            KeyError if there is no row for the given metric ID.
+        """
+        return self.values[self._rows[ID]]
+
+    def stats(self, percentiles=(25, 50, 75), ndigits=None):
+        """Return:
+            Statistics of every metric over all documents (see
+            statistics.matrix_stats).
+        """
+        return matrix_stats(self.values, percentiles, ndigits)
+
+    def exceedances(self, bounds, ndigits=None):
+        """Checks all values against expected ranges.
+        Args:
+            bounds:  Dictionary metric ID --> (low, high) tuple, None for
+                     no lower/upper bound. Metrics without an entry are
+                     unbounded.
+            ndigits: Number of digits to round values to before comparing.
+        Return:
+            numpy array of booleans (shape of values), True for values
+            lower than low or higher than high.
+        """
+        low = np.empty(len(self))
+        high = np.empty(len(self))
+        for (i, ID) in enumerate(self.IDs):
+            (lo, hi) = bounds.get(ID, (None, None))
+            low[i] = -np.inf if lo is None else lo
+            high[i] = np.inf if hi is None else hi
+        values = self.values
+        if ndigits is not None:
+            values = round_array(values, ndigits)
+        return (values < low[:, np.newaxis]) | (values > high[:, np.newaxis])
+
+    def deltas(self):
+        """Pairs the first half of the documents (before) with the second
+        half (after): document i with document i + doc_count() / 2.
+        Return:
+            numpy array of after - before values, one row per metric and
+            one column per pair.
+        Raises:
+            ValueError if the number of documents is odd.
+        """
+        if self.doc_count() % 2 != 0:
+            raise ValueError(u"Need an even number of documents to compare!")
+        half = self.doc_count() // 2
+        return self.values[:, half:] - self.values[:, :half]
+
+    def progress(self):
+        """Counts increases, decreases and equal values of every metric
+        over all before/after document pairs (see deltas).
+        Return:
+            Dictionary u"increased"/u"decreased"/u"equal" --> numpy array
+            of counts and u"increase"/u"decrease" --> numpy array of the
+            average absolute change of increased/decreased values (0.0 if
+            there is none), one per metric.
+        """
+        deltas = self.deltas()
+        increased = deltas > 0.0
+        decreased = deltas < 0.0
+        result = {u"increased": increased.sum(axis=1),
+                  u"decreased": decreased.sum(axis=1),
+                  u"equal":     deltas.shape[1] - increased.sum(axis=1) - decreased.sum(axis=1)}
+        for (key, mask, counts) in [(u"increase", increased, result[u"increased"]),
+                                    (u"decrease", decreased, result[u"decreased"])]:
+            sums = np.abs(np.where(mask, deltas, 0.0)).sum(axis=1)
+            result[key] = sums / np.maximum(counts, 1)
+        return result
+
+
+def document_hash(doc):
+    """Checksum of the content (structure, titles and texts) of a document.
+    Equal documents have equal hashes, no matter if they were extracted
+    from a PDF or read from XML.
+    Return:
+        SHA-256 hex digest.
+    """
+    sha = hashlib.sha256()
+    stack = [doc]
+    while stack:
+        node = stack.pop()
+        children = node.children()
+        for part in [type(node).__name__, getattr(node, u"title", u""), getattr(node, u"number", u""), node.text, len(children)]:
+            sha.update(unicode(part).encode(u"utf-8"))
+            sha.update(b"\x00")
+        stack.extend(reversed(children))
+    return sha.hexdigest()
+
+def node_paths(doc):
+    """Paths of a document and all its sections: u"/" for the document,
+    u"/2/1" for the first subsection of its second section.
+    Return:
+        Dictionary node --> path (unicode string).
+    """
+    paths = {doc: u"/"}
+    stack = [(doc, u"")]
+    while stack:
+        (node, prefix) = stack.pop()
+        sections = [c for c in node.children() if c.is_section()]
+        for (i, sec) in enumerate(sections):
+            paths[sec] = u"%s/%d" % (prefix, i + 1)
+            stack.append((sec, paths[sec]))
+    return paths
+
+
+class ResultStore(object):
+    """Metric values of analyzed documents and sections, kept in a SQLite
+    database. Values are keyed by document hash, metric ID, metric version,
+    metric fingerprint (e.g. the spelling backend) and node path and are
+    replaced when a document is analyzed again.
+    Documents can be assigned to cohorts (e.g. semesters) to compare them.
+    Bumping VERSION drops all stored values.
+    """
+
+    VERSION = 2
+
+    _SCHEMA = [u"CREATE TABLE IF NOT EXISTS documents (hash TEXT PRIMARY KEY, title TEXT, added REAL, updated REAL)",
+               u"CREATE TABLE IF NOT EXISTS cohorts (cohort TEXT, hash TEXT, added REAL, PRIMARY KEY (cohort, hash))",
+               u"CREATE TABLE IF NOT EXISTS results (hash TEXT, metric TEXT, version INTEGER, fingerprint TEXT, path TEXT, value REAL, PRIMARY KEY (hash, metric, version, fingerprint, path))"]
+
+    _instance = None
+
+    @staticmethod
+    def instance():
+        """Yields the process wide ResultStore.
+        """
+        if ResultStore._instance is None:
+            ResultStore._instance = ResultStore()
+        return ResultStore._instance
+
+    def __init__(self, path=None):
+        """Initializer.
+        Args:
+            path: Database file. Default: config.RESULT_STORE.
+        """
+        super(ResultStore, self).__init__()
+        self._path = path
+        self._db = None
+
+    def enabled(self):
+        return (self._path or C.RESULT_STORE) is not None
+
+    def _connect(self):
+        if self._db is not None:
+            return self._db
+        path = self._path or C.RESULT_STORE
+        if op.dirname(path) and not op.isdir(op.dirname(path)):
+            os.makedirs(op.dirname(path))
+        db = sqlite3.connect(path, timeout=60)
+        with db:
+            if db.execute(u"PRAGMA user_version").fetchone()[0] != ResultStore.VERSION:
+                for table in [u"documents", u"cohorts", u"results"]:
+                    db.execute(u"DROP TABLE IF EXISTS %s" % table)
+                db.execute(u"PRAGMA user_version = %d" % ResultStore.VERSION)
+            for statement in ResultStore._SCHEMA:
+                db.execute(statement)
+        self._db = db
+        return db
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def put(self, metrics, results, cohort=None):
+        """Records (replaces) metric values of documents in one transaction.
+        Failures are reported on stderr, reports don't fail because of them.
+        Args:
+            metrics: List of Metrics.
+            results: List of (document, values) tuples, values being a
+                     dictionary node --> list of values (one per metric) of
+                     the document and any of its sections (e.g. as returned
+                     by metric.evaluate_tree).
+            cohort:  Name of the cohort to add the documents to. Optional.
+        """
+        if not self.enabled():
+            return
+        now = time.time()
+        keys = [(m.ID, m.VERSION, m.fingerprint()) for m in metrics]
+        try:
+            db = self._connect()
+            with db:
+                for (doc, values) in results:
+                    doc_hash = document_hash(doc)
+                    title = getattr(getattr(doc, u"meta", None), u"title", u"") or u""
+                    db.execute(u"INSERT OR IGNORE INTO documents (hash, title, added, updated) VALUES (?, ?, ?, ?)", (doc_hash, title, now, now))
+                    db.execute(u"UPDATE documents SET title = ?, updated = ? WHERE hash = ?", (title, now, doc_hash))
+                    if cohort:
+                        db.execute(u"INSERT OR IGNORE INTO cohorts (cohort, hash, added) VALUES (?, ?, ?)", (cohort, doc_hash, now))
+                    paths = node_paths(doc)
+                    rows = list()
+                    for (node, vals) in values.items():
+                        path = paths.get(node, None)
+                        if path is not None:
+                            rows.extend([(doc_hash, ID, version, fingerprint, path, float(v)) for ((ID, version, fingerprint), v) in zip(keys, vals)])
+                    db.executemany(u"INSERT OR REPLACE INTO results (hash, metric, version, fingerprint, path, value) VALUES (?, ?, ?, ?, ?, ?)", rows)
+        except (sqlite3.Error, IOError, OSError) as e:
+            sys.stderr.write(u"Could not write results to %s: %s\n" % (self._path or C.RESULT_STORE, e))
+
+    def _query(self, query, params=()):
+        """Runs a read query, failures are reported on stderr.
+        Return:
+            List of result rows, empty if the database could not be read.
+        """
+        if not self.enabled():
+            return list()
+        try:
+            return self._connect().execute(query, params).fetchall()
+        except (sqlite3.Error, IOError, OSError) as e:
+            sys.stderr.write(u"Could not read results from %s: %s\n" % (self._path or C.RESULT_STORE, e))
+            return list()
+
+    def cohorts(self):
+        """Return:
+            List of (cohort, number of documents) tuples, in the order the
+            cohorts were added.
+        """
+        return self._query(u"SELECT cohort, COUNT(*) FROM cohorts GROUP BY cohort ORDER BY MIN(added), cohort")
+
+    def values(self, metric, cohort=None, path=u"/"):
+        """Stored values of the current version and fingerprint of a metric.
+        Args:
+            metric: The Metric.
+            cohort: Only documents of this cohort. Default: all documents.
+            path:   Node path, see node_paths. Default: whole documents.
+        Return:
+            List of floats, one per document.
+        """
+        query = u"SELECT value FROM results WHERE metric = ? AND version = ? AND fingerprint = ? AND path = ?"
+        params = [metric.ID, metric.VERSION, metric.fingerprint(), path]
+        if cohort is not None:
+            query += u" AND hash IN (SELECT hash FROM cohorts WHERE cohort = ?)"
+            params.append(cohort)
+        return [v for (v, ) in self._query(query, params)]
+
+    def trend(self, metric, path=u"/"):
+        """Statistics of a metric per cohort.
+        Args:
+            metric: The Metric.
+            path:   Node path, see node_paths. Default: whole documents.
+        Return:
+            List of (cohort, RunningStats) tuples in the order of cohorts().
+            Cohorts without values of the metric are left out.
+        """
+        stats = dict()
+        rows = self._query(u"SELECT c.cohort, r.value FROM cohorts c JOIN results r ON c.hash = r.hash WHERE r.metric = ? AND r.version = ? AND r.fingerprint = ? AND r.path = ?",
+                           (metric.ID, metric.VERSION, metric.fingerprint(), path))
+        for (cohort, value) in rows:
+            stats.setdefault(cohort, RunningStats()).push(value)
+        return [(cohort, stats[cohort]) for (cohort, _) in self.cohorts() if cohort in stats]
+
+
+
+if __name__ == '__main__':
+    print u"Test for %s" % __file__
+
+    print u"  Testing ResultMatrix..."
+    matrix = ResultMatrix([u"a", u"b"], [[1.0, 2.0, 3.0, 4.0], [0.5, 0.5, 0.25, 1.0]], 4)
+    assert len(matrix) == 2
+    assert matrix.doc_count() == 4
+    assert list(matrix.row(u"b")) == [0.5, 0.5, 0.25, 1.0]
+    assert list(matrix.stats(ndigits=2)[u"mean"]) == [2.5, 0.56]
+    assert ResultMatrix([], [], 3).values.shape == (0, 3)
+    assert ResultMatrix([u"a"], [[]], 0).values.shape == (1, 0)
+
+    print u"  Testing exceedances..."
+    exceeded = matrix.exceedances({u"a": (2.0, 3.5), u"b": (None, 0.5)})
+    assert exceeded.tolist() == [[True, False, False, True], [False, False, False, True]]
+    assert not matrix.exceedances(dict()).any()
+    assert matrix.exceedances({u"b": (0.3, None)})[1].tolist() == [False, False, True, False]
+    assert not matrix.exceedances({u"b": (0.3, None)}, 1).any()
+
+    print u"  Testing deltas and progress..."
+    assert matrix.deltas().tolist() == [[2.0, 2.0], [-0.25, 0.5]]
+    progress = matrix.progress()
+    assert progress[u"increased"].tolist() == [2, 1]
+    assert progress[u"decreased"].tolist() == [0, 1]
+    assert progress[u"equal"].tolist() == [0, 0]
+    assert progress[u"increase"].tolist() == [2.0, 0.5]
+    assert progress[u"decrease"].tolist() == [0.0, 0.25]
+    try:
+        ResultMatrix([u"a"], [[1.0, 2.0, 3.0]], 3).deltas()
+        assert False, u"Odd number of documents compared!"
+    except ValueError:
+        pass
+
+    print u"  Testing document_hash and node_paths..."
+    import shutil
+    import tempfile
+    from confopy.model.document import Document, Paragraph, Section
+    def make_doc(text):
+        sub = Section(title=u"1.1 Bar", children=[Paragraph(text=text)])
+        sec1 = Section(title=u"1. Foo", children=[Paragraph(text=u"Hallo."), sub])
+        sec2 = Section(title=u"2. Baz", children=[Paragraph(text=u"Welt.")])
+        return Document(children=[sec1, sec2])
+    doc = make_doc(u"Der Hase springt.")
+    assert document_hash(doc) == document_hash(make_doc(u"Der Hase springt."))
+    assert document_hash(doc) != document_hash(make_doc(u"Der Igel springt."))
+    paths = node_paths(doc)
+    (sec1, sec2) = doc.children()
+    assert (paths[doc], paths[sec1], paths[sec2], paths[sec1.children()[1]]) == (u"/", u"/1", u"/2", u"/1/1")
+    assert len(paths) == 4
+
+    print u"  Testing ResultStore..."
+    class _Metric(object):
+        def __init__(self, ID, version=1, fingerprint=u""):
+            self.ID = ID
+            self.VERSION = version
+            self._fingerprint = fingerprint
+        def fingerprint(self):
+            return self._fingerprint
+    metrics = [_Metric(u"a"), _Metric(u"b")]
+    directory = tempfile.mkdtemp()
+    path = op.join(directory, u"sub", u"results.sqlite")
+    store = ResultStore(path)
+    doc2 = make_doc(u"Der Igel springt.")
+    store.put(metrics, [(doc, {doc: [1.0, 2.0], sec1: [3.0, 4.0]}), (doc2, {doc2: [5.0, 6.0]})], u"WS2014")
+    assert store.cohorts() == [(u"WS2014", 2)]
+    assert sorted(store.values(metrics[0])) == [1.0, 5.0]
+    assert store.values(metrics[1], path=u"/1") == [4.0]
+    assert store.values(_Metric(u"a", 2)) == []
+    # Analyzing a document again replaces its values
+    doc3 = make_doc(u"Der Bär springt.")
+    again = make_doc(u"Der Hase springt.")
+    store.put(metrics, [(again, {again: [1.5, 2.0]})])
+    store.put(metrics, [(doc3, {doc3: [7.0, 0.0]})], u"SS2015")
+    store.close()
+    store = ResultStore(path)
+    assert store.cohorts() == [(u"WS2014", 2), (u"SS2015", 1)]
+    assert sorted(store.values(metrics[0])) == [1.5, 5.0, 7.0]
+    assert store.values(metrics[0], u"SS2015") == [7.0]
+    trend = store.trend(metrics[0])
+    assert [c for (c, _) in trend] == [u"WS2014", u"SS2015"]
+    assert trend[0][1].mean() == 3.25 and len(trend[1][1]) == 1
+    assert store.trend(_Metric(u"c")) == []
+    # Values of another fingerprint (e.g. spelling backend) don't mix
+    other = [_Metric(u"a", fingerprint=u"enchant:de_DE"), metrics[1]]
+    store.put(other, [(doc3, {doc3: [9.0, 0.0]})])
+    assert store.values(other[0]) == [9.0]
+    assert store.values(metrics[0], u"SS2015") == [7.0]
+    assert [len(stats) for (_, stats) in store.trend(other[0])] == [1]
+    store.close()
+    # A database below a regular file can't be created, not even by root
+    unusable = ResultStore(op.join(path, u"sub", u"results.sqlite"))
+    unusable.put(metrics, [(doc, {doc: [1.0, 2.0]})], u"WS2014")
+    assert unusable.cohorts() == []
+    assert unusable.values(metrics[0]) == []
+    assert unusable.trend(metrics[0]) == []
+    shutil.rmtree(directory)
+
+    print u"Passed all tests!"
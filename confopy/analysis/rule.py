@@ -6,6 +6,8 @@ Description:
     Rule superclass and some predicates.
 '''
 
+import weakref
+
 from localizable import Localizable
 from confopy.model.document import *
 
@@ -13,7 +15,13 @@ from confopy.model.document import *
 
 class Rule(Localizable):
     """Base class to describe rule based knowledge.
+    Attributes:
+        NODE_TYPES: Tuple of the Node classes the rule is evaluated on.
+                    The rule is considered satisfied by all other nodes.
     """
+
+    NODE_TYPES = (Node, )
+
     def __init__(self, ID=u"", language=u"", brief=u"", description=u""):
         """Initializer.
         """
@@ -114,28 +122,82 @@ def _is_referenced(flt, before):
     """
     parent = flt.parent()
     if parent is not None:
-        siblings = list()
-        children = parent.children()
-        for child in children:
-            if before and child == flt:
-                break
-            if child.is_paragraph():
-                siblings.append(child)
-        para_texts = [sib.text for sib in siblings]
-        para_texts = u"".join(para_texts)
+        index = _reference_index(parent)
+        end = None
+        if before:
+            end = index.offset(flt)
 
         if flt.number != u"":
-            return flt.number in para_texts
+            return index.contains(flt.number, end)
         flt_text = flt.text.strip().split(u" ")
         if len(flt_text) >= 2:
             flt_text = flt_text[0].strip() + u" " + flt_text[1].strip()
             flt_text = flt_text.replace(u":", u"")
             # dirty hack, use regex for whitespace in future
             flt_text_newline = flt_text.replace(u" ", u"\n")
-            return (flt_text in para_texts) or (flt_text_newline in para_texts)
+            return index.contains(flt_text, end) or index.contains(flt_text_newline, end)
 
     return False
 
+_REFERENCE_INDICES = weakref.WeakKeyDictionary()
+
+def _reference_index(parent):
+    """Yields the (cached) ReferenceIndex of a node.
+    """
+    index = _REFERENCE_INDICES.get(parent, None)
+    if index is None or index.revision != parent.revision():
+        index = ReferenceIndex(parent)
+        _REFERENCE_INDICES[parent] = index
+    return index
+
+class ReferenceIndex(object):
+    """Concatenated text of the paragraph children of a node, built once
+    for all floating objects among the children.
+    Remembers where each child starts in the text and the first
+    occurrence of each searched reference.
+    """
+    def __init__(self, parent):
+        """Initializer.
+        Args:
+            parent: Node whose paragraph children are indexed.
+        """
+        super(ReferenceIndex, self).__init__()
+        self.revision = parent.revision()
+        self._offsets = dict()
+        texts = list()
+        length = 0
+        for child in parent.children():
+            self._offsets[id(child)] = length
+            if child.is_paragraph():
+                texts.append(child.text)
+                length += len(child.text)
+        self._text = u"".join(texts)
+        self._first = dict()
+
+    def offset(self, child):
+        """Return:
+            Length of the paragraph text preceding child or None if child
+            is not indexed.
+        """
+        return self._offsets.get(id(child), None)
+
+    def contains(self, reference, end=None):
+        """Checks whether a reference occurs in the paragraph text.
+        Args:
+            reference: Unicode string to search for.
+            end:       Only search the text before this offset (see #offset).
+                       None to search the whole text.
+        Return:
+            Boolean.
+        """
+        first = self._first.get(reference, None)
+        if first is None:
+            first = self._text.find(reference)
+            self._first[reference] = first
+        if first < 0:
+            return False
+        return end is None or first + len(reference) <= end
+
 FLT_CAPTION_MIN_SIZE = 3
 FLT_CAPTION_NR_SIZE = 2
 def has_caption(flt):
@@ -152,9 +214,68 @@ def has_caption(flt):
 
 # Utility functions
 
+class RuleEngine(object):
+    """Evaluates a list of rules on documents.
+    The tree is walked once. Each node is only passed to the rules
+    registered for its type (see Rule.NODE_TYPES).
+    """
+    def __init__(self, rules):
+        """Initializer.
+        Args:
+            rules: List of Rules. Their order is the order of the
+                   violations of a single node.
+        """
+        super(RuleEngine, self).__init__()
+        self.rules = list(rules)
+        self._dispatch = dict()
+
+    def rules_for(self, node):
+        """Return:
+            List of the rules applying to the type of node.
+        """
+        node_type = type(node)
+        rules = self._dispatch.get(node_type, None)
+        if rules is None:
+            rules = [r for r in self.rules if issubclass(node_type, r.NODE_TYPES)]
+            self._dispatch[node_type] = rules
+        return rules
+
+    def violations(self, node):
+        """Generator of the violated rules in document order (pre-order,
+        rules in the order given to the engine).
+        Args:
+            node: Node (e.g. a Document) to check including all its
+                  descendants.
+        Return:
+            Yields (rule, node) tuples.
+        """
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            for rule in self.rules_for(node):
+                if not rule.evaluate(node):
+                    yield (rule, node)
+            stack.extend(reversed(node.children()))
+
+    def messages(self, node):
+        """Generator of the messages of violated rules.
+        See #violations.
+        Return:
+            Yields unicode strings.
+        """
+        for (rule, violator) in self.violations(node):
+            yield rule.message(violator)
+
+    def count(self, node):
+        """Return:
+            Number of violations in node and its descendants.
+        """
+        return sum(1 for _ in self.violations(node))
+
+
 def eval_doc(document, rules):
     """Evaluates a list of rules on a given document.
-    Recursive: can be used for other nodes than Document nodes as well.
+    Can be used for other nodes than Document nodes as well.
     Args:
         document: The Document to check.
         rules:    The rules to evaluate on document.
@@ -162,17 +283,7 @@ def eval_doc(document, rules):
         A list of unicode strings representing the messages
         of violated rules.
     """
-    messages = list()
-    for rule in rules:
-        if not rule.evaluate(document):
-            messages.append(rule.message(document))
-
-    children = document.children()
-    for child in children:
-        messages = messages + eval_doc(child, rules)
-
-    return messages
-
+    return list(RuleEngine(rules).messages(document))
 
 
 if __name__ == '__main__':
@@ -217,6 +328,18 @@ Lorem ipsum dolor sit amet, consectetur adipiscing elit. In lacinia nec massa id
     assert not was_referenced_before(floatB)
     assert was_referenced_before(floatC)
 
+    print u"  Testing ReferenceIndex..."
+    index = _reference_index(sec11)
+    assert index.contains(u"Tabelle 1")
+    assert not index.contains(u"Tabelle 1", index.offset(floatA))
+    assert index.offset(para2) == len(para1.text)
+    assert _reference_index(sec11) is index
+    para2.text = u"Keine Referenz."
+    assert not is_referenced(floatA)
+    assert _reference_index(sec11) is not index
+    para2.text = u"Tabelle 1 zeigt Foobar."
+    assert is_referenced(floatA)
+
     print u"  Testing count_subsections..."
     assert count_subsections(doc) == 2
     assert count_subsections(sec1) == 2
@@ -254,4 +377,25 @@ Lorem ipsum dolor sit amet, consectetur adipiscing elit. In lacinia nec massa id
                      u'Kapitel "2. Raboof" hat keine Einleitung!']
     assert msgs == msgs_expected
 
+    print u"  Testing RuleEngine..."
+    class FloatCaptionRule(Rule):
+        NODE_TYPES = (Float, )
+        def evaluate(self, node):
+            assert isinstance(node, Float)
+            return has_caption(node)
+        def message(self, node):
+            return node.text
+    rules.append(FloatCaptionRule())
+    engine = RuleEngine(rules)
+    assert engine.rules_for(floatA) == rules
+    assert engine.rules_for(sec1) == rules[:1]
+    assert engine.rules_for(para0) == rules[:1]
+    violations = engine.violations(doc)
+    assert violations.next() == (rules[0], sec1)
+    assert list(engine.messages(doc)) == [u'Kapitel "1. Foo" hat keine Einleitung!',
+                                          u"Tabelle 1: Foo bar.",
+                                          u'Kapitel "2. Raboof" hat keine Einleitung!']
+    assert engine.count(doc) == 3
+    assert engine.count(floatB) == 0
+
     print u"Passed all tests!"
@@ -3,11 +3,19 @@
 File: spellcheck.py
 Author: Oliver Zscheyge
 Description:
-    Wrapper for PyEnchant.
+    Spellchecker using a compiled lexicon (see lexicon.py) or PyEnchant.
 '''
 
-import enchant as e
+import os.path as op
+
+try:
+    import enchant as e
+except ImportError:
+    e = None
+
 import confopy.config as C
+from confopy.storage import file_checksum
+from lexicon import Lexicon
 
 ENCHANT_LANG_MAP = {
       u"de": u"de_DE"
@@ -15,26 +23,75 @@ ENCHANT_LANG_MAP = {
 }
 
 def list_languages():
-    pyenchant_langs = e.list_languages()
+    """Return:
+        List of language codes with a compiled lexicon or a PyEnchant
+        dictionary.
+    """
+    pyenchant_langs = list()
+    if e is not None:
+        pyenchant_langs = e.list_languages()
     supported_langs = list()
     for l in ENCHANT_LANG_MAP:
         pyel = ENCHANT_LANG_MAP[l]
-        if pyel in pyenchant_langs:
+        if op.isfile(lexicon_path(l)) or pyel in pyenchant_langs:
             supported_langs.append(l)
     return supported_langs
 
+def lexicon_path(lang):
+    """Return:
+        Path of the compiled lexicon of a language (see
+        config.SPELLING_LEXICONS). Might not exist.
+    """
+    return C.SPELLING_LEXICONS.get(lang, op.join(C.CACHE_DIR, u"lexicon_%s.bin" % lang))
+
 
 class SpellChecker(object):
-    """Wrapper for PyEnchant.
+    """Checks words against the compiled lexicon of the language if there
+    is one, using PyEnchant otherwise.
+    Remembers the result of every checked word, so each distinct word is
+    only looked up once.
     """
+
+    _instances = dict()
+
+    @staticmethod
+    def instance(lang=C.DEFAULT_LANG):
+        """Yields the process wide SpellChecker for a given language.
+        Use this instead of the initializer to share the enchant dictionary
+        and the checked words.
+        Args:
+            lang: Language code, e.g. u"de" or u"en".
+        Return:
+            SpellChecker instance.
+        """
+        checker = SpellChecker._instances.get(lang, None)
+        if checker is None:
+            checker = SpellChecker(lang)
+            SpellChecker._instances[lang] = checker
+        return checker
+
     def __init__(self, lang=C.DEFAULT_LANG):
         """Initializes a spellchecker with a given language.
+        The attribute backend identifies the lexicon (by checksum) or the
+        PyEnchant dictionary the words are checked against.
         Args:
             lang: Language code, e.g. u"de" or u"en", for the spellchecker.
         """
         super(SpellChecker, self).__init__()
-        pyenchant_lang = ENCHANT_LANG_MAP.get(lang, u"de_DE")
-        self._enchant_dict = e.Dict(pyenchant_lang)
+        self._lexicon = None
+        self._enchant_dict = None
+        if op.isfile(lexicon_path(lang)):
+            self._lexicon = Lexicon(lexicon_path(lang))
+            self._lookup = self._lexicon.check
+            self.backend = u"lexicon:%s" % file_checksum(lexicon_path(lang))
+        elif e is not None:
+            pyenchant_lang = ENCHANT_LANG_MAP.get(lang, u"de_DE")
+            self._enchant_dict = e.Dict(pyenchant_lang)
+            self._lookup = self._enchant_dict.check
+            self.backend = u"enchant:%s" % pyenchant_lang
+        else:
+            raise ImportError(u"No spelling lexicon for \"%s\" (%s) and PyEnchant is not installed" % (lang, lexicon_path(lang)))
+        self._checked = dict()
 
     def check(self, word):
         """Checks a given word.
@@ -43,24 +100,83 @@ class SpellChecker(object):
         Return:
             Boolean. True if word is spelled correctly.
         """
-        return self._enchant_dict.check(word)
+        correct = self._checked.get(word, None)
+        if correct is None:
+            correct = bool(self._lookup(word))
+            self._checked[word] = correct
+        return correct
+
+    def check_many(self, words):
+        """Checks a list of words. Duplicates are looked up once.
+        Args:
+            words: List of unicode strings.
+        Return:
+            List of booleans (same order as words). True if the word is
+            spelled correctly.
+        """
+        checked = self._checked
+        for word in set(words):
+            if word not in checked:
+                checked[word] = bool(self._lookup(word))
+        return [checked[word] for word in words]
+
+    def clear(self):
+        """Forgets all checked words.
+        """
+        self._checked.clear()
 
     def suggest(self, word):
+        """Return:
+            List of suggestions for a misspelled word. Empty when using a
+            compiled lexicon.
+        """
+        if self._enchant_dict is None:
+            return list()
         return self._enchant_dict.suggest(word)
 
 
 if __name__ == '__main__':
     print u"Test for %s" % __file__
+    import os
+    import tempfile
+    from lexicon import compile_lexicon
 
-    print u"  Testing SpellChecker..."
-    checker = SpellChecker(u"de")
     word_de = u"Hallo"
     word_en = u"Hello"
+    if e is not None:
+        print u"  Testing SpellChecker with PyEnchant..."
+        checker = SpellChecker(u"de")
+        assert checker.check(word_de)
+        assert not checker.check(word_en)
+        assert len(checker.suggest(word_en)) == 6
+
+    print u"  Testing SpellChecker with a compiled lexicon..."
+    (fd, path) = tempfile.mkstemp()
+    os.close(fd)
+    compile_lexicon([u"hallo", u"Welt"], path)
+    C.SPELLING_LEXICONS[u"de"] = path
+    checker = SpellChecker(u"de")
     assert checker.check(word_de)
     assert not checker.check(word_en)
-    assert len(checker.suggest(word_en)) == 6
+    assert checker.suggest(word_en) == []
+    backend = checker.backend
+    assert backend.startswith(u"lexicon:")
+    compile_lexicon([u"hallo"], path)
+    assert SpellChecker(u"de").backend not in [backend, None]
+    compile_lexicon([u"hallo", u"Welt"], path)
+
+    print u"  Testing SpellChecker.instance and check_many..."
+    assert SpellChecker.instance(u"de") is SpellChecker.instance(u"de")
+    checker = SpellChecker.instance(u"de")
+    assert checker.check_many([word_de, word_en, word_de, u"Welt"]) == [True, False, True, True]
+    assert checker.check_many([]) == []
+    checker.clear()
+    assert checker.check(word_de)
 
     print u"  Testing list_languages..."
-    assert list_languages() == [u"de", u"en"]
+    if e is not None:
+        assert list_languages() == [u"de", u"en"]
+    assert u"de" in list_languages()
+    os.remove(path)
 
     print u"Passed all tests!"
@@ -3,11 +3,14 @@
 File: statistics.py
 Author: Oliver Zscheyge
 Description:
-    Collection of statistics functions.
+    Collection of statistics functions: over lists of values, streaming
+    (RunningStats) and vectorized over a metrics x documents matrix.
 '''
 
 import math
 
+import numpy as np
+
 
 
 def mean(values, ndigits=None):
@@ -72,6 +75,146 @@ def mean_stdev(values, ndigits=None):
     return (mean, sd)
 
 
+class RunningStats(object):
+    """Mean and variance of a stream of values (Welford's algorithm).
+    Values don't have to be kept in memory. RunningStats of disjoint
+    parts of the values (e.g. computed by different workers) can be merged.
+    """
+    def __init__(self, values=None):
+        """Initializer.
+        Args:
+            values: Iterable of initial values. Optional.
+        """
+        super(RunningStats, self).__init__()
+        self.n = 0
+        self.min = None
+        self.max = None
+        self._mean = 0.0
+        self._m2 = 0.0
+        if values is not None:
+            self.extend(values)
+
+    def __len__(self):
+        return self.n
+
+    def push(self, value):
+        """Adds a single value.
+        """
+        self.n += 1
+        delta = value - self._mean
+        self._mean += delta / float(self.n)
+        self._m2 += delta * (value - self._mean)
+        if self.n == 1:
+            self.min = value
+            self.max = value
+        else:
+            self.min = min(self.min, value)
+            self.max = max(self.max, value)
+
+    def extend(self, values):
+        """Adds all values of an iterable.
+        """
+        for v in values:
+            self.push(v)
+
+    def merge(self, other):
+        """Adds the values of another RunningStats (Chan et al.).
+        Return:
+            self
+        """
+        if other.n == 0:
+            return self
+        if self.n == 0:
+            (self.n, self.min, self.max, self._mean, self._m2) = (other.n, other.min, other.max, other._mean, other._m2)
+            return self
+        n = self.n + other.n
+        delta = other._mean - self._mean
+        self._mean += delta * other.n / float(n)
+        self._m2 += other._m2 + delta * delta * self.n * other.n / float(n)
+        self.n = n
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    def mean(self, ndigits=None):
+        """Return:
+            Mean of the values, rounded to ndigits.
+        """
+        if self.n == 0:
+            raise ValueError(u"Can't compute mean over empty list!")
+        if ndigits is not None:
+            return round(self._mean, ndigits)
+        return self._mean
+
+    def variance(self, ndigits=None):
+        """Return:
+            Variance of at least 2 values, rounded to ndigits.
+        """
+        if self.n < 2:
+            raise ValueError(u"Can't compute variance over less than 2 values.")
+        var = max(self._m2, 0.0) / float(self.n)
+        if ndigits is not None:
+            return round(var, ndigits)
+        return var
+
+    def stdev(self, ndigits=None):
+        """Return:
+            Standard deviation of at least 2 values, rounded to ndigits.
+        """
+        sd = math.sqrt(self.variance())
+        if ndigits is not None:
+            return round(sd, ndigits)
+        return sd
+
+    def mean_stdev(self, ndigits=None):
+        """Return:
+            (mean, standard deviation) tuple of at least 2 values, rounded
+            to ndigits.
+        """
+        return (self.mean(ndigits), self.stdev(ndigits))
+
+
+def matrix_stats(matrix, percentiles=(25, 50, 75), ndigits=None):
+    """Statistics of every row of a matrix, e.g. metrics x documents.
+    Args:
+        matrix:      List of equally long lists of values (or 2 dimensional
+                     numpy array), each row having at least 2 values.
+        percentiles: Percentiles (0 to 100) to compute.
+        ndigits:     Number of digits to round to.
+    Return:
+        Dictionary u"mean"/u"stdev"/u"min"/u"max" --> numpy array with
+        one value per row and u"percentiles" --> numpy array with one row
+        per matrix row and one column per percentile.
+    """
+    rows = len(matrix)
+    m = np.array(matrix, dtype=float).reshape(rows, -1) if rows > 0 else np.empty((0, 2))
+    if m.shape[1] < 2:
+        raise ValueError(u"Can't compute variance/standard deviation over less than 2 values.")
+    stats = {u"mean":  m.mean(axis=1),
+             u"stdev": m.std(axis=1),
+             u"min":   m.min(axis=1),
+             u"max":   m.max(axis=1)}
+    percentiles = list(percentiles)
+    if rows > 0 and percentiles:
+        stats[u"percentiles"] = np.asarray(np.percentile(m, percentiles, axis=1)).reshape(len(percentiles), rows).T
+    else:
+        stats[u"percentiles"] = np.empty((rows, len(percentiles)))
+    if ndigits is not None:
+        for (key, values) in stats.items():
+            stats[key] = round_array(values, ndigits)
+    return stats
+
+def round_array(values, ndigits):
+    """Rounds every element of a numpy array like round() (numpy rounds
+    halves to even).
+    Return:
+        numpy array of floats with the shape of values.
+    """
+    values = np.asarray(values, dtype=float)
+    return np.array([round(v, ndigits) for v in values.flat]).reshape(values.shape)
+
+
+
 
 if __name__ == '__main__':
     print u"Test for %s" % __file__
@@ -108,6 +251,36 @@ if __name__ == '__main__':
     stats_rounded = mean_stdev(values, 2)
     assert stats_rounded == (4.5, 2.87)
 
+    print u"  Testing RunningStats..."
+    stats = RunningStats(values)
+    assert len(stats) == 10
+    assert stats.mean() == m
+    assert abs(stats.variance() - var) < 1e-12
+    assert stats.mean_stdev(2) == (4.5, 2.87)
+    assert (stats.min, stats.max) == (0, 9)
+    merged = RunningStats()
+    for part in [values[:3], [], values[3:4], values[4:]]:
+        merged.merge(RunningStats(part))
+    assert merged.n == 10 and (merged.min, merged.max) == (0, 9)
+    assert abs(merged.mean() - m) < 1e-12
+    assert abs(merged.variance() - var) < 1e-12
+    assert_raises(RunningStats().mean, None, u"Mean of empty RunningStats did not fail!")
+    assert_raises(RunningStats([42]).stdev, None, u"Stdev of 1 element RunningStats did not fail!")
+
+    print u"  Testing matrix_stats..."
+    matrix = [values, [v * v for v in values], [1.0] * 10]
+    stats = matrix_stats(matrix, [0, 50, 100], 2)
+    for (i, row) in enumerate(matrix):
+        assert (stats[u"mean"][i], stats[u"stdev"][i]) == mean_stdev(row, 2)
+        assert (stats[u"min"][i], stats[u"max"][i]) == (min(row), max(row))
+    assert stats[u"percentiles"].shape == (3, 3)
+    assert list(stats[u"percentiles"][0]) == [0.0, 4.5, 9.0]
+    assert list(stats[u"percentiles"][2]) == [1.0, 1.0, 1.0]
+    assert matrix_stats([])[u"mean"].shape == (0, )
+    assert list(round_array([[2.125, 0.5]], 2)[0]) == [2.13, 0.5]
+    assert list(round_array([2.5, 3.5], 0)) == [3.0, 4.0]
+    assert_raises(matrix_stats, [[42]], u"Matrix stats of 1 value rows did not fail!")
+
     print u"Passed all tests!"
 
 
@@ -0,0 +1,239 @@
+# coding: utf-8
+'''
+File: tagging.py
+Author: Oliver Zscheyge
+Description:
+    POS tagging of whole documents. Tags are computed once per document
+    and stored next to its TokenTable, nodes get slices of them.
+'''
+
+import time
+import weakref
+from array import array
+
+NO_TAG = -1
+
+
+class TagTable(object):
+    """POS tags of all tokens of a TokenTable.
+    Attributes:
+        tags: List of distinct tags (unicode strings).
+        ids:  array of tag IDs (index into tags, NO_TAG for untagged
+              tokens), one per token of the TokenTable.
+    """
+    def __init__(self):
+        super(TagTable, self).__init__()
+        self.tags = list()
+        self._tag_IDs = dict()
+        self.ids = array("i")
+
+    def __len__(self):
+        return len(self.ids)
+
+    def append(self, tag):
+        if tag is None:
+            self.ids.append(NO_TAG)
+            return
+        ID = self._tag_IDs.get(tag, None)
+        if ID is None:
+            ID = len(self.tags)
+            self._tag_IDs[tag] = ID
+            self.tags.append(tag)
+        self.ids.append(ID)
+
+    def slice(self, begin, end):
+        """Return:
+            List of the tags (None for untagged tokens) of a token range.
+        """
+        tags = self.tags
+        return [tags[i] if i != NO_TAG else None for i in self.ids[begin:end]]
+
+
+class TaggingService(object):
+    """Tags documents with the tagger and sentence tokenizer of a corpus.
+    The text of every node is split into sentences which are tagged one by
+    one, so the tags of a subtree don't depend on the rest of the document.
+    Every document (TokenTable) is tagged once.
+    """
+
+    _services = weakref.WeakKeyDictionary()
+
+    @staticmethod
+    def of(corpus):
+        """Yields the TaggingService of a given corpus.
+        """
+        service = TaggingService._services.get(corpus, None)
+        if service is None:
+            service = TaggingService(corpus)
+            TaggingService._services[corpus] = service
+        return service
+
+    def __init__(self, corpus):
+        """Initializer.
+        Args:
+            corpus: Corpus providing tagger() and sent_tokenizer().
+        """
+        super(TaggingService, self).__init__()
+        self.corpus = corpus
+        self._tables = weakref.WeakKeyDictionary()
+
+    def tag_table(self, node):
+        """Return:
+            TagTable of the document node belongs to.
+        """
+        tokens = node.token_table()
+        table = self._tables.get(tokens, None)
+        if table is None:
+            table = self._tag(node, tokens)
+            self._tables[tokens] = table
+        return table
+
+    def tags(self, node):
+        """Return:
+            List of the tags of node and its descendants.
+        """
+        (begin, end) = node.token_table().span(node)
+        return self.tag_table(node).slice(begin, end)
+
+    def tagged_words(self, node):
+        """Return:
+            List of (word, tag) tuples of node and its descendants (same
+            words as node.words()).
+        """
+        tokens = node.token_table()
+        (begin, end) = tokens.span(node)
+        return zip(tokens.words(begin, end), self.tag_table(node).slice(begin, end))
+
+    def _tag(self, node, tokens):
+        root = node
+        while root.parent() is not None:
+            root = root.parent()
+        tagger = self.corpus.tagger(True)
+        sent_tokenizer = self.corpus.sent_tokenizer()
+        table = TagTable()
+        for (text, begin, end) in _texts(root, tokens):
+            for sent in _sentences(text, sent_tokenizer, tokens, begin, end):
+                for (_, tag) in tagger.tag(tokens.words(*sent)):
+                    table.append(tag)
+        return table
+
+
+def _texts(root, tokens):
+    """Generator of (text, begin, end) tuples: the own text of every node of
+    the tree in pre-order and the range of its tokens in the TokenTable.
+    """
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        children = node.children()
+        (begin, end) = tokens.span(node)
+        if children:
+            # Own tokens precede those of the children
+            end = tokens.span(children[0])[0]
+        yield (node.text, begin, end)
+        stack.extend(reversed(children))
+
+def _sentences(text, sent_tokenizer, tokens, begin, end):
+    """Splits a token range of a single text into sentences.
+    Return:
+        List of (begin, end) token ranges.
+    """
+    if begin == end:
+        return list()
+    span_tokenize = getattr(sent_tokenizer, u"span_tokenize", None)
+    if span_tokenize is None:
+        return [(begin, end)]
+    sents = list()
+    sent_begin = begin
+    sent_spans = list(span_tokenize(text))
+    s = 0
+    for i in xrange(begin, end):
+        # Token starting after the current sentence belongs to a later one
+        while s < len(sent_spans) and tokens.starts[i] >= sent_spans[s][1]:
+            s += 1
+            if i > sent_begin:
+                sents.append((sent_begin, i))
+                sent_begin = i
+    sents.append((sent_begin, end))
+    return sents
+
+
+def benchmark(corpus, node, repeat=3):
+    """Compares the tagging throughput of TaggingService with tagging the
+    words of node and of each of its sections with the corpus' tagger
+    (as every metric context used to).
+    Args:
+        corpus: Corpus providing tagger() and sent_tokenizer().
+        node:   Node (e.g. Document) to tag.
+        repeat: Number of runs to average.
+    Return:
+        Dictionary u"service"/u"tagger" --> tokens per second.
+    """
+    nodes = [node] + node.sections()
+    token_count = sum([len(n.words()) for n in nodes])
+    tagger = corpus.tagger(True)
+    result = dict()
+
+    start = time.time()
+    for i in xrange(repeat):
+        for n in nodes:
+            tagger.tag(n.words())
+    result[u"tagger"] = token_count * repeat / max(time.time() - start, 1e-9)
+
+    start = time.time()
+    for i in xrange(repeat):
+        service = TaggingService(corpus)
+        for n in nodes:
+            service.tagged_words(n)
+    result[u"service"] = token_count * repeat / max(time.time() - start, 1e-9)
+    return result
+
+
+
+if __name__ == '__main__':
+    print u"Test for %s" % __file__
+    import re
+    from confopy.model.document import Document, Paragraph, Section
+
+    class _Corpus(object):
+        """Fake corpus: tags depend on the previous word of the sentence.
+        """
+        def __init__(self):
+            self.tagged = list()
+        def tagger(self, include_edgelabels=True):
+            return self
+        def sent_tokenizer(self):
+            return self
+        def span_tokenize(self, text):
+            return [m.span() for m in re.finditer(u"[^.!?]+[.!?]*", text)]
+        def tag(self, words):
+            self.tagged.append(list(words))
+            prev = [None] + words[:-1]
+            return [(w, None if w == u"?" else u"%s<%s" % (w, p)) for (w, p) in zip(words, prev)]
+
+    print u"  Testing TaggingService..."
+    corpus = _Corpus()
+    para1 = Paragraph(text=u"Der Hase springt. Er lacht!")
+    para2 = Paragraph(text=u"Wer lacht?")
+    sec = Section(title=u"1. Foo", children=[para2])
+    doc = Document(children=[para1, sec])
+    service = TaggingService.of(corpus)
+    assert TaggingService.of(corpus) is service
+    assert service.tagged_words(para2) == [(u"Wer", u"Wer<None"), (u"lacht", u"lacht<Wer"), (u"?", None)]
+    assert corpus.tagged == [[u"Der", u"Hase", u"springt", u"."], [u"Er", u"lacht", u"!"], [u"Wer", u"lacht", u"?"]]
+    sents = list(corpus.tagged)
+    assert service.tags(doc) == [t for s in sents for (_, t) in corpus.tag(s)]
+    assert service.tags(sec) == service.tags(para2)
+    assert service.tagged_words(doc)[4] == (u"Er", u"Er<None")
+    assert len(corpus.tagged) == 3 + 3
+
+    print u"  Testing re-tagging after changes..."
+    para2.text = u"Niemand."
+    assert service.tags(sec) == [u"Niemand<None", u".<Niemand"]
+    assert service.tag_table(doc) is service.tag_table(para1)
+
+    print u"  Testing benchmark..."
+    result = benchmark(corpus, doc, 1)
+    assert result[u"service"] > 0.0 and result[u"tagger"] > 0.0
+
+    print u"Passed all tests!"
@@ -1,7 +1,27 @@
 # coding: utf-8
 
+import os
+import os.path as op
+
 DEFAULT_LANG = u"de"
 CORPUS_FILES = {
     u"de": u"tiger_release_aug07.corrected.16012013_utf8_patched.xml",
     u"en": u"",
 }
+# Directory for precomputed data (e.g. metric values of reference corpora,
+# taggers trained on them). Can be overridden by CONFOPY_CACHE_DIR
+CACHE_DIR = os.environ.get("CONFOPY_CACHE_DIR", "").decode("utf8") or \
+            op.join(op.expanduser(u"~"), u".cache", u"confopy")
+# Size limit (bytes) of the cache of extracted PDF documents. 0 disables it
+DOCUMENT_CACHE_SIZE = 256 * 1024 * 1024
+# Compiled spelling lexicons (see option -cl). Used instead of PyEnchant
+# for a language if the file exists
+SPELLING_LEXICONS = {
+    u"de": op.join(CACHE_DIR, u"lexicon_de.bin"),
+    u"en": op.join(CACHE_DIR, u"lexicon_en.bin"),
+}
+# SQLite database recording the metric values of all analyzed documents
+# (see option --cohort and report "history"). None disables it
+RESULT_STORE = op.join(CACHE_DIR, u"results.sqlite")
+# Maximum number of remembered results per word lookup (e.g. lemmata)
+LOOKUP_CACHE_SIZE = 200000
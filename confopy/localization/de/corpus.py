@@ -1,6 +1,20 @@
 # coding: utf-8
 
-from confopy.analysis import Analyzer
-from confopy.localization.de.corpus_de import TigerCorpusReader
+from confopy.analysis import Analyzer, LazyCorpus
+from confopy.storage import file_checksum
 
-Analyzer.register(TigerCorpusReader(cache=False))
+
+def _tiger():
+    from confopy.localization.de.corpus_de import TigerCorpusReader
+    return TigerCorpusReader(cache=True)
+
+def tiger_checksum():
+    """Identifies the TIGER corpus (e.g. for stored reference values)
+    without loading it.
+    Raises:
+        IOError, OSError if the corpus file is missing.
+    """
+    from confopy.localization.de.corpus_de import TigerCorpusReader
+    return file_checksum(TigerCorpusReader.default_file())
+
+Analyzer.register(LazyCorpus(u"TIGER", u"de", _tiger, u"TIGER Treebank v2.2", u"TIGER deutscher Corpus", tiger_checksum))
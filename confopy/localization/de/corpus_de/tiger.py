@@ -11,8 +11,8 @@ Description:
         http://nltk.org/book/ch02.html
 '''
 
+import os
 import os.path as op
-from cPickle import dump, load
 from lxml import etree
 
 import nltk
@@ -21,9 +21,13 @@ from nltk.corpus import BracketParseCorpusReader
 from nltk.grammar import CFG, Nonterminal, induce_pcfg
 from nltk.tokenize.punkt import PunktTrainer, PunktSentenceTokenizer
 
+from confopy.analysis.compiled_tagger import CompiledTagger, compile_tagger
 from confopy.analysis.corpus import Corpus
 import confopy.config as C
+from confopy.analysis.mmapstore import StoreError
+from confopy.storage import ArtifactStore, cache_path, file_checksum, load_pickle, save_pickle
 from fillers_de import FILLERS_DE
+from tiger_compiled import CompiledTigerCorpus, compile_tiger
 
 class _Terminal(object):
     """docstring for _Terminal"""
@@ -119,29 +123,11 @@ class _TigerSentence(object):
             return nltk.Tree(cat, children)
         return None
 
-def _cached(obj, filepath, constructor):
-    if obj is not None:
-        return obj
-
-    new_obj = None
-    try:
-        with open(filepath, 'rb') as f:
-            new_obj = load(f)
-    except IOError as e:
-        #print u"Cache: couldn't read from %s" % filepath
-        #print unicode(e)
-        pass
-    if new_obj is None:
-        new_obj = constructor()
-        try:
-            with open(filepath, 'wb') as f:
-                dump(new_obj, f, -1)
-        except IOError as e:
-            #print u"Cache: couldn't write to %s" % filepath
-            #print unicode(e)
-            pass
-    return new_obj
-
+# TIGER morphology --> pattern.de constants
+_NO_LEMMA = [u"", u"--", u"unknown"]
+_PATTERN_TENSES = {u"Pres": u"present", u"Past": u"past"}
+_PATTERN_NUMBERS = {u"Sg": u"singular", u"Pl": u"plural"}
+_PATTERN_MOODS = {u"Ind": u"indicative", u"Subj": u"subjunctive", u"Imp": u"imperative"}
 
 class TigerCorpusReader(Corpus):
     """Reads TIGER Corpus from XML file in Negra Format, Version 4.
@@ -150,52 +136,89 @@ class TigerCorpusReader(Corpus):
     """
 
     STORAGE_ROOT = op.dirname(op.realpath(__file__))
-    CORPUS_FILE = u"_tiger_corpus.pkl"
-    TAGGER_FILE = u"_tiger_tagger.pkl"
 
-    SENTS_FILE_SUFFIX = u"_sents.pkl"
-    PCFG_FILE_SUFFIX  = u"_pcfg.pkl"
+    # Artifacts (see ArtifactStore) built from the corpus.
+    # Bump a version if the way the artifact is built changes.
+    TAGGER_ARTIFACT = u"tiger_tagger"
+    TAGGER_VERSION = 1
+    PCFG_ARTIFACT = u"tiger_pcfg"
+    PCFG_VERSION = 1
+    SENT_TOKENIZER_ARTIFACT = u"tiger_sent_tkzr"
+    SENT_TOKENIZER_VERSION = 1
+
+    COMPILED_FILE_SUFFIX = u"_compiled.bin"
     PCFG_PARSER_FILE_SUFFIX = u"_pcfg_parser.pkl"
-    SENT_TOKENIZER_FILE_SUFFIX = u"_sent_tkzr.pkl"
 
     GRAMMAR_START = u"VROOT"
     FEATURE_SEP = u"-"
     NO_VALUE = u"_"
 
+    @staticmethod
+    def default_file():
+        """Return:
+            Path of the TIGER XML file (see config.CORPUS_FILES).
+        """
+        return TigerCorpusReader.STORAGE_ROOT + u"/" + C.CORPUS_FILES.get(u"de", u"")
+
     def __init__(self, tigerfile=None, cache=False):
         super(TigerCorpusReader, self).__init__(ID=u"TIGER", language=u"de", brief=u"TIGER Treebank v2.2", description=u"TIGER deutscher Corpus")
         self._tagger = None
         self._pcfg = None
         self._pcfg_parser = None
         self._sent_tokenizer = None
+        self._checksum = None
         self._tigerfile = tigerfile
         if self._tigerfile is None:
             #self._tigerfile = TigerCorpusReader.STORAGE_ROOT + u"/tiger_corpus/tiger_release_aug07.corrected.16012013_utf8_patched_half.xml"
-            self._tigerfile = TigerCorpusReader.STORAGE_ROOT + u"/" + C.CORPUS_FILES.get(u"de", u"")
+            self._tigerfile = TigerCorpusReader.default_file()
         self.tiger_sents = None
-        if cache:
-            try:
-                with open(self._tigerfile + TigerCorpusReader.SENTS_FILE_SUFFIX, 'rb') as f:
-                    self.tiger_sents = load(f)
-            except IOError:
-                self.tiger_sents = None
-        if self.tiger_sents is None:
-            try:
-                context = etree.iterparse(self._tigerfile, events=("end",), tag=u"s", encoding=u"utf-8")
-                self.tiger_sents = self._fast_iter(context, self._sent_func)
-                if cache:
-                    try:
-                        with open(self._tigerfile + TigerCorpusReader.SENTS_FILE_SUFFIX, 'wb') as f:
-                            dump(self.tiger_sents, f, -1)
-                    except IOError:
-                        self.tiger_sents = []
-                        print u"Could not cache TIGER sentences to %s%s" % (self._tigerfile, TigerCorpusReader.SENTS_FILE_SUFFIX)
-            except IOError:
-                print u"Error: TIGER corpus file not found. Please follow README to download and place it properly."
-                print u"       (A file named " + C.CORPUS_FILES.get(u"de", u"")
-                print u"        needs to be placed here: " + TigerCorpusReader.STORAGE_ROOT + u")"
-                import sys
-                sys.exit(1)
+        try:
+            if cache:
+                self.tiger_sents = self._compiled_sents()
+            else:
+                self.tiger_sents = self._fast_iter(self._iterparse(), self._sent_func)
+        except IOError:
+            print u"Error: TIGER corpus file not found. Please follow README to download and place it properly."
+            print u"       (A file named " + C.CORPUS_FILES.get(u"de", u"")
+            print u"        needs to be placed here: " + TigerCorpusReader.STORAGE_ROOT + u")"
+            import sys
+            sys.exit(1)
+
+    def _iterparse(self):
+        return etree.iterparse(self._tigerfile, events=("end",), tag=u"s", encoding=u"utf-8")
+
+    def _compiled_path(self):
+        """Path of the compiled corpus file. Next to the XML file if
+        possible, otherwise in the Confopy cache directory.
+        """
+        if os.access(op.dirname(op.realpath(self._tigerfile)), os.W_OK):
+            return self._tigerfile + TigerCorpusReader.COMPILED_FILE_SUFFIX
+        return cache_path(op.basename(self._tigerfile) + TigerCorpusReader.COMPILED_FILE_SUFFIX)
+
+    def _compiled_sents(self):
+        """Opens the compiled (memory-mapped) version of the corpus.
+        The compiled file is (re-)built from the XML file if it is missing
+        or older than the XML file.
+        Return:
+            CompiledTigerCorpus.
+        Raises:
+            IOError if neither the XML nor the compiled file exist.
+        """
+        path = self._compiled_path()
+        source = None
+        if op.exists(self._tigerfile):
+            stat = os.stat(self._tigerfile)
+            source = {u"size": stat.st_size, u"mtime": stat.st_mtime}
+        try:
+            compiled = CompiledTigerCorpus(path)
+            if source is None or compiled.meta.get(u"source", None) == source:
+                return compiled
+        except (IOError, StoreError):
+            if source is None:
+                raise IOError(u"TIGER corpus file not found: %s" % self._tigerfile)
+        sents = self._lazy_iter(self._iterparse(), self._sent_func)
+        compile_tiger(sents, path, {u"source": source})
+        return CompiledTigerCorpus(path)
 
     def _fast_iter(self, context, func):
         buf = list()
@@ -207,6 +230,14 @@ class TigerCorpusReader(Corpus):
         del context
         return buf
 
+    def _lazy_iter(self, context, func):
+        for event, elem in context:
+            yield func(elem)
+            elem.clear()
+            while elem.getprevious() is not None:
+                del elem.getparent()[0]
+        del context
+
     def _sent_func(self, sent):
         return _TigerSentence(sent)
 
@@ -249,10 +280,12 @@ class TigerCorpusReader(Corpus):
     def tagger(self, include_edgelabels=True):
         """Creates a tagger from the TIGER Corpus.
         Depending on the corpus size, this can be a lengthy process.
-        To speed up subsequent calls, the tagger is dumped to TAGGER_FILE in
-        STORAGE_ROOT at the first call and only loaded for all following calls.
+        To speed up subsequent calls, the trained tagger is compiled into
+        the ArtifactStore at the first call (and whenever the corpus
+        changes) and only mapped for all following calls.
         Return:
-            A nltk tagger for the TIGER Corpus.
+            A tagger for the TIGER Corpus (CompiledTagger, the nltk
+            BigramTagger right after training).
         """
         if self._tagger:
             return self._tagger
@@ -263,9 +296,26 @@ class TigerCorpusReader(Corpus):
             bigram_tagger = nltk.BigramTagger(tagged_sents, backoff=unigram_tagger)
             return bigram_tagger
 
-        self._tagger = _cached(self._tagger, TigerCorpusReader.STORAGE_ROOT + u"/" + TigerCorpusReader.TAGGER_FILE, constructor)
+        def load(path):
+            try:
+                return CompiledTagger(path)
+            except StoreError:
+                return None
+
+        def save(tagger, path):
+            compile_tagger(tagger, path, {u"corpus": self.checksum(), u"edgelabels": include_edgelabels})
+
+        self._tagger = self._artifact(TigerCorpusReader.TAGGER_ARTIFACT,
+                                      (TigerCorpusReader.TAGGER_VERSION, include_edgelabels),
+                                      constructor, load, save, u".bin")
         return self._tagger
 
+    def _artifact(self, name, version, constructor, load=load_pickle, save=save_pickle, suffix=u".pkl"):
+        """Loads an artifact built from this corpus from the ArtifactStore
+        (building it if necessary).
+        """
+        return ArtifactStore.instance().get(name, self.checksum(), version, constructor, load, save, suffix)
+
     def pcfg(self, include_edgelabels=True):
         sents = self.parsed_sents(include_edgelabels)
         tiger_prods = set(prod for sent in sents for prod in sent.productions())
@@ -288,7 +338,10 @@ class TigerCorpusReader(Corpus):
         def constructor():
             return self.pcfg(include_edgelabels)
 
-        self._pcfg = _cached(self._pcfg, TigerCorpusReader.STORAGE_ROOT + u"/" + TigerCorpusReader.PCFG_FILE_SUFFIX, constructor)
+        if self._pcfg is None:
+            self._pcfg = self._artifact(TigerCorpusReader.PCFG_ARTIFACT,
+                                        (TigerCorpusReader.PCFG_VERSION, include_edgelabels),
+                                        constructor)
         self._pcfg_parser = nltk.ViterbiParser(self._pcfg)
         return self._pcfg_parser
 
@@ -304,19 +357,65 @@ class TigerCorpusReader(Corpus):
             params = trainer.get_params()
             return PunktSentenceTokenizer(params)
 
-        self._sent_tokenizer = _cached(self._sent_tokenizer, TigerCorpusReader.STORAGE_ROOT + u"/" + TigerCorpusReader.SENT_TOKENIZER_FILE_SUFFIX, constructor)
+        self._sent_tokenizer = self._artifact(TigerCorpusReader.SENT_TOKENIZER_ARTIFACT,
+                                              TigerCorpusReader.SENT_TOKENIZER_VERSION,
+                                              constructor)
         return self._sent_tokenizer
 
     def fillers(self):
         return FILLERS_DE
 
+    def verb_forms(self):
+        """Return:
+            List of (word, lemma, tense, person, number, mood) tuples, one
+            per verb of the corpus.
+        """
+        if isinstance(self.tiger_sents, CompiledTigerCorpus):
+            return self.tiger_sents.verb_forms()
+        return [(t.word, t.lemma, t.tense, t.person, t.number, t.mood)
+                for s in self.tiger_sents for t in s.terminals if t.pos.startswith(u"V")]
+
+    def verb_lemmata(self):
+        """Lemmata of the verb forms in the corpus (the most frequent one
+        for ambiguous forms).
+        Return:
+            List of (word, lemma) tuples.
+        """
+        counts = dict()
+        for (word, lemma, _, _, _, _) in self.verb_forms():
+            if lemma not in _NO_LEMMA:
+                lemmata = counts.setdefault(word, dict())
+                lemmata[lemma] = lemmata.get(lemma, 0) + 1
+        return [(word, max(sorted(lemmata.keys()), key=lemmata.get)) for (word, lemmata) in counts.items()]
+
+    def verb_tenses(self):
+        """Tenses of the finite verb forms in the corpus, in the format of
+        pattern.de's tenses() function:
+            (tense, person, number, mood, aspect)
+        Return:
+            List of (word, list of tense tuples) tuples.
+        """
+        tenses = dict()
+        for (word, _, tense, person, number, mood) in self.verb_forms():
+            if tense in _PATTERN_TENSES:
+                tenses.setdefault(word, set()).add((_PATTERN_TENSES[tense],
+                                                    int(person) if person.isdigit() else None,
+                                                    _PATTERN_NUMBERS.get(number, None),
+                                                    _PATTERN_MOODS.get(mood, None),
+                                                    u"imperfective"))
+        return [(word, sorted(ts)) for (word, ts) in tenses.items()]
+
+    def checksum(self):
+        if self._checksum is None:
+            self._checksum = file_checksum(self._tigerfile)
+        return self._checksum
+
 
 
-CORPUS_PATH = TigerCorpusReader.STORAGE_ROOT + u"/" + TigerCorpusReader.CORPUS_FILE
 def test_parse():
     print u"%s: Parse test" % (__file__, )
     print u"Using TIGER corpus to parse a sentence."
-    tiger_corpus = _cached(None, CORPUS_PATH, TigerCorpusReader)
+    tiger_corpus = TigerCorpusReader(cache=True)
 
     sents = tiger_corpus.parsed_sents()
     print unicode(sents[3])
@@ -343,7 +442,7 @@ def test_grammar_parse():
     print u"%s: Grammar test" % (__file__, )
     print u"Deriving grammar from parsed TIGER corpus sentences"
     #tiger_corpus = TigerCorpusReader()
-    tiger_corpus = _cached(None, CORPUS_PATH, TigerCorpusReader)
+    tiger_corpus = TigerCorpusReader(cache=True)
     grammar_parser = tiger_corpus.viterbi_parser(False)
     grammar_parser.trace()
 
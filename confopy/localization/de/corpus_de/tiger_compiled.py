@@ -0,0 +1,279 @@
+# coding: utf-8
+'''
+File: tiger_compiled.py
+Author: Oliver Zscheyge
+Description:
+    Compiled, memory-mapped representation of the TIGER corpus.
+
+    Words, lemmata, POS tags, morphological features and edge labels are
+    interned in string tables. Terminals, non-terminals and edges are
+    stored column wise as integer arrays. Sentences are only decoded
+    when accessed.
+'''
+
+from array import array
+
+import nltk
+import numpy as np
+
+from confopy.analysis.mmapstore import Interner, MappedStore, write_store, string_sections
+
+KIND = u"tiger"
+VERSION = 1
+
+NO_EDGE_LABELS = [u"", u"--"]
+MISSING = -1
+
+_TABLES = [u"word", u"lemma", u"pos", u"feature", u"label", u"ident"]
+_FEATURES = [u"morph", u"case", u"number", u"gender", u"person", u"tense", u"mood"]
+_TERMINAL_COLUMNS = [(u"t_word", u"word"), (u"t_lemma", u"lemma"), (u"t_pos", u"pos")] + \
+                    [(u"t_" + f, u"feature") for f in _FEATURES]
+_VERB_FORM_COLUMNS = [(u"t_word", u"word"), (u"t_lemma", u"lemma"), (u"t_tense", u"feature"),
+                      (u"t_person", u"feature"), (u"t_number", u"feature"), (u"t_mood", u"feature")]
+_COLUMNS = [c for (c, _) in _TERMINAL_COLUMNS] + \
+           [u"t_edge", u"s_id", u"s_term", u"s_nt", u"s_vroot", u"nt_cat", u"nt_edges", u"e_label", u"e_target"]
+
+
+def compile_tiger(sents, path, meta=None):
+    """Writes TIGER sentences to a compiled corpus file.
+    Args:
+        sents: Iterable of _TigerSentence objects.
+        path:  Target file.
+        meta:  Dictionary with additional info about the source of the
+               sentences (e.g. file size and modification time).
+    """
+    tables = dict([(name, Interner()) for name in _TABLES])
+    cols = dict([(name, array("i")) for name in _COLUMNS])
+    cols[u"s_term"].append(0)
+    cols[u"s_nt"].append(0)
+    cols[u"nt_edges"].append(0)
+    label = tables[u"label"]
+
+    for s in sents:
+        cols[u"s_id"].append(tables[u"ident"](unicode(s.ID)))
+        term_index = dict()
+        for (i, t) in enumerate(s.terminals):
+            term_index[t.ID] = i
+            for (col, table) in _TERMINAL_COLUMNS:
+                cols[col].append(tables[table](getattr(t, col[2:])))
+            cols[u"t_edge"].append(label(s.edges.get(t.ID, u"")))
+
+        nt_index = dict()
+        vroot = MISSING
+        for (i, nt) in enumerate(s.non_terminals):
+            nt_index[nt.ID] = i
+            if nt.cat == u"VROOT":
+                vroot = i
+        for nt in s.non_terminals:
+            cols[u"nt_cat"].append(label(nt.cat))
+            for (elabel, idref) in nt.edges:
+                cols[u"e_label"].append(label(elabel))
+                if idref in term_index:
+                    cols[u"e_target"].append(2 * term_index[idref])
+                elif idref in nt_index:
+                    cols[u"e_target"].append(2 * nt_index[idref] + 1)
+                else:
+                    cols[u"e_target"].append(MISSING)
+            cols[u"nt_edges"].append(len(cols[u"e_label"]))
+
+        cols[u"s_term"].append(len(cols[u"t_word"]))
+        cols[u"s_nt"].append(len(cols[u"nt_cat"]))
+        cols[u"s_vroot"].append(vroot)
+
+    sections = dict()
+    for name in _COLUMNS:
+        sections[name] = np.frombuffer(cols[name], dtype=np.intc).astype("<i4")
+    for name in _TABLES:
+        sections.update(string_sections(name, tables[name].strings))
+    write_store(path, KIND, VERSION, meta or dict(), sections)
+
+
+class CompiledTigerCorpus(object):
+    """Sequence of TIGER sentences served from a compiled corpus file.
+    """
+    def __init__(self, path):
+        """Initializer.
+        Raises:
+            IOError, StoreError if path is no compiled TIGER corpus.
+        """
+        super(CompiledTigerCorpus, self).__init__()
+        store = MappedStore(path, KIND, VERSION)
+        self.meta = store.meta
+        self.tables = dict([(name, store.strings(name)) for name in _TABLES])
+        self.cols = dict([(name, store.array(name)) for name in _COLUMNS])
+
+    def __len__(self):
+        return len(self.cols[u"s_id"])
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if index < 0 or index >= len(self):
+            raise IndexError(u"sentence index out of range")
+        return _CompiledTigerSentence(self, index)
+
+    def __iter__(self):
+        for i in xrange(len(self)):
+            yield _CompiledTigerSentence(self, i)
+
+    def words(self):
+        """Return:
+            List of all words of the corpus.
+        """
+        words = self.tables[u"word"]
+        return [words[i] for i in self.cols[u"t_word"].tolist()]
+
+    def verb_forms(self):
+        """Return:
+            List of (word, lemma, tense, person, number, mood) tuples, one
+            per verb terminal (STTS tags V*) of the corpus.
+        """
+        pos = self.tables[u"pos"]
+        verb_tags = [i for i in xrange(len(pos)) if pos[i].startswith(u"V")]
+        terminals = np.nonzero(np.in1d(self.cols[u"t_pos"], verb_tags))[0]
+        columns = list()
+        for (col, table) in _VERB_FORM_COLUMNS:
+            strings = self.tables[table]
+            columns.append([strings[i] for i in self.cols[col][terminals].tolist()])
+        return zip(*columns)
+
+
+class _CompiledTigerSentence(object):
+    """View on a single sentence of a CompiledTigerCorpus.
+    Offers the same methods as _TigerSentence.
+    """
+    def __init__(self, corpus, index):
+        super(_CompiledTigerSentence, self).__init__()
+        self._corpus = corpus
+        self._index = index
+        self.ID = corpus.tables[u"ident"][int(corpus.cols[u"s_id"][index])]
+
+    def _terminals(self, column):
+        cols = self._corpus.cols
+        start = int(cols[u"s_term"][self._index])
+        end = int(cols[u"s_term"][self._index + 1])
+        return cols[column][start:end].tolist()
+
+    def words(self):
+        words = self._corpus.tables[u"word"]
+        return [words[i] for i in self._terminals(u"t_word")]
+
+    def tagged_words(self, include_edgelabels=True):
+        words = self._corpus.tables[u"word"]
+        tags = self._corpus.tables[u"pos"]
+        labels = self._corpus.tables[u"label"]
+        buf = list()
+        for (w, p, e) in zip(self._terminals(u"t_word"), self._terminals(u"t_pos"), self._terminals(u"t_edge")):
+            tag = tags[p]
+            elabel = labels[e]
+            if include_edgelabels and elabel not in NO_EDGE_LABELS:
+                tag = u"%s-%s" % (tag, elabel)
+            buf.append((words[w], tag))
+        return buf
+
+    def parsed(self, include_edgelabels=True):
+        cols = self._corpus.cols
+        vroot = int(cols[u"s_vroot"][self._index])
+        if vroot != MISSING:
+            nt_offset = int(cols[u"s_nt"][self._index])
+            return self._tree(nt_offset, vroot, 2 * vroot + 1, u"", include_edgelabels)
+        return nltk.Tree(u"", [])
+
+    def _tree(self, nt_offset, vroot, target, label, include_edgelabels):
+        if target == MISSING:
+            return None
+        cols = self._corpus.cols
+        tables = self._corpus.tables
+        index = target // 2
+        if target % 2 == 0:
+            term = int(cols[u"s_term"][self._index]) + index
+            pos = tables[u"pos"][int(cols[u"t_pos"][term])]
+            if include_edgelabels and label not in NO_EDGE_LABELS:
+                pos = pos + u"-" + label
+            return nltk.Tree(pos, [tables[u"word"][int(cols[u"t_word"][term])]])
+        nt = nt_offset + index
+        children = list()
+        for e in xrange(int(cols[u"nt_edges"][nt]), int(cols[u"nt_edges"][nt + 1])):
+            elabel = tables[u"label"][int(cols[u"e_label"][e])]
+            children.append(self._tree(nt_offset, vroot, int(cols[u"e_target"][e]), elabel, include_edgelabels))
+        return nltk.Tree(tables[u"label"][int(cols[u"nt_cat"][nt])], children)
+
+
+
+if __name__ == '__main__':
+    print u"Test for %s" % __file__
+    import os
+    import tempfile
+    from lxml import etree
+    from tiger import _TigerSentence
+
+    XML = u"""<corpus><body>
+<s id="s1"><graph root="s1_VROOT">
+ <terminals>
+  <t id="s1_1" word="Der" lemma="der" pos="ART" morph="Nom.Sg.Masc" case="Nom" number="Sg" gender="Masc" person="--" tense="--" mood="--"/>
+  <t id="s1_2" word="Hase" lemma="Hase" pos="NN" morph="Nom.Sg.Masc" case="Nom" number="Sg" gender="Masc" person="--" tense="--" mood="--"/>
+  <t id="s1_3" word="springt" lemma="springen" pos="VVFIN" morph="3.Sg.Pres.Ind" case="--" number="Sg" gender="--" person="3" tense="Pres" mood="Ind"/>
+  <t id="s1_4" word="über" lemma="über" pos="APPR" morph="--" case="--" number="--" gender="--" person="--" tense="--" mood="--"/>
+  <t id="s1_5" word="." lemma="--" pos="$." morph="--" case="--" number="--" gender="--" person="--" tense="--" mood="--"/>
+ </terminals>
+ <nonterminals>
+  <nt id="s1_500" cat="NP"><edge label="NK" idref="s1_1"/><edge label="NK" idref="s1_2"/></nt>
+  <nt id="s1_501" cat="S"><edge label="SB" idref="s1_500"/><edge label="HD" idref="s1_3"/><edge label="MO" idref="s1_4"/></nt>
+  <nt id="s1_VROOT" cat="VROOT"><edge label="--" idref="s1_501"/><edge label="--" idref="s1_5"/><edge label="--" idref="s1_999"/></nt>
+ </nonterminals>
+</graph></s>
+<s id="s2"><graph>
+ <terminals><t id="s2_1" word="Ja" lemma="ja" pos="ITJ"/></terminals>
+ <nonterminals/>
+</graph></s>
+</body></corpus>""".encode(u"utf-8")
+
+    print u"  Testing compile_tiger and CompiledTigerCorpus..."
+    tree = etree.fromstring(XML)
+    sents = [_TigerSentence(s) for s in tree.iter(u"s")]
+    (fd, path) = tempfile.mkstemp()
+    os.close(fd)
+    compile_tiger(sents, path, {u"source": u"test"})
+    corpus = CompiledTigerCorpus(path)
+    assert corpus.meta == {u"source": u"test"}
+    assert len(corpus) == 2
+    assert corpus.words() == [w for s in sents for w in s.words()]
+    for (compiled, sent) in zip(corpus, sents):
+        assert compiled.ID == unicode(sent.ID)
+        assert compiled.words() == sent.words()
+        for labels in [True, False]:
+            assert compiled.tagged_words(labels) == sent.tagged_words(labels)
+            assert compiled.parsed(labels) == sent.parsed(labels)
+    assert corpus[-1].words() == [u"Ja"]
+    assert corpus.verb_forms() == [(u"springt", u"springen", u"Pres", u"3", u"Sg", u"Ind")]
+    os.remove(path)
+
+    print u"  Testing verb lemmata and tenses..."
+    from tiger import TigerCorpusReader
+    (fd, xml_path) = tempfile.mkstemp()
+    os.write(fd, XML)
+    os.close(fd)
+    for cache in [False, True]:
+        reader = TigerCorpusReader(xml_path, cache)
+        assert reader.verb_lemmata() == [(u"springt", u"springen")]
+        assert reader.verb_tenses() == [(u"springt", [(u"present", 3, u"singular", u"indicative", u"imperfective")])]
+        if cache:
+            os.remove(reader._compiled_path())
+
+    print u"  Testing compiled tagger..."
+    import shutil
+    import confopy.config as C
+    from confopy.analysis.compiled_tagger import CompiledTagger
+    C.CACHE_DIR = tempfile.mkdtemp()
+    reader = TigerCorpusReader(xml_path, True)
+    nltk_tagger = reader.tagger()
+    tagger = TigerCorpusReader(xml_path, True).tagger()
+    assert isinstance(tagger, CompiledTagger)
+    words = [u"Der", u"Hase", u"springt", u"über", u"Ja", u"nicht", u"."]
+    assert tagger.tag(words) == nltk_tagger.tag(words)
+    assert tagger.meta == {u"corpus": reader.checksum(), u"edgelabels": True}
+    os.remove(reader._compiled_path())
+    shutil.rmtree(C.CACHE_DIR)
+    os.remove(xml_path)
+
+    print u"Passed all tests!"
@@ -8,8 +8,52 @@ Description:
 
 from math import fsum
 
-from confopy.analysis import Metric, Analyzer, SpellChecker, NO_WORDS
-from pattern.de import lemma, tenses
+from confopy.analysis import Metric, Analyzer, AnalysisContext, SpellChecker, NO_WORDS, is_verb
+from confopy.analysis.lookup import CachedLookup
+from confopy.localization.de.corpus import tiger_checksum
+from confopy.localization.de.corpus_de.fillers_de import FILLERS_DE
+
+
+def _tiger():
+    return Analyzer.instance().get(corpus=u"TIGER")
+
+def _pattern_lemma(word):
+    # pattern is slow to import and only needed by a few metrics
+    from pattern.de import lemma
+    return lemma(word)
+
+def _pattern_tenses(word):
+    from pattern.de import tenses
+    return tenses(word)
+
+def _lookup_source():
+    """Return:
+        Checksum of the TIGER corpus and the pattern version, which the
+        cached lemmata and tenses depend on.
+    """
+    try:
+        checksum = tiger_checksum()
+    except (IOError, OSError):
+        checksum = u""
+    try:
+        import pattern
+        version = getattr(pattern, u"__version__", u"")
+    except ImportError:
+        version = u""
+    return u"%s/%s" % (checksum, version)
+
+# Shared by all nodes and documents, kept between runs and initially
+# filled with the verb forms of the TIGER corpus
+_lemma = CachedLookup(u"lemmata_de", _pattern_lemma, seed=lambda: _tiger().verb_lemmata(), source=_lookup_source)
+_tenses = CachedLookup(u"tenses_de", _pattern_tenses, seed=lambda: _tiger().verb_tenses(), source=_lookup_source)
+
+def _context(node):
+    """Shared analysis results of a node for all german metrics.
+    The TIGER corpus is only loaded if a metric needs tags or sentences.
+    Return:
+        AnalysisContext of node.
+    """
+    return AnalysisContext.of(node, _tiger, _lemma, _tenses)
 
 # General German metrics
 
@@ -21,14 +65,13 @@ class WordLengthMetric(Metric):
                                                u"de",
                                                u"Durchschnittliche Wortlänge")
 
-    def evaluate(self, node):
-        A = Analyzer.instance()
-        #corp = A.get(corpus=u"TIGER")
-        words = node.words()
-        word_count = len(words)
-        word_len = reduce(lambda w, v: w + v, [len(w) for w in words], 0)
-        if len(words) > 0:
-            return word_len / float(len(words))
+    def statistics(self, node):
+        words = _context(node).words()
+        return {u"chars": sum([len(w) for w in words]), u"words": len(words)}
+
+    def value(self, stats):
+        if stats.get(u"words", 0) > 0:
+            return stats[u"chars"] / float(stats[u"words"])
         return 0.0
 Analyzer.register(WordLengthMetric())
 
@@ -43,17 +86,20 @@ class SpellCheckMetric(Metric):
                                                u"""\
 Anzahl an Rechtschreibfehlern relativ zur Gesamtanzahl aller Wörter.""")
 
-    def evaluate(self, node):
+    def fingerprint(self):
+        # Compiled lexicons and PyEnchant yield different error rates
+        return SpellChecker.instance(self.language).backend
+
+    def statistics(self, node):
+        checker = SpellChecker.instance(self.language)
+        words = _context(node).content_words()
+        return {u"errors": checker.check_many(words).count(False), u"words": len(words)}
+
+    def value(self, stats):
         """Value range: [0.0, 1.0]
         """
-        checker = SpellChecker(self.language)
-        words = [w for w in node.words() if w not in NO_WORDS]
-        n_errors = 0
-        for w in words:
-            if not checker.check(w):
-                n_errors += 1
-        if len(words) > 0:
-            return n_errors / float(len(words))
+        if stats.get(u"words", 0) > 0:
+            return stats[u"errors"] / float(stats[u"words"])
         return 0.0
 Analyzer.register(SpellCheckMetric())
 
@@ -70,23 +116,20 @@ class LexiconMetric(Metric):
                                             u"""\
 Anzahl einzigartiger Lemmata relativ zur Gesamtanzahl aller Wörter.""")
 
-    def evaluate(self, node):
-        words = node.words()
-        words_no_no_words = [w for w in words if w not in NO_WORDS]
-        A = Analyzer.instance()
-        corp = A.get(corpus=u"TIGER")
-        tagger = corp.tagger(True)
-        tagged_words = tagger.tag(words)
+    def statistics(self, node):
+        context = _context(node)
+        tagged_words = context.tagged_words()
         unique_words = set()
-        if len(tagged_words) > 0 and len(words_no_no_words) > 0:
-            for w in tagged_words:
+        if len(tagged_words) > 0:
+            # Verbs are reduced to their lemma, other words are kept
+            for (w, lemm) in zip(tagged_words, context.lemmas()):
                 if w[0] not in NO_WORDS:
-                    if w[1] and w[1].startswith(u"V"):
-                        lemm = lemma(w[0])
-                        unique_words.add(lemm)
-                    else:
-                        unique_words.add(w[0])
-            return float(len(unique_words)) / len(words_no_no_words)
+                    unique_words.add(lemm)
+        return {u"lemmata": unique_words, u"tagged": len(tagged_words), u"words": len(context.content_words())}
+
+    def value(self, stats):
+        if stats.get(u"tagged", 0) > 0 and stats.get(u"words", 0) > 0:
+            return float(len(stats[u"lemmata"])) / stats[u"words"]
         return 0.0
 Analyzer.register(LexiconMetric())
 
@@ -99,16 +142,13 @@ class SentLengthMetric(Metric):
                                                u"de",
                                                u"Durchschnittliche Satzlänge")
 
-    def evaluate(self, node):
-        A = Analyzer.instance()
-        corp = A.get(corpus=u"TIGER")
-        sents = node.sents(tokenizer=corp.sent_tokenizer())
-        summ = 0
-        for s in sents:
-            s = [w for w in s if w not in NO_WORDS]
-            summ += len(s)
-        if len(sents) > 0:
-            return float(summ) / len(sents)
+    def statistics(self, node):
+        sents = _context(node).content_sents()
+        return {u"words": sum([len(s) for s in sents]), u"sents": len(sents)}
+
+    def value(self, stats):
+        if stats.get(u"sents", 0) > 0:
+            return float(stats[u"words"]) / stats[u"sents"]
         return 0.0
 Analyzer.register(SentLengthMetric())
 
@@ -125,14 +165,15 @@ class ARIMetric(Metric):
                                         u"""\
 Je größer der Wert, desto anspruchsvoller ist der Text.""")
 
-    def evaluate(self, node):
-        words = [w for w in node.words() if w not in NO_WORDS]
-        A = Analyzer.instance()
-        corp = A.get(corpus=u"TIGER")
-        sents = node.sents(tokenizer=corp.sent_tokenizer())
-        char_count = float(sum([len(w) for w in words]))
-        word_count = float(len(words))
-        sent_count = float(len(sents))
+    def statistics(self, node):
+        context = _context(node)
+        words = context.content_words()
+        return {u"chars": sum([len(w) for w in words]), u"words": len(words), u"sents": len(context.sents())}
+
+    def value(self, stats):
+        char_count = float(stats.get(u"chars", 0))
+        word_count = float(stats.get(u"words", 0))
+        sent_count = float(stats.get(u"sents", 0))
         if word_count > 0.0 and sent_count > 0.0:
             return (word_count / sent_count) + 9 * (char_count / word_count)
         return 0.0
@@ -155,18 +196,18 @@ class PersonalStyleMetric(Metric):
 Vorkommen von 'ich', 'wir', 'sie' relativ zur Satzanzahl.
     Je kleiner der Wert, desto besser.""")
 
-    def evaluate(self, node):
-        words = node.words()
-        A = Analyzer.instance()
-        corp = A.get(corpus=u"TIGER")
-        sents_count = len(node.sents(tokenizer=corp.sent_tokenizer()))
+    def statistics(self, node):
+        context = _context(node)
         count = 0
-        for w in words:
+        for w in context.words():
             low = w.lower()
             if low in PersonalStyleMetric.PERSONAL:
                 count += 1
-        if sents_count > 0:
-            return float(count) / sents_count
+        return {u"count": count, u"sents": len(context.sents())}
+
+    def value(self, stats):
+        if stats.get(u"sents", 0) > 0:
+            return float(stats[u"count"]) / stats[u"sents"]
         return 0.0
 Analyzer.register(PersonalStyleMetric())
 
@@ -182,18 +223,18 @@ Anzahl an 'man' relativ zur Satzanzahl.
         super(ImpersonalStyleMetric, self).__init__(ID, lang, brief, description)
         self.IMPERSONAL = [u"man"]
 
-    def evaluate(self, node):
-        words = node.words()
-        A = Analyzer.instance()
-        corp = A.get(corpus=u"TIGER")
-        sents_count = len(node.sents(tokenizer=corp.sent_tokenizer()))
+    def statistics(self, node):
+        context = _context(node)
         count = 0
-        for w in words:
+        for w in context.words():
             low = w.lower()
             if low in self.IMPERSONAL:
                 count += 1
-        if sents_count > 0:
-            return float(count) / sents_count
+        return {u"count": count, u"sents": len(context.sents())}
+
+    def value(self, stats):
+        if stats.get(u"sents", 0) > 0:
+            return float(stats[u"count"]) / stats[u"sents"]
         return 0.0
 Analyzer.register(ImpersonalStyleMetric())
 
@@ -220,22 +261,19 @@ class SimplePresentMetric(Metric):
 Anzahl an Verben im Präsenz relativ zur Gesamtanzahl aller Verben.
     Je höher der Wert, desto besser.""")
 
-    def evaluate(self, node):
-        A = Analyzer.instance()
-        corp = A.get(corpus=u"TIGER")
-        tagger = corp.tagger(True)
-        tagged_words = tagger.tag(node.words())
+    def statistics(self, node):
+        context = _context(node)
+        tagged_words = context.tagged_words()
         pres_verbs = 0
         total_verbs = 0
-        for w in tagged_words:
-            if w[1] and w[1].startswith(u"V"):
+        for (w, tense) in zip(tagged_words, context.tenses()):
+            if is_verb(w[1]):
                 #if w[1].startswith(u"VVFIN") or\
                 #   w[1].startswith(u"VAFIN") or\
                 #   w[1].startswith(u"VVINF") or\
                 #   w[1].startswith(u"VVIZU"): # beinhaltet noch vergangenheit!
                 #    pres_verbs += 1
                 total_verbs += 1
-                tense = tenses(w[0])
                 if tense is not []:
                     tense = [t[0] for t in tense]
                     past_count = 0
@@ -248,8 +286,11 @@ Anzahl an Verben im Präsenz relativ zur Gesamtanzahl aller Verben.
                     if present_count > past_count:
                         pres_verbs += 1
                 #print w
-        if total_verbs > 0:
-            return float(pres_verbs) / total_verbs
+        return {u"present": pres_verbs, u"verbs": total_verbs}
+
+    def value(self, stats):
+        if stats.get(u"verbs", 0) > 0:
+            return float(stats[u"present"]) / stats[u"verbs"]
         return 0.0
 Analyzer.register(SimplePresentMetric())
 
@@ -265,20 +306,17 @@ class AdverbModifierMetric(Metric):
 Anzahl verstärkender Adverbien relativ zur Gesamtanzahl aller Wörter.
     Je kleiner der Wert, desto besser.""")
 
-    def evaluate(self, node):
-        A = Analyzer.instance()
-        corp = A.get(corpus=u"TIGER")
-        tagger = corp.tagger(True)
-        words = node.words()
-        words_no_no_words = [w for w in words if w not in NO_WORDS]
-        tagged_words = tagger.tag(words)
-        word_count = len(words_no_no_words)
+    def statistics(self, node):
+        context = _context(node)
         count = 0
-        for w in tagged_words:
+        for w in context.tagged_words():
             if w[1] and u"ADV-MO" == w[1]:
                 count += 1
-        if word_count > 0:
-            return float(count) / word_count
+        return {u"count": count, u"words": len(context.content_words())}
+
+    def value(self, stats):
+        if stats.get(u"words", 0) > 0:
+            return float(stats[u"count"]) / stats[u"words"]
         return 0.0
 Analyzer.register(AdverbModifierMetric())
 
@@ -310,21 +348,21 @@ Relativ zur Satzanzahl. Tote Verben sind folgende:
         #  http://www.marcoprestel.de/stil12.html
         self.VERBS = [u"gehören", u"liegen", u"beinhalten", u"enthalten", u"befinden", u"geben", u"bewirken", u"bewerkstelligen", u"vergegenwärtigen"]
 
-    def evaluate(self, node):
-        words = node.words()
-        A = Analyzer.instance()
-        corp = A.get(corpus=u"TIGER")
-        sents_count = len(node.sents(tokenizer=corp.sent_tokenizer()))
-        tagger = corp.tagger(True)
-        tagged_words = tagger.tag(words)
+    def statistics(self, node):
+        context = _context(node)
+        tagged_words = context.tagged_words()
         count = 0
         if len(tagged_words) > 0:
-            for w in tagged_words:
-                if w[1] and w[1].startswith(u"V"):
-                    lemm = lemma(w[0])
+            for (w, lemm) in zip(tagged_words, context.lemmas()):
+                if is_verb(w[1]):
                     if lemm in self.VERBS:
                         count += 1
-            return float(count) / sents_count
+            return {u"count": count, u"sents": len(context.sents()), u"tagged": len(tagged_words)}
+        return {u"count": 0, u"sents": 0, u"tagged": 0}
+
+    def value(self, stats):
+        if stats.get(u"tagged", 0) > 0 and stats.get(u"sents", 0) > 0:
+            return float(stats[u"count"]) / stats[u"sents"]
         return 0.0
 Analyzer.register(DeadVerbsMetric())
 
@@ -339,20 +377,21 @@ class FillerMetric(Metric):
 Anzahl an Füllwörtern relativ zur Gesamtanzahl aller Wörter.
     Je kleiner der Wert, desto besser.""")
 
-    def evaluate(self, node):
-        A = Analyzer.instance()
-        corp = A.get(corpus=u"TIGER")
-        fillers = list()
-        if corp:
-            fillers = corp.fillers()
-        words = node.words()
-        words_no_no_words = [w for w in words if w not in NO_WORDS]
+    # Static list, no need to load the TIGER corpus
+    FILLERS = frozenset(FILLERS_DE)
+
+    def statistics(self, node):
+        context = _context(node)
+        fillers = FillerMetric.FILLERS
         filler_count = 0
-        for w in words:
+        for w in context.words():
             if w in fillers:
                 filler_count += 1
-        if len(words_no_no_words) > 0:
-            return float(filler_count) / len(words_no_no_words)
+        return {u"fillers": filler_count, u"words": len(context.content_words())}
+
+    def value(self, stats):
+        if stats.get(u"words", 0) > 0:
+            return float(stats[u"fillers"]) / stats[u"words"]
         return 0.0
 
 Analyzer.register(FillerMetric())
@@ -369,14 +408,17 @@ class ExampleCountMetric(Metric):
                                                  u"""\
 Je größer der Wert, desto besser.""")
 
-    def evaluate(self, node):
-        words = node.words()
+    def statistics(self, node):
+        words = _context(node).words()
         bsp_count = 0
         for w in words:
             lo = w.lower()
             if lo in ExampleCountMetric.BSP_INDICATORS:
                 bsp_count += 1
-        return bsp_count
+        return {u"count": bsp_count}
+
+    def value(self, stats):
+        return stats.get(u"count", 0)
 
 Analyzer.register(ExampleCountMetric())
 
@@ -390,19 +432,34 @@ class SentenceLengthVariationMetric(Metric):
                                                             u"Variation der Satzlänge",
                                                             u"Je größer der Wert, desto besser.")
 
-    def evaluate(self, node):
-        A = Analyzer.instance()
-        corp = A.get(corpus=u"TIGER")
-        sents = node.sents(tokenizer=corp.sent_tokenizer())
+    def statistics(self, node):
+        sents = _context(node).content_sents()
         sent_len_diff = 0
         last_sent = None
         for s in sents:
-            s = [w for w in s if w not in NO_WORDS]
             if last_sent is not None:
                 sent_len_diff += abs(len(last_sent) - len(s))
             last_sent = s
-        if len(sents) > 1:
-            return sent_len_diff / float(len(sents) - 1)
+        if len(sents) == 0:
+            return dict()
+        return {u"diffs": sent_len_diff, u"sents": len(sents), u"first": len(sents[0]), u"last": len(sents[-1])}
+
+    def merge(self, a, b):
+        """Adds the length difference between the last sentence of a and
+        the first one of b.
+        """
+        if a.get(u"sents", 0) == 0:
+            return b
+        if b.get(u"sents", 0) == 0:
+            return a
+        return {u"diffs": a[u"diffs"] + b[u"diffs"] + abs(a[u"last"] - b[u"first"]),
+                u"sents": a[u"sents"] + b[u"sents"],
+                u"first": a[u"first"],
+                u"last": b[u"last"]}
+
+    def value(self, stats):
+        if stats.get(u"sents", 0) > 1:
+            return stats[u"diffs"] / float(stats[u"sents"] - 1)
         return 0.0
 
 Analyzer.register(SentenceLengthVariationMetric())
@@ -6,8 +6,11 @@ Description:
     Implementation of all reports
 '''
 
-from confopy.analysis import Report, Analyzer, mean_stdev
-from confopy.analysis.rule import eval_doc
+from confopy.analysis import Report, Analyzer, ReferenceStore
+from confopy.analysis.metric import evaluate_tree
+from confopy.analysis.results import ResultMatrix, ResultStore
+from confopy.analysis.rule import RuleEngine
+import confopy.parallel as P
 
 
 METRIC_NAMES = [u"wordlength", u"spellcheck", u"lexicon", u"sentlength", u"ari", u"personalstyle", u"impersonalstyle", u"passiveconstructs", u"simplepres", u"adverbmodifier", u"deadverbs", u"fillers", u"examplecount", u"sentlengthvar"]
@@ -17,6 +20,27 @@ PAD = 2
 METRIC_COL_WIDTH = MAX_METRIC_STR_LEN + PAD
 
 ROUND = 2
+
+def _evaluate(metrics, docs, args):
+    """Evaluates all metrics on all documents, in worker processes if
+    requested via --jobs.
+    Return:
+        ResultMatrix (one row per metric, one column per document).
+    """
+    values = P.evaluate(metrics, docs, getattr(args, "jobs", 1), u"de")
+    matrix = ResultMatrix([m.ID for m in metrics], values, len(docs))
+    _store(metrics, [(d, {d: list(matrix.values[:, i])}) for (i, d) in enumerate(docs)], args)
+    return matrix
+
+def _store(metrics, results, args):
+    """Records metric values in the ResultStore, see option --cohort.
+    Args:
+        metrics: List of Metrics.
+        results: List of (document, dictionary node --> list of values)
+                 tuples.
+    """
+    ResultStore.instance().put(metrics, results, getattr(args, "cohort", None))
+
 class DocumentAverages(Report):
     """Average metric values for multiple documents.
     """
@@ -37,11 +61,12 @@ Evaluiert die Metriken für mehrere Dokumente, berechnet den Durchschnitt
         A = Analyzer.instance()
         metrics = [A.get(metric=m) for m in metric_names]
         metrics = [m for m in metrics if m != None]
-        corp = A.get(corpus=u"TIGER")
-        results = list()
-        for m in metrics:
-            results.append([m.evaluate(d) for d in docs])
-        stats = [mean_stdev(r, ROUND) for r in results]
+        # Only loaded if a reference value is not stored yet
+        corp = A.get(corpus=u"TIGER", load=False)
+        results = _evaluate(metrics, docs, args)
+        stats = results.stats(ndigits=ROUND)
+        means = [float(v) for v in stats[u"mean"]]
+        stdevs = [float(v) for v in stats[u"stdev"]]
         if args.latex:
             output.append(u"\\begin{tabular}{l|l l|r}")
             output.append(u"    Metric & mean & stdev & TIGER \\\\")
@@ -56,14 +81,15 @@ Evaluiert die Metriken für mehrere Dokumente, berechnet den Durchschnitt
             output.append(u"")
             output.append(u"%s | MEAN  | STDEV | TIGER" % u"METRIC".ljust(METRIC_COL_WIDTH))
             output.append(u"%s-+-------+-------+------" % u"".ljust(METRIC_COL_WIDTH, u"-"))
+        reference = ReferenceStore.instance()
         for i in range(len(metrics)):
-            # Execute metrics on reference corpus
-            val = metrics[i].evaluate(corp)
+            # Metric values of the reference corpus are computed only once
+            val = reference.value(corp, metrics[i])
             val = round(val, ROUND)
             if args.latex:
-                output.append(u"    %s & %s & %s & %s \\\\" % (metric_names[i].ljust(METRIC_COL_WIDTH), stats[i][0], stats[i][1], val))
+                output.append(u"    %s & %s & %s & %s \\\\" % (metric_names[i].ljust(METRIC_COL_WIDTH), means[i], stdevs[i], val))
             else:
-                output.append(u"%s | %05.2f | %05.2f | %05.2f" % (metric_names[i].ljust(METRIC_COL_WIDTH), stats[i][0], stats[i][1], val))
+                output.append(u"%s | %05.2f | %05.2f | %05.2f" % (metric_names[i].ljust(METRIC_COL_WIDTH), means[i], stdevs[i], val))
         if args.latex:
             output.append(u"\\end{tabular}")
         return u"\n".join(output)
@@ -100,6 +126,7 @@ Benötigt eine gerade Anzahl n an Dokumenten (mind. 2).
             A = Analyzer.instance()
             metrics = [A.get(metric=m) for m in metric_names]
             metrics = [m for m in metrics if m != None]
+            values = _evaluate(metrics, docs, args)
             if len(docs) == 2:
                 output.append(u"# Bericht \"%s\""% self.ID)
                 output.append(u"")
@@ -110,17 +137,16 @@ Benötigt eine gerade Anzahl n an Dokumenten (mind. 2).
                 output.append(u"")
                 output.append(u"%s | PROGRESS" % u"METRIC".ljust(METRIC_COL_WIDTH))
                 output.append(u"%s-+---------------------" % u"".ljust(METRIC_COL_WIDTH, u"-"))
-                for m in metrics:
-                    vals = [m.evaluate(doc) for doc in docs]
+                signs = values.deltas()[:, 0]
+                for (ID, vals, sign) in zip(values.IDs, values.values, signs):
                     progress = u"="
-                    if vals[0] > vals[1]:
+                    if sign < 0.0:
                         progress = u"-"
-                    elif vals[0] < vals[1]:
+                    elif sign > 0.0:
                         progress = u"+"
-                    output.append(u"%s | %05.2f --> %05.2f  (%s)" % (m.ID.ljust(METRIC_COL_WIDTH), vals[0], vals[1], progress))
+                    output.append(u"%s | %05.2f --> %05.2f  (%s)" % (ID.ljust(METRIC_COL_WIDTH), vals[0], vals[1], progress))
 
             else:
-                half = len(docs) / 2
                 if args.latex:
                     output.append(u"\\begin{tabular}{l|l l|l l|r}")
                     output.append(u"\\multirow{2}{*}{\\textbf{Metrik}} & \\multicolumn{2}{|c|}{\\textbf{Erhöhung}} & \\multicolumn{2}{|c|}{\\textbf{Verringerung}} & \\textbf{gleichbleibend} \\\\")
@@ -138,31 +164,14 @@ Benötigt eine gerade Anzahl n an Dokumenten (mind. 2).
                     output.append(u"")
                     output.append(u"%s | +  | DELTA+ | -  | DELTA- | =  " % u"METRIC".ljust(METRIC_COL_WIDTH))
                     output.append(u"%s-+----+--------+----+--------+----" % u"".ljust(METRIC_COL_WIDTH, u"-"))
-                for m in metrics:
-                    results = list()
-                    for i in range(half):
-                        results.append((m.evaluate(docs[i]), m.evaluate(docs[i + half])))
-                    counts = [0, 0, 0] # greater, less, equal
-                    avg_diffs = [0.0, 0.0]
-                    for r in results:
-                        if r[0] > r[1]:
-                            counts[1] += 1
-                            avg_diffs[1] += r[0] - r[1]
-                        elif r[0] < r[1]:
-                            counts[0] += 1
-                            avg_diffs[0] += r[1] - r[0]
-                        else:
-                            counts[2] += 1
-                    if counts[0] > 0:
-                        avg_diffs[0] /= float(counts[0])
-                        avg_diffs[0] = round(avg_diffs[0], ROUND + 1)
-                    if counts[1] > 0:
-                        avg_diffs[1] /= float(counts[1])
-                        avg_diffs[1] = round(avg_diffs[1], ROUND + 1)
+                progress = values.progress()
+                for (i, ID) in enumerate(values.IDs):
+                    counts = [int(progress[key][i]) for key in [u"increased", u"decreased", u"equal"]]
+                    avg_diffs = [round(float(progress[key][i]), ROUND + 1) for key in [u"increase", u"decrease"]]
                     if args.latex:
-                        output.append(u"    %s & %s & %s & %s & %s & %s \\\\" % (m.ID, counts[0], avg_diffs[0], counts[1], avg_diffs[1], counts[2]))
+                        output.append(u"    %s & %s & %s & %s & %s & %s \\\\" % (ID, counts[0], avg_diffs[0], counts[1], avg_diffs[1], counts[2]))
                     else:
-                        output.append(u"%s | %02d | %06.3f | %02d | %06.3f | %02d" % (m.ID.ljust(METRIC_COL_WIDTH), counts[0], avg_diffs[0], counts[1], avg_diffs[1], counts[2]))
+                        output.append(u"%s | %02d | %06.3f | %02d | %06.3f | %02d" % (ID.ljust(METRIC_COL_WIDTH), counts[0], avg_diffs[0], counts[1], avg_diffs[1], counts[2]))
                 if args.latex:
                     output.append(u"\\end{tabular}")
         return u"\n".join(output)
@@ -185,21 +194,13 @@ Berechnet die Metrikwerte für mehrere Dokumente.
     Unterstützt die Option --latex."""):
         super(MultiDocumentReport, self).__init__(ID, lang, brief, description)
 
-    def compute_exceedances(self, metric_names, results):
-        exceedances = list()
-        for i in range(len(metric_names)):
-            metric_name = metric_names[i]
-            expect = _METRIC_EXPECTATIONS[metric_name]
-            metric_results = results[i]
-            exceedances_for_metric = list()
-            for val in metric_results:
-                val = round(val, 2)
-                if ((expect.low is not None) and val < expect.low) or ((expect.high is not None) and val > expect.high):
-                    exceedances_for_metric.append(1)
-                else:
-                    exceedances_for_metric.append(0)
-            exceedances.append(exceedances_for_metric)
-        return exceedances
+    def compute_exceedances(self, results):
+        """Return:
+            numpy array of booleans (one row per metric, one column per
+            document), True for values outside the expected range.
+        """
+        bounds = dict([(ID, (e.low, e.high)) for (ID, e) in _METRIC_EXPECTATIONS.items()])
+        return results.exceedances(bounds, 2)
 
     def execute(self, docs, args):
         output = []
@@ -207,13 +208,11 @@ Berechnet die Metrikwerte für mehrere Dokumente.
         A = Analyzer.instance()
         metrics = [A.get(metric=m) for m in metric_names]
         metrics = [m for m in metrics if m != None]
-        corp = A.get(corpus=u"TIGER")
-        results = list()
-        for m in metrics:
-            results.append([m.evaluate(d) for d in docs])
+        results = _evaluate(metrics, docs, args)
 
-        exceedances = self.compute_exceedances(metric_names, results)
-        exceedances_transposed = list(map(list, zip(*exceedances)))
+        exceedances = self.compute_exceedances(results)
+        metric_names = results.IDs
+        results = results.values
 
         # Metric matrix output
         doc_numbers = range(1, len(docs) + 1)
@@ -228,7 +227,7 @@ Berechnet die Metrikwerte für mehrere Dokumente.
             for i in range(len(metrics)):
                 value_str = u""
                 for doc_nr in range(len(results[i])):
-                    if exceedances[i][doc_nr] == 1:
+                    if exceedances[i][doc_nr]:
                         value_str = value_str + u"& \emph{%.2f} " % results[i][doc_nr]
                     else:
                         value_str = value_str + u"& %.2f " % results[i][doc_nr]
@@ -251,7 +250,7 @@ Berechnet die Metrikwerte für mehrere Dokumente.
                 output.append(u"%s%s" % (metric_names[i].ljust(METRIC_COL_WIDTH), value_str))
 
         # Exceedances/shortfalls
-        exceedances_counts = map(sum, exceedances_transposed)
+        exceedances_counts = [int(c) for c in exceedances.sum(axis=0)]
         if args.latex:
             output.append(u"    \\hline")
             exceedances_str = map(u"& %d ".__mod__, exceedances_counts)
@@ -266,7 +265,8 @@ Berechnet die Metrikwerte für mehrere Dokumente.
         # Rule violations
         rule_IDs = RULE_NAMES
         rules = [A.get(rule=ID) for ID in rule_IDs if A.get(rule=ID) is not None]
-        violated_rule_counts = [len(eval_doc(doc, rules)) for doc in docs]
+        engine = RuleEngine(rules)
+        violated_rule_counts = [engine.count(doc) for doc in docs]
 
         if args.latex:
             violated_rule_counts_str = map(u"& %d ".__mod__, violated_rule_counts)
@@ -341,26 +341,36 @@ Berechnet die Metriken für ein Dokument und überprüft die Regeln.
             output.append(u"")
             output.append(u"## Metriken")
             output.append(u"")
-            for metric_ID in sorted((_METRIC_EXPECTATIONS.keys())):
-                output.append(self._execute_metric(metric_ID, doc))
+            for (metric_ID, val) in self._evaluate_metrics(doc, args)[doc]:
+                output.append(self._execute_metric(metric_ID, val))
             output.append(u"")
             output.append(u"## Regeln")
             output.append(u"")
             rule_IDs = RULE_NAMES
             A = Analyzer.instance()
             rules = [A.get(rule=ID) for ID in rule_IDs if A.get(rule=ID) is not None]
-            rule_messages = eval_doc(doc, rules)
-            if len(rule_messages) == 0:
+            rule_count = 0
+            for m in RuleEngine(rules).messages(doc):
+                output.append(m)
+                rule_count += 1
+            if rule_count == 0:
                 output.append(u"Es liegen keine Regelverletzungen vor!")
-            else:
-                for m in rule_messages:
-                    output.append(m)
         return u"\n".join(output)
 
-    def _execute_metric(self, metric_ID, node):
+    def _evaluate_metrics(self, doc, args=None):
+        """Evaluates all metrics with expectations on the document and all
+        its sections in one pass and records the values.
+        Return:
+            Dictionary node --> list of (metric ID, value) tuples.
+        """
         A = Analyzer.instance()
-        metric = A.get(metric=metric_ID)
-        val = metric.evaluate(node)
+        metric_IDs = sorted(_METRIC_EXPECTATIONS.keys())
+        metrics = [A.get(metric=ID) for ID in metric_IDs]
+        values = evaluate_tree(metrics, doc)
+        _store(metrics, [(doc, values)], args)
+        return dict([(node, zip(metric_IDs, vals)) for (node, vals) in values.items()])
+
+    def _execute_metric(self, metric_ID, val):
         expect = _METRIC_EXPECTATIONS.get(metric_ID, None)
         output = u""
         if expect is not None:
@@ -398,14 +408,60 @@ Berechnet die Metriken für jedes Kapitel einzeln.""")
         output.append(u"# Abschnittsweiser Bericht")
         output.append(u"")
         doc = docs[0]
-        sections = doc.sections()
-        for sec in sections:
+        values = self._evaluate_metrics(doc, args)
+        for sec in doc.sections():
             output.append(u"## " + sec.title)
             output.append(u"")
-            for metric_ID in sorted(_METRIC_EXPECTATIONS.keys()):
-                output.append(self._execute_metric(metric_ID, sec))
+            for (metric_ID, val) in values[sec]:
+                output.append(self._execute_metric(metric_ID, val))
             output.append(u"")
 
         return u"\n".join(output)
 
 Analyzer.register(SectionsReport())
+
+
+
+class HistoryReport(Report):
+    """Metric statistics of the cohorts in the ResultStore.
+    """
+    def __init__(self):
+        super(HistoryReport, self).__init__(u"history",
+                                            u"de",
+                                            u"Vergleicht gespeicherte Jahrgänge",
+                                            u"""\
+Listet für jede Metrik Mittelwert, Standardabweichung, Minimum und
+    Maximum der Dokumente jedes Jahrgangs (Option --cohort) auf.
+    Verwendet die gespeicherten Ergebnisse früherer Berichte, es werden
+    keine Dokumente analysiert.""")
+
+    def execute(self, docs, args):
+        output = list()
+        store = ResultStore.instance()
+        cohorts = store.cohorts()
+        if len(cohorts) == 0:
+            return u"Es sind keine Jahrgänge gespeichert (Option --cohort)."
+        A = Analyzer.instance()
+        metrics = [A.get(metric=m) for m in METRIC_NAMES]
+        metrics = [m for m in metrics if m != None]
+        output.append(u"# Bericht \"%s\"" % self.ID)
+        output.append(u"")
+        output.append(u" * N:     Anzahl an Dokumenten des Jahrgangs")
+        output.append(u" * MEAN:  der Mittelwert über alle Dokumente")
+        output.append(u" * STDEV: die dazugehörige Standardabweichung")
+        output.append(u" * MIN:   kleinster Metrikwert")
+        output.append(u" * MAX:   größter Metrikwert")
+        output.append(u"")
+        cohort_width = max([len(c) for (c, _) in cohorts] + [len(u"COHORT")]) + PAD
+        for m in metrics:
+            output.append(u"## %s" % m.ID)
+            output.append(u"")
+            output.append(u"%s | N   | MEAN  | STDEV | MIN   | MAX" % u"COHORT".ljust(cohort_width))
+            output.append(u"%s-+-----+-------+-------+-------+------" % u"".ljust(cohort_width, u"-"))
+            for (cohort, stats) in store.trend(m):
+                stdev = u"%05.2f" % stats.stdev() if len(stats) > 1 else u"  -  "
+                output.append(u"%s | %03d | %05.2f | %s | %05.2f | %05.2f" % (cohort.ljust(cohort_width), len(stats), stats.mean(), stdev, stats.min, stats.max))
+            output.append(u"")
+        return u"\n".join(output)
+
+Analyzer.register(HistoryReport())
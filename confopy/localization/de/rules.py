@@ -14,6 +14,9 @@ from confopy.analysis import Analyzer
 class IntroductionRule(Rule):
     """Chapters must have introductions.
     """
+
+    NODE_TYPES = (Section, )
+
     def __init__(self, ID=u"introduction", language=u"de", brief=u"Kapiteleinleitungen", description=u"Kapitel müssen eine Einleitung haben"):
         super(IntroductionRule, self).__init__(ID, language, brief, description)
 
@@ -29,6 +32,9 @@ Analyzer.register(IntroductionRule())
 class SubsectionRule(Rule):
     """Sections must have at least 2 subsections or none at all.
     """
+
+    NODE_TYPES = (Section, )
+
     def __init__(self, ID=u"subsections", language=u"de", brief=u"Mind. 2 Unterabschnitte", description=u"Sektionen haben entweder 2 oder keine Untersektionen"):
         super(SubsectionRule, self).__init__(ID, language, brief, description)
 
@@ -44,6 +50,9 @@ Analyzer.register(SubsectionRule())
 class FloatReferenceRule(Rule):
     """Floating objects must be referenced in the surrounding text.
     """
+
+    NODE_TYPES = (Float, )
+
     def __init__(self,
                  ID=u"floatreference",
                  language=u"de",
@@ -63,6 +72,9 @@ Analyzer.register(FloatReferenceRule())
 class FloatReferenceBeforeRule(Rule):
     """Floating objects must be referenced in the text before their placement.
     """
+
+    NODE_TYPES = (Float, )
+
     def __init__(self,
                  ID=u"floatreferencebefore",
                  language=u"de",
@@ -82,6 +94,9 @@ Analyzer.register(FloatReferenceBeforeRule())
 class FloatCaptionRule(Rule):
     """Floating objects must have a caption.
     """
+
+    NODE_TYPES = (Float, )
+
     def __init__(self, ID=u"floatcaption", language=u"de", brief=u"Gleitobjekte-Beschriftung", description=u"Gleitobjekte müssen beschriftet sein"):
         super(FloatCaptionRule, self).__init__(ID, language, brief, description)
 
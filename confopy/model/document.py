@@ -8,6 +8,8 @@ Description:
 
 from nltk import wordpunct_tokenize
 
+from confopy.model.tokens import TokenTable
+
 ##################################################################
 # NODE SUPER CLASS
 ##################################################################
@@ -24,13 +26,56 @@ class Node(object):
             parent:   Parent node.
             children: List of child nodes.
         """
+        self._revision = 0
+        self._memo = dict()
+        self._parent = parent
         self.text = text
         self.pagenr = pagenr
-        self._parent = parent
         self._children = list(children)
         for c in self._children:
             c._parent = self
 
+    @property
+    def text(self):
+        return self._text
+
+    @text.setter
+    def text(self, text):
+        self._text = text
+        self._touch()
+
+    def revision(self):
+        """Modification counter. Increases whenever the text of this node
+        or one of its descendants changes or children are added/removed.
+        Return:
+            Integer.
+        """
+        return self._revision
+
+    def _touch(self):
+        node = self
+        while node is not None:
+            node._revision += 1
+            node = node._parent
+
+    def _memoized(self, key, constructor):
+        """Caches the result of constructor until the revision changes.
+        """
+        (revision, value) = self._memo.get(key, (None, None))
+        if revision != self._revision:
+            value = constructor()
+            self._memo[key] = (self._revision, value)
+        return value
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        del state["_memo"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._memo = dict()
+
     def parent(self):
         return self._parent
 
@@ -73,6 +118,7 @@ class Node(object):
             if relation == 1:
                 child._parent = self
                 self._children.append(child)
+                self._touch()
             elif relation < 1 and self._parent:
                 self.parent().add_child(child, relation + 1)
 
@@ -82,6 +128,7 @@ class Node(object):
         if child in self._children:
             child._parent = None
             self._children.remove(child)
+            self._touch()
 
     def sections(self):
         """Returns all children being section nodes.
@@ -134,10 +181,14 @@ class Node(object):
     def raw(self, recursive=True, ignore_floats=True):
         """Returns the text of this node as a single unicode string.
         Lines are separated by a newline character.
+        The text is cached until the node or one of its descendants changes.
         Args:
             recursive: Include text from non-leaf child nodes.
             ignore_floats: Ignore floats and footnotes.
         """
+        return self._memoized((u"raw", recursive, ignore_floats), lambda: self._raw(recursive, ignore_floats))
+
+    def _raw(self, recursive, ignore_floats):
         buf = list()
         buf.append(self.text)
         for c in self._children:
@@ -151,22 +202,29 @@ class Node(object):
 
     def words(self, recursive=True, ignore_floats=True):
         """Returns this node's text as a list of words.
+        Words are sliced from the TokenTable of the whole document.
         Args:
             recursive:     Boolean. Include words of child nodes?
             ignore_floats: Boolean. Exclude words of floating object captions?
         Return:
             List of words.
         """
-        words = list()
-        words.extend(wordpunct_tokenize(self.text))
-        for c in self._children:
-            if c.is_section() and recursive:
-                words.extend(c.words(True, ignore_floats))
-            elif (c.is_float() or c.is_footnote()) and not ignore_floats:
-                words.extend(c.words(recursive, False))
-            else:
-                words.extend(c.words(recursive, ignore_floats))
-        return words
+        # Like raw, the flags are only passed on to the children, every
+        # child is included. So the words of a node are its range of the
+        # document's tokens in pre-order.
+        table = self.token_table()
+        return table.words(*table.span(self))
+
+    def token_table(self):
+        """Returns the TokenTable of the document this node belongs to.
+        The table is built once per revision of the document.
+        Return:
+            TokenTable.
+        """
+        root = self
+        while root._parent is not None:
+            root = root._parent
+        return root._memoized(u"tokens", lambda: TokenTable(root))
 
     def sents(self, recursive=True, ignore_floats=True, tokenizer=None):
         """Returns this node's text as a list of sentences
@@ -415,6 +473,38 @@ Lorem ipsum dolor sit amet, consectetur adipiscing elit. In lacinia nec massa id
     assert len(doc.words()) == 150
     assert len(doc.raw()) == 827
 
+    print u"  Testing memoized words and raw..."
+    words = doc.words()
+    words.append(u"Foo")
+    assert doc.words() == words[:-1]
+    assert sec11.token_table() is doc.token_table()
+    assert sec11.words() == para1.words()
+    assert doc.raw() is doc.raw()
+    sec2.add_child(Paragraph(text=u"Neu"))
+    assert doc.words()[-1] == u"Neu"
+    assert doc.raw().endswith(u"Neu")
+    sec2.children()[-1].text = u"Anders"
+    assert doc.words()[-1] == u"Anders"
+    sec2.remove_child(sec2.children()[-1])
+    assert doc.words() == words[:-1]
+    import cPickle
+    assert cPickle.loads(cPickle.dumps(doc, -1)).words() == words[:-1]
+    assert "_memo" not in doc.__getstate__()
+
+    print u"  Testing revision..."
+    rev_doc = doc.revision()
+    rev_sec1 = sec1.revision()
+    rev_sec2 = sec2.revision()
+    para1.text = para1.text
+    assert doc.revision() > rev_doc and sec1.revision() > rev_sec1
+    assert sec2.revision() == rev_sec2
+    foo = Paragraph(text=u"Foo")
+    sec2.add_child(foo)
+    assert sec2.revision() > rev_sec2
+    rev_sec2 = sec2.revision()
+    sec2.remove_child(foo)
+    assert sec2.revision() > rev_sec2
+
     print u"  Testing DocumentChecker..."
     doc_checker = DocumentChecker()
     doc = doc_checker.cleanup(doc)
@@ -19,8 +19,13 @@ def lines2unicode(lines=[], strip=False, sep=u"\n"):
         A single unicode string.
     """
     if strip:
+        if sep.strip() == u"":
+            # Empty lines vanish when stripping with a whitespace separator
+            return sep.join([l for l in [line.strip() for line in lines] if l != u""])
         return reduce(lambda a, b: a.strip() + sep + b.strip(), lines, u"").strip()
-    return reduce(lambda a, b: a + sep + b, lines, u"")[1:]
+    if len(lines) == 0:
+        return u""
+    return (sep + sep.join(lines))[1:]
 
 def is_empty(lines):
     """Checks whether a list of ustrings is empty.
@@ -38,33 +43,39 @@ def match(regex, lines, strip=False):
     """Convenience method converting a list of lines to a single unicode
     string then matching a regex.
     Args:
-        regex: Regular expression.
+        regex: Regular expression (string or compiled pattern).
         lines: List of unicode strings.
         strip: Boolean flag whether to strip each line from whitespace.
     Return:
         True if the text represented by lines matches regex. False otherwise.
     """
-    return re.match(regex, lines2unicode(lines, strip), re.U)
+    return _compiled(regex).match(lines2unicode(lines, strip))
 
 def match_each(regex, lines, strip=False):
     """Returns true if regex matches for each line.
     Args:
-        regex: Regular expression.
+        regex: Regular expression (string or compiled pattern).
         lines: List of unicode strings.
         strip: Boolean flag whether to strip each line from whitespace.
     Return:
         True if each line matches regex. False otherwise.
     """
+    pattern = _compiled(regex)
     for line in lines:
         if strip:
             line = line.strip()
-        if not re.match(regex, line, re.U):
+        if not pattern.match(line):
             return False
 
-    if lines == [] and regex != r"":
+    if lines == [] and pattern.pattern != r"":
         return False
     return True
 
+def _compiled(regex):
+    if isinstance(regex, basestring):
+        return re.compile(regex, re.U)
+    return regex
+
 def lines_using(lines, words, strip=False, sep=u" "):
     """
     Args:
@@ -153,6 +164,12 @@ if __name__ == '__main__':
     assert lines2unicode(l0) == l0_expected
     assert lines2unicode(l1) == l1_expected
     assert lines2unicode(l2) == l2_expected
+    assert lines2unicode(l3) == u"    \n\n\n"
+    assert lines2unicode(l2, sep=u" | ") == u"| Hello World, | how are you? | Sincerely | Universe"
+    l5 = [u" a ", u"  ", u"b\n", u""]
+    assert lines2unicode(l5, True) == u"a\nb"
+    assert lines2unicode(l5, True, u" ") == u"a b"
+    assert lines2unicode(l5, True, u"|") == u"|a||b|"
 
     assert is_empty(l0)
     assert is_empty(l3)
@@ -164,6 +181,10 @@ if __name__ == '__main__':
     headline_expected = u"42\nThe Meaning of Life and Everything"
     assert match(r"\d+", headline, True)
     assert lines2unicode(headline, True) == headline_expected
+    assert match(re.compile(r"\d+", re.U), headline, True)
+    assert not match(re.compile(r"\d+", re.U), headline)
+    assert match_each(re.compile(r"\s*\w"), headline)
+    assert not match_each(re.compile(r"\d"), [])
 
     print u"  Testing avg word length and avg words per line..."
     l4 = [u"x     2  ", u"  yz xz"]
@@ -0,0 +1,112 @@
+# coding: utf-8
+'''
+File: tokens.py
+Author: Oliver Zscheyge
+Description:
+    Compact token representation of a whole document tree.
+'''
+
+from array import array
+
+from nltk.tokenize import WordPunctTokenizer
+
+_TOKENIZER = WordPunctTokenizer()
+
+
+class TokenTable(object):
+    """Tokens (as produced by nltk's wordpunct_tokenize) of all nodes of a
+    document tree in pre-order.
+    Words are interned in a single vocabulary. Every token is stored as
+    (start, end, vocabulary ID), start and end being character offsets
+    into the text of the node the token belongs to. The tokens of a node
+    including all its descendants form one contiguous range of the table.
+    Attributes:
+        vocabulary: List of distinct words (unicode strings).
+        ids:        array of vocabulary IDs, one per token.
+        starts:     array of character offsets where the tokens start.
+        ends:       array of character offsets where the tokens end.
+    """
+    def __init__(self, root):
+        """Initializer.
+        Args:
+            root: Node whose subtree is tokenized.
+        """
+        super(TokenTable, self).__init__()
+        self.vocabulary = list()
+        self._vocabulary_IDs = dict()
+        self.ids = array("i")
+        self.starts = array("i")
+        self.ends = array("i")
+        self._ranges = dict()
+        self._add(root)
+
+    def _add(self, node):
+        begin = len(self.ids)
+        text = node.text
+        for (start, end) in _TOKENIZER.span_tokenize(text):
+            word = text[start:end]
+            ID = self._vocabulary_IDs.get(word, None)
+            if ID is None:
+                ID = len(self.vocabulary)
+                self._vocabulary_IDs[word] = ID
+                self.vocabulary.append(word)
+            self.ids.append(ID)
+            self.starts.append(start)
+            self.ends.append(end)
+        for c in node.children():
+            self._add(c)
+        # Nodes are alive as long as the tree (and thus this table) is
+        self._ranges[id(node)] = (begin, len(self.ids))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def span(self, node):
+        """Return:
+            (begin, end) tuple, the range of tokens of node and its
+            descendants (end exclusive).
+        Raises:
+            KeyError if node is not part of the tokenized tree.
+        """
+        return self._ranges[id(node)]
+
+    def words(self, begin=0, end=None):
+        """Return:
+            List of the words of a range of tokens.
+        """
+        if end is None:
+            end = len(self.ids)
+        vocabulary = self.vocabulary
+        return [vocabulary[i] for i in self.ids[begin:end]]
+
+    def word_count(self, node):
+        """Return:
+            Number of tokens of node and its descendants.
+        """
+        (begin, end) = self.span(node)
+        return end - begin
+
+
+
+if __name__ == '__main__':
+    print u"Test for %s" % __file__
+    from nltk import wordpunct_tokenize
+    from confopy.model.document import Document, Paragraph, Section
+
+    print u"  Testing TokenTable..."
+    para1 = Paragraph(text=u"Der Hase springt. Der Igel lacht!")
+    para2 = Paragraph(text=u"Über 3.5 Hasen, bitte...")
+    sec = Section(title=u"1. Foo", children=[para2])
+    doc = Document(children=[para1, sec])
+    table = TokenTable(doc)
+    expected = wordpunct_tokenize(para1.text) + wordpunct_tokenize(para2.text)
+    assert table.words() == expected
+    assert len(table) == len(expected)
+    assert len(table.vocabulary) == len(set(expected))
+    assert table.span(doc) == (0, len(expected))
+    assert table.span(sec) == table.span(para2)
+    assert table.words(*table.span(para2)) == wordpunct_tokenize(para2.text)
+    assert table.word_count(para1) == 8
+    assert [para1.text[s:e] for (s, e) in zip(table.starts, table.ends)[:3]] == [u"Der", u"Hase", u"springt"]
+
+    print u"Passed all tests!"
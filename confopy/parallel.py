@@ -0,0 +1,220 @@
+# coding: utf-8
+'''
+File: parallel.py
+Author: Oliver Zscheyge
+Description:
+    Distributes PDF extraction and metric evaluation of multiple
+    documents over worker processes (option --jobs).
+    Results are always returned in the order of the input.
+'''
+
+import multiprocessing
+
+import confopy.config as C
+
+# Page ranges of a single PDF handed to one worker have at least this
+# many pages (every worker parses the document structure again).
+MIN_PAGES_PER_TASK = 4
+
+_pool = None
+_pool_key = None
+
+
+def warm_up(lang=C.DEFAULT_LANG):
+    """Loads a language package including the taggers and sentence
+    tokenizers of its corpora.
+    Args:
+        lang: ISO 639-1 language code.
+    """
+    from confopy.analysis import Analyzer
+    from confopy.localization import load_language
+    load_language(lang)
+    analyzer = Analyzer.instance(lang)
+    for ID in sorted(analyzer.corpora().keys()):
+        corp = analyzer.get(corpus=ID)
+        corp.tagger()
+        corp.sent_tokenizer()
+
+def pool(jobs, lang=C.DEFAULT_LANG, warm=False):
+    """Yields the process pool for the given number of jobs.
+    With warm, each worker holds its own warmed up language package. The
+    language is warmed up before forking as well, so forked workers share
+    it. Pools for PDF extraction only don't load any corpus.
+    Args:
+        jobs: Number of worker processes.
+        lang: ISO 639-1 language code.
+        warm: Warm up the language package (for metric evaluation).
+    Return:
+        multiprocessing.Pool or None if jobs < 2.
+    """
+    global _pool, _pool_key
+    if jobs < 2:
+        return None
+    # A warm pool serves cold requests as well
+    if _pool is not None and (_pool_key[:2] != (jobs, lang) or (warm and not _pool_key[2])):
+        close()
+    if _pool is None:
+        if warm:
+            warm_up(lang)
+            _pool = multiprocessing.Pool(jobs, initializer=warm_up, initargs=(lang, ))
+        else:
+            _pool = multiprocessing.Pool(jobs)
+        _pool_key = (jobs, lang, warm)
+    return _pool
+
+def close():
+    """Shuts down the process pool (if any).
+    """
+    global _pool, _pool_key
+    if _pool is not None:
+        _pool.close()
+        _pool.join()
+    _pool = None
+    _pool_key = None
+
+def _map(func, items, jobs, lang, warm=False):
+    if jobs < 2 or len(items) < 2:
+        return map(func, items)
+    return pool(jobs, lang, warm).map(func, items, chunksize=1)
+
+
+def convert(filepaths, jobs=1, lang=C.DEFAULT_LANG):
+    """Converts PDF files to Documents.
+    With at least as many files as jobs, every worker converts whole
+    files. Otherwise the pages of each file are split into contiguous
+    ranges which are extracted in parallel and merged in page order.
+    Args:
+        filepaths: List of paths to PDF files.
+        jobs:      Number of worker processes.
+        lang:      ISO 639-1 language code.
+    Return:
+        List of Documents (same order as filepaths).
+    """
+    filepaths = list(filepaths)
+    if jobs < 2 or len(filepaths) >= jobs:
+        return _map(_convert, filepaths, jobs, lang)
+
+    from confopy.pdfextract.convenience import document_key
+    from confopy.pdfextract.document_cache import DocumentCache
+    from confopy.pdfextract.heuristics import HeuristicManager
+    from confopy.pdfextract.pdfminer_wrapper import PDFMinerWrapper
+    cache = DocumentCache.instance()
+    docs = dict()
+    for f in filepaths:
+        docs[f] = cache.get(document_key(f))
+    pdfminer = PDFMinerWrapper()
+    tasks = list()
+    for f in filepaths:
+        if docs[f] is None:
+            ranges = page_ranges(pdfminer.page_count(f), jobs)
+            tasks.extend([(f, start, end) for (start, end) in ranges])
+    chunks = _map(_pages, tasks, jobs, lang)
+    pages = dict([(f, list()) for f in filepaths])
+    for ((f, start, end), chunk) in zip(tasks, chunks):
+        pages[f].extend(chunk)
+    for f in filepaths:
+        if docs[f] is None:
+            docs[f] = HeuristicManager().generate_document(pages[f])
+            cache.put(document_key(f), docs[f])
+    return [docs[f] for f in filepaths]
+
+def page_ranges(page_count, parts, min_size=MIN_PAGES_PER_TASK):
+    """Splits pages into contiguous ranges of similar size.
+    Args:
+        page_count: Number of pages.
+        parts:      Maximum number of ranges.
+        min_size:   Minimum number of pages per range.
+    Return:
+        List of (start, end) tuples (0-based, end exclusive) covering all
+        pages in order.
+    """
+    parts = max(1, min(parts, page_count // max(1, min_size)))
+    size, rest = divmod(page_count, parts)
+    ranges = list()
+    start = 0
+    for i in range(parts):
+        end = start + size + (1 if i < rest else 0)
+        if end > start:
+            ranges.append((start, end))
+        start = end
+    return ranges
+
+def _convert(filepath):
+    from confopy.pdfextract import PDF2document
+    return PDF2document(filepath)
+
+def _pages(task):
+    from confopy.pdfextract.pdfminer_wrapper import Options, PDFMinerWrapper
+    (filepath, start, end) = task
+    options = Options()
+    options.pagenos = set(range(start, end))
+    options.maxpages = end
+    options.pageno = start + 1
+    return PDFMinerWrapper().pdf2pages(filepath, options)
+
+
+def evaluate(metrics, docs, jobs=1, lang=C.DEFAULT_LANG):
+    """Evaluates metrics on multiple documents.
+    Args:
+        metrics: List of Metrics.
+        docs:    List of Documents (or other Nodes).
+        jobs:    Number of worker processes.
+        lang:    ISO 639-1 language code of the metrics.
+    Return:
+        List (one per metric) of lists (one value per document).
+    """
+    from confopy.analysis.metric import evaluate_tree
+    if jobs < 2 or len(docs) < 2:
+        per_doc = [evaluate_tree(metrics, d)[d] for d in docs]
+    else:
+        IDs = [m.ID for m in metrics]
+        per_doc = _map(_evaluate, [(lang, IDs, d) for d in docs], jobs, lang, True)
+    return [[vals[i] for vals in per_doc] for i in range(len(metrics))]
+
+def _evaluate(task):
+    from confopy.analysis import Analyzer
+    from confopy.analysis.metric import evaluate_tree
+    (lang, IDs, doc) = task
+    analyzer = Analyzer.instance(lang)
+    return evaluate_tree([analyzer.get(metric=ID) for ID in IDs], doc)[doc]
+
+
+
+if __name__ == '__main__':
+    print u"Test for %s" % __file__
+    from confopy.analysis import Analyzer, Metric
+    from confopy.model import Paragraph
+
+    class _LengthMetric(Metric):
+        def __init__(self):
+            super(_LengthMetric, self).__init__(u"test-length", u"xx")
+        def evaluate(self, node):
+            return float(len(node.raw()))
+
+    Analyzer.register(_LengthMetric())
+    metrics = [Analyzer.instance(u"xx").get(metric=u"test-length")]
+    docs = [Paragraph(text=u"a" * i) for i in range(5)]
+
+    print u"  Testing page_ranges..."
+    assert page_ranges(0, 4) == []
+    assert page_ranges(3, 4) == [(0, 3)]
+    assert page_ranges(10, 2) == [(0, 5), (5, 10)]
+    assert page_ranges(10, 4, 1) == [(0, 3), (3, 6), (6, 8), (8, 10)]
+    assert page_ranges(9, 4) == [(0, 5), (5, 9)]
+
+    print u"  Testing evaluate..."
+    serial = evaluate(metrics, docs, 1, u"xx")
+    assert serial == [[0.0, 1.0, 2.0, 3.0, 4.0]]
+    assert evaluate(metrics, docs, 3, u"xx") == serial
+    assert evaluate([], docs, 3, u"xx") == []
+    close()
+
+    print u"  Testing pool warm-up..."
+    cold = pool(2, u"xx")
+    assert _pool_key == (2, u"xx", False)
+    warm = pool(2, u"xx", True)
+    assert warm is not cold and _pool_key == (2, u"xx", True)
+    assert pool(2, u"xx") is warm
+    close()
+
+    print u"Passed all tests!"
@@ -6,10 +6,8 @@ Description:
     Convenience functions for handling PDF conversions.
 '''
 
-from xml.dom.minidom import parseString
-
+from confopy.pdfextract.document_cache import DocumentCache
 from confopy.pdfextract.pdfminer_wrapper import PDFMinerWrapper
-from confopy.pdfextract.pdfminer_xml_bindings import DOM2pages
 from confopy.pdfextract.heuristics import HeuristicManager
 
 
@@ -19,17 +17,35 @@ def PDF2XMLstring(filepath):
 
 def PDF2pages(filepath):
     pdfminer = PDFMinerWrapper()
-    xml_str = pdfminer.pdf2xml(filepath)
-    dom = parseString(xml_str)
-    return DOM2pages(dom)
+    return pdfminer.pdf2pages(filepath)
 
-def PDF2document(filepath):
-    pdfminer = PDFMinerWrapper()
-    xml_str = pdfminer.pdf2xml(filepath)
-    dom = parseString(xml_str)
-    pages = DOM2pages(dom)
+def PDF2document(filepath, use_cache=True):
+    """Converts a PDF file to a Document.
+    Args:
+        filepath:  Path to the PDF file.
+        use_cache: Look up/store the Document in the DocumentCache.
+    Return:
+        Document.
+    """
     hm = HeuristicManager()
-    return hm.generate_document(pages)
+    cache = DocumentCache.instance()
+    key = None
+    if use_cache:
+        key = document_key(filepath, hm)
+        doc = cache.get(key)
+        if doc is not None:
+            return doc
+    pages = PDF2pages(filepath)
+    doc = hm.generate_document(pages)
+    if use_cache:
+        cache.put(key, doc)
+    return doc
+
+def document_key(filepath, hm=None):
+    """Key of a PDF file in the DocumentCache.
+    """
+    hm = hm or HeuristicManager()
+    return DocumentCache.instance().key(filepath, hm.settings())
 
 def PDFs2documents(filepaths):
     return map(PDF2document, filepaths)
@@ -0,0 +1,169 @@
+# coding: utf-8
+'''
+File: document_cache.py
+Author: Oliver Zscheyge
+Description:
+    On-disk cache of Documents extracted from PDF files.
+'''
+
+import hashlib
+import os
+import os.path as op
+import zlib
+from cPickle import UnpicklingError, dumps, loads
+
+import confopy
+import confopy.config as C
+from confopy.storage import atomic_file, cache_path, file_checksum
+
+
+class DocumentCache(object):
+    """Compressed, pickled Documents keyed by the SHA-256 of the PDF file,
+    the Confopy version and the heuristic settings.
+    The least recently used entries are evicted once the cache exceeds
+    max_bytes.
+    """
+
+    # Bump if the pickled representation of Documents changes
+    FORMAT = 2
+    DIR = u"documents"
+    SUFFIX = u".pkl.z"
+
+    _instance = None
+
+    @staticmethod
+    def instance():
+        """Yields the process wide DocumentCache.
+        """
+        if DocumentCache._instance is None:
+            DocumentCache._instance = DocumentCache()
+        return DocumentCache._instance
+
+    def __init__(self, directory=None, max_bytes=C.DOCUMENT_CACHE_SIZE):
+        """Initializer.
+        Args:
+            directory: Directory to keep the Documents in.
+                       Default: DIR in the Confopy cache directory.
+            max_bytes: Size limit of the cache. 0 disables the cache.
+        """
+        super(DocumentCache, self).__init__()
+        self._dir = directory
+        self.max_bytes = max_bytes
+
+    def _directory(self):
+        if self._dir is None:
+            self._dir = cache_path(DocumentCache.DIR)
+        if not op.isdir(self._dir):
+            os.makedirs(self._dir)
+        return self._dir
+
+    def key(self, filepath, settings=u""):
+        """Cache key of a PDF file.
+        Args:
+            filepath: Path to the PDF file.
+            settings: Fingerprint of the extraction settings
+                      (see HeuristicManager.settings).
+        Return:
+            Hex digest (unicode string).
+        """
+        sha = hashlib.sha256()
+        for part in [file_checksum(filepath), confopy.__version__, unicode(DocumentCache.FORMAT), settings]:
+            sha.update(part.encode(u"utf-8"))
+            sha.update("\x00")
+        return unicode(sha.hexdigest())
+
+    def _path(self, key):
+        return op.join(self._directory(), key + DocumentCache.SUFFIX)
+
+    def get(self, key):
+        """Looks up a cached Document.
+        Return:
+            Document or None on a cache miss (or if the cache directory
+            can't be created).
+        """
+        if self.max_bytes <= 0:
+            return None
+        try:
+            path = self._path(key)
+            with open(path, "rb") as f:
+                doc = loads(zlib.decompress(f.read()))
+            # Mark as recently used
+            os.utime(path, None)
+            return doc
+        except (IOError, OSError, EOFError, zlib.error, ValueError, UnpicklingError, AttributeError, ImportError):
+            return None
+
+    def put(self, key, doc):
+        """Stores a Document and evicts least recently used Documents if
+        the cache grew too large.
+        """
+        if self.max_bytes <= 0:
+            return
+        try:
+            with atomic_file(self._path(key)) as f:
+                f.write(zlib.compress(dumps(doc, -1)))
+            self._evict()
+        except (IOError, OSError):
+            pass
+
+    def _evict(self):
+        entries = list()
+        for name in os.listdir(self._directory()):
+            if name.endswith(DocumentCache.SUFFIX):
+                path = op.join(self._directory(), name)
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+        total = sum([size for (_, size, _) in entries])
+        for (_, size, path) in entries:
+            if total <= self.max_bytes:
+                break
+            os.remove(path)
+            total -= size
+
+
+if __name__ == '__main__':
+    print u"Test for %s" % __file__
+    import shutil
+    import tempfile
+    import time
+    from confopy.model import Document, Paragraph
+
+    print u"  Testing DocumentCache..."
+    directory = tempfile.mkdtemp()
+    (fd, pdf) = tempfile.mkstemp(dir=directory)
+    os.write(fd, "%PDF-1.4 fake")
+    os.close(fd)
+    cache = DocumentCache(op.join(directory, u"docs"), 1 << 20)
+    key = cache.key(pdf, u"settings")
+    assert key == cache.key(pdf, u"settings")
+    assert key != cache.key(pdf, u"other settings")
+    assert cache.get(key) is None
+    cache.put(key, Document(children=[Paragraph(u"Ein Absatz.")]))
+    doc = cache.get(key)
+    assert doc.raw().strip() == u"Ein Absatz."
+
+    print u"  Testing LRU eviction..."
+    cache.max_bytes = 2 * os.stat(cache._path(key)).st_size
+    cache.put(u"b", Document(children=[Paragraph(u"B")]))
+    past = time.time() - 60
+    os.utime(cache._path(u"b"), (past, past))
+    cache.put(u"c", Document(children=[Paragraph(u"C")]))
+    assert cache.get(u"b") is None
+    assert cache.get(key) is not None
+    assert cache.get(u"c") is not None
+
+    print u"  Testing uncreatable cache directory..."
+    # A directory below a regular file can't be created (not even by root)
+    cache = DocumentCache(op.join(pdf, u"docs"), 1 << 20)
+    cache.put(key, Document(children=[Paragraph(u"Ein Absatz.")]))
+    assert cache.get(key) is None
+    cache_dir = C.CACHE_DIR
+    C.CACHE_DIR = op.join(pdf, u"confopy")
+    cache = DocumentCache()
+    cache.put(key, Document(children=[Paragraph(u"Ein Absatz.")]))
+    assert cache.get(key) is None
+    C.CACHE_DIR = cache_dir
+    shutil.rmtree(directory)
+
+    print u"Passed all tests!"
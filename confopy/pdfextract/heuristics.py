@@ -11,7 +11,7 @@ import re
 
 from confopy.model.document import Node, Document, Section, Paragraph, Float, Footnote
 from confopy.model.document import DocumentChecker
-from confopy.model.lines import match, match_each, avg_word_length, lines2unicode, lines_using, words_using
+from confopy.model.lines import match_each, avg_word_length, lines2unicode, lines_using, words_using
 from confopy.pdfextract.pdfminer_xml_bindings import find_primary_font
 
 
@@ -40,6 +40,23 @@ class HeuristicRegExes(object):
 
     ERROR_SECTION_RELATION = -42
 
+    # Compiled once, matched against unicode text
+    PAGE_NR_RE        = re.compile(PAGE_NR, re.U)
+    SECTION_NR_RE     = re.compile(SECTION_NR, re.U)
+    LATEX_FOOTNOTE_RE = re.compile(LATEX_FOOTNOTE, re.U)
+    _SECTION_NR_ASCII = re.compile(SECTION_NR)
+
+    # Float captions in order of precedence. The name of each group is the
+    # TextBoxType of the caption.
+    FLOAT_CAPS = [(u"FIGURE",     FIGURE_CAP),
+                  (u"TABLE",      TABLE_CAP),
+                  (u"LISTING",    LISTING_CAP),
+                  (u"DEFINITION", DEFINITION_CAP),
+                  (u"FORMULA",    FORMULA_CAP),
+                  (u"THEOREM",    THEOREM_CAP),
+                  (u"PROOF",      PROOF_CAP)]
+    FLOAT_CAP_RE = re.compile(u"|".join([u"(?P<%s>%s)" % cap for cap in FLOAT_CAPS]), re.U)
+
     @staticmethod
     def compare_sections(a, b):
         """Gives the hierarchical relation of two section headings.
@@ -60,8 +77,8 @@ class HeuristicRegExes(object):
             1   if b is a subsection of a
             ERROR_SECTION_RELATION  error case
         """
-        match_a = re.match(HeuristicRegExes.SECTION_NR, a)
-        match_b = re.match(HeuristicRegExes.SECTION_NR, b)
+        match_a = HeuristicRegExes._SECTION_NR_ASCII.match(a)
+        match_b = HeuristicRegExes._SECTION_NR_ASCII.match(b)
         if match_a and match_b:
             number_a = a[:match_a.end()]
             number_b = b[:match_b.end()]
@@ -143,6 +160,15 @@ class HeuristicManager(object):
 
         self.heuristics.append(SimpleDocumentHeuristic())
 
+    def settings(self):
+        """Fingerprint of the heuristics in use (their classes and regular
+        expressions). Documents generated with different settings differ.
+        Return:
+            Unicode string.
+        """
+        regexes = sorted([(k, v) for (k, v) in vars(HeuristicRegExes).items() if k.isupper() and isinstance(v, basestring)])
+        return unicode(repr(([type(h).__name__ for h in self.heuristics], regexes)))
+
     def generate_document(self, dom_pages):
         hints = self._apply_heuristics(dom_pages)
         return self._build_document_hierarchy(dom_pages, hints)
@@ -273,60 +299,9 @@ class SimpleDocumentHeuristic(Heuristic):
         prim_font = find_primary_font(pages=pages)
         for page in pages:
             for tb in page.textboxes:
-
-                line_count = len(tb.lines)
-
-                # TOC, heading/page numbers and footnotes
-                if match_each(HeuristicRegExes.SECTION_NR, tb.lines):
-                    if line_count > 1:
-                        if (tb.word_count / float(line_count) > 1.0): # filter listing line numbering
-                            hints[tb] = TextBoxType.TOC_LIST
-                    else:
-                        if tb.word_count > 1:
-                            if match(HeuristicRegExes.LATEX_FOOTNOTE, tb.lines, True) and lines_using(tb.lines, tb.emph, True) == 0:
-                                hints[tb] = TextBoxType.FOOTNOTE
-                            else:
-                                hints[tb] = TextBoxType.HEADING
-                        else:
-                            hints[tb] = TextBoxType.PAGE_NR_OR_HEADING_PART
-                            #tb._print()
-                elif match(HeuristicRegExes.SECTION_NR, tb.lines, True):
-                    if match(HeuristicRegExes.LATEX_FOOTNOTE, tb.lines, True) and lines_using(tb.lines, tb.emph, True) == 0:
-                        hints[tb] = TextBoxType.FOOTNOTE
-                    else:
-                        hints[tb] = TextBoxType.HEADING
-
-                # Floating objects
-                if match(HeuristicRegExes.FIGURE_CAP, tb.lines, True):
-                    hints[tb] = TextBoxType.FIGURE
-                elif match(HeuristicRegExes.TABLE_CAP, tb.lines, True):
-                    hints[tb] = TextBoxType.TABLE
-                elif match(HeuristicRegExes.LISTING_CAP, tb.lines, True):
-                    hints[tb] = TextBoxType.LISTING
-                elif match(HeuristicRegExes.DEFINITION_CAP, tb.lines, True):
-                    hints[tb] = TextBoxType.DEFINITION
-                elif match(HeuristicRegExes.FORMULA_CAP, tb.lines, True):
-                    hints[tb] = TextBoxType.FORMULA
-                elif match(HeuristicRegExes.THEOREM_CAP, tb.lines, True):
-                    hints[tb] = TextBoxType.THEOREM
-                elif match(HeuristicRegExes.PROOF_CAP, tb.lines, True):
-                    hints[tb] = TextBoxType.PROOF
-
-                # Checks whether textbox is paragraph (main text content)
-                if tb.font[0] == prim_font[0] \
-                   and tb.font[1] == prim_font[1] \
-                   and avg_word_length(tb.lines) > 2 \
-                   and (line_count and (tb.word_count / float(line_count)) > 1.8) \
-                   and not (tb.word_count == 1 and match(HeuristicRegExes.PAGE_NR, tb.lines, True)) \
-                   and hints.get(tb, TextBoxType.NONE) != TextBoxType.FOOTNOTE:
-                    hints[tb] = TextBoxType.PARAGRAPH
-                    if match(HeuristicRegExes.SECTION_NR, tb.lines, True):
-                        heading_line_count = lines_using(tb.lines, tb.emph, True)
-                        if heading_line_count:
-                            hints[tb] = TextBoxType.PARAGRAPH_WITH_HEADING
-                        elif len(tb.emph) == 1 and words_using(tb.lines, tb.emph, True) == 1:
-                            # maybe add another condition: only if it's last textbox on page
-                            hints[tb] = TextBoxType.FOOTNOTE
+                kind = self.classify(tb, prim_font, hints.get(tb, TextBoxType.NONE))
+                if kind != TextBoxType.NONE:
+                    hints[tb] = kind
 
         # Layout (TextGroup) analysis
         layout_heu = SimpleLayoutHeuristic()
@@ -334,6 +309,63 @@ class SimpleDocumentHeuristic(Heuristic):
 
         return hints
 
+    def classify(self, tb, prim_font, kind=TextBoxType.NONE):
+        """Determines the type of a single TextBox.
+        The stripped text of the textbox is computed once and all regular
+        expressions are precompiled (float captions as one alternation).
+        Args:
+            tb:        TextBox.
+            prim_font: Primary (font, size) tuple of the document.
+            kind:      TextBoxType known so far.
+        Return:
+            TextBoxType (NONE if the textbox is of no particular type).
+        """
+        R = HeuristicRegExes
+        line_count = len(tb.lines)
+        text = lines2unicode(tb.lines, True)
+        section_nr = R.SECTION_NR_RE.match(text)
+
+        # TOC, heading/page numbers and footnotes
+        if match_each(R.SECTION_NR_RE, tb.lines):
+            if line_count > 1:
+                if (tb.word_count / float(line_count) > 1.0): # filter listing line numbering
+                    kind = TextBoxType.TOC_LIST
+            else:
+                if tb.word_count > 1:
+                    if R.LATEX_FOOTNOTE_RE.match(text) and lines_using(tb.lines, tb.emph, True) == 0:
+                        kind = TextBoxType.FOOTNOTE
+                    else:
+                        kind = TextBoxType.HEADING
+                else:
+                    kind = TextBoxType.PAGE_NR_OR_HEADING_PART
+        elif section_nr:
+            if R.LATEX_FOOTNOTE_RE.match(text) and lines_using(tb.lines, tb.emph, True) == 0:
+                kind = TextBoxType.FOOTNOTE
+            else:
+                kind = TextBoxType.HEADING
+
+        # Floating objects
+        caption = R.FLOAT_CAP_RE.match(text)
+        if caption:
+            kind = getattr(TextBoxType, caption.lastgroup)
+
+        # Checks whether textbox is paragraph (main text content)
+        if tb.font[0] == prim_font[0] \
+           and tb.font[1] == prim_font[1] \
+           and avg_word_length(tb.lines) > 2 \
+           and (line_count and (tb.word_count / float(line_count)) > 1.8) \
+           and not (tb.word_count == 1 and R.PAGE_NR_RE.match(text)) \
+           and kind != TextBoxType.FOOTNOTE:
+            kind = TextBoxType.PARAGRAPH
+            if section_nr:
+                heading_line_count = lines_using(tb.lines, tb.emph, True)
+                if heading_line_count:
+                    kind = TextBoxType.PARAGRAPH_WITH_HEADING
+                elif len(tb.emph) == 1 and words_using(tb.lines, tb.emph, True) == 1:
+                    # maybe add another condition: only if it's last textbox on page
+                    kind = TextBoxType.FOOTNOTE
+        return kind
+
 
 class SimpleLayoutHeuristic(Heuristic):
     """Analyses hierarchical TextBox grouping to identify headings.
@@ -404,3 +436,10 @@ if __name__ == '__main__':
     assert res2 is None
     assert res3 is None
 
+    captions = [(u"Abb. 3: Ein Hase", u"FIGURE"), (u"Tabelle 2.1 Werte", u"TABLE"),
+                (u"Source code 4", u"LISTING"), (u"Satz 1.2", u"THEOREM"),
+                (u"Beweis 7:", u"PROOF"), (u"Formel\xa012", u"FORMULA")]
+    for (caption, kind) in captions:
+        assert HeuristicRegExes.FLOAT_CAP_RE.match(caption).lastgroup == kind
+    assert HeuristicRegExes.FLOAT_CAP_RE.match(u"Abbildungen") is None
+
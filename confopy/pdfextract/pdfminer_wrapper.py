@@ -2,26 +2,19 @@
 # coding: utf-8
 
 import StringIO
-import re
 
 from pdfminer.pdfinterp import PDFResourceManager, process_pdf
+from pdfminer.pdfparser import PDFParser, PDFDocument
 from pdfminer.pdfdevice import PDFDevice
-from pdfminer.converter import XMLConverter, HTMLConverter, TextConverter
+from pdfminer.converter import PDFConverter, XMLConverter, HTMLConverter, TextConverter
 from pdfminer.layout import LAParams
 
 # For NoCidXMLConverter implementation:
 from pdfminer.layout import LTChar
 from pdfminer.pdffont import PDFUnicodeNotDefined
 
-
-RE_XML_ILLEGAL = u'([\u0000-\u0008\u000b-\u000c\u000e-\u001f\ufffe-\uffff])' + \
-                    u'|' + \
-                    u'([%s-%s][^%s-%s])|([^%s-%s][%s-%s])|([%s-%s]$)|(^[%s-%s])' % \
-                    (unichr(0xd800),unichr(0xdbff),unichr(0xdc00),unichr(0xdfff),
-                    unichr(0xd800),unichr(0xdbff),unichr(0xdc00),unichr(0xdfff),
-                    unichr(0xd800),unichr(0xdbff),unichr(0xdc00),unichr(0xdfff),
-                    )
-RE_XML_ILLEGAL_ASCII = r"[\x01-\x09\x0B\x0C\x0E-\x1F\x7F]"
+from confopy.pdfextract.pdfminer_xml_bindings import layout2page
+from confopy.pdfextract.xml_util import RE_XML_ILLEGAL, RE_XML_ILLEGAL_ASCII, strip_control_chars
 
 
 class Options:
@@ -37,15 +30,12 @@ class Options:
         self.showpageno = True
         self.laparams = LAParams()
 
-class NoCidXMLConverter(XMLConverter):
+class _NoCidRenderer(object):
     """
     Attempts to fix the (cid:<number>) errors produced by the original pdfminer implementation.
     See:
         http://stackoverflow.com/questions/16523767/what-is-this-cid51-in-the-output-of-pdf2txt
     """
-    def __init__(self, rsrcmgr, outfp, codec="utf-8", pageno=1, laparams=None, outdir=None):
-        super(NoCidXMLConverter, self).__init__(rsrcmgr, outfp, codec, pageno, laparams, outdir)
-
     def render_char(self, matrix, font, fontsize, scaling, rise, cid):
         try:
             text = font.to_unichr(cid)
@@ -62,6 +52,26 @@ class NoCidXMLConverter(XMLConverter):
         #print "Undefined: %r, %r" % (font, cid)
         return "(cid:%d)" % cid
 
+class NoCidXMLConverter(_NoCidRenderer, XMLConverter):
+    def __init__(self, rsrcmgr, outfp, codec="utf-8", pageno=1, laparams=None, outdir=None):
+        super(NoCidXMLConverter, self).__init__(rsrcmgr, outfp, codec, pageno, laparams, outdir)
+
+class PageConverter(_NoCidRenderer, PDFConverter):
+    """Converts the layout objects of each page directly to a Page
+    (no XML output). Yields the same Pages as converting the output of
+    NoCidXMLConverter with DOM2pages.
+    """
+    def __init__(self, rsrcmgr, callback, pageno=1, laparams=None):
+        """Initializer.
+        Args:
+            callback: Function called with each converted Page.
+        """
+        super(PageConverter, self).__init__(rsrcmgr, None, pageno=pageno, laparams=laparams)
+        self._callback = callback
+
+    def receive_layout(self, ltpage):
+        self._callback(layout2page(ltpage))
+
 class _PDFMiner:
     def __init__(self, options=Options()):
         self.options = options
@@ -78,6 +88,17 @@ class _PDFMiner:
                    , check_extractable=True
                    )
 
+    def page_count(self, fp):
+        parser = PDFParser(fp)
+        doc = PDFDocument(caching=self.options.caching)
+        parser.set_document(doc)
+        doc.set_parser(parser)
+        doc.initialize(self.options.password)
+        count = 0
+        for page in doc.get_pages():
+            count += 1
+        return count
+
     def to_txt(self, fp):
         out_buf = StringIO.StringIO()
         device = TextConverter( self.resmgr
@@ -121,19 +142,33 @@ class _PDFMiner:
         out_buf.close()
         return self._replace_control_chars(result)
 
+    def to_pages(self, fp, callback=None):
+        """Converts a PDF to Pages straight from pdfminer's layout objects
+        (no XML serialization and parsing).
+        Args:
+            fp:       PDF file object.
+            callback: Function called with each Page. Optional.
+        Return:
+            List of Pages (empty if a callback was given).
+            Page IDs start at options.pageno.
+        """
+        pages = list()
+        device = PageConverter( self.resmgr
+                              , callback or pages.append
+                              , pageno=self.options.pageno
+                              , laparams=self.options.laparams
+                              )
+        self._process(fp, device)
+        device.close()
+        return pages
+
     def _replace_control_chars(self, s, replace=u""):
         """Stolen from:
         http://chase-seibert.github.io/blog/2011/05/20/stripping-control-characters-in-python.html
         """
         if s:
             s = s.decode("utf-8")
-            # unicode invalid characters
-            s = re.sub(RE_XML_ILLEGAL, replace, s)
-
-            # ascii control characters
-            #s = re.sub(r"[\x01-\x1F\x7F]", replace, s)
-            s = re.sub(RE_XML_ILLEGAL_ASCII, replace, s)
-
+            s = strip_control_chars(s, replace)
             s = s.encode("utf-8")
             return s
 
@@ -164,3 +199,26 @@ class PDFMinerWrapper:
             result = conv.to_xml(fp)
         return result
 
+    def page_count(self, filename, options=Options()):
+        result = 0
+        with open(filename, "rb") as fp:
+            conv = _PDFMiner(options)
+            result = conv.page_count(fp)
+        return result
+
+    def pdf2pages(self, filename, options=Options(), callback=None):
+        """Converts a PDF file to Pages, one page at a time.
+        Args:
+            filename: Path to the PDF file.
+            options:  Options.
+            callback: Function called with each Page as soon as it is
+                      converted. Optional.
+        Return:
+            List of Pages (empty if a callback was given).
+        """
+        result = list()
+        with open(filename, "rb") as fp:
+            conv = _PDFMiner(options)
+            result = conv.to_pages(fp, callback)
+        return result
+
@@ -7,7 +7,11 @@ proper Python objects.
 import operator
 import unicodedata
 
+from pdfminer.layout import LTChar, LTText, LTTextBox, LTTextGroup, LTTextLine
+from pdfminer.utils import bbox2str
+
 from confopy.pdfextract import xml_util
+from confopy.pdfextract.xml_util import strip_control_chars
 
 # Constants
 
@@ -143,6 +147,10 @@ class Page(Box):
         for tb in textboxes:
             self._textboxes_by_ID[tb.ID] = tb
         self.layout = layout
+        # TextBox ID --> TextGroup containing the TextBox
+        self._textgroups_by_ID = dict()
+        if layout:
+            self._index_textgroups(layout)
         self.prim_font = find_primary_font(textboxes=textboxes)
         self.word_count = reduce(operator.add, map(lambda tb: tb.word_count, textboxes), 0)
         #print unicode(self).encode("utf-8")
@@ -185,11 +193,13 @@ class Page(Box):
         """Gets the TextGroup that contains the passed TextBox.
         Args:
             tb: TextBox for which the TextGroup should be returned.
-            group: TextGroup for recursion.
+            group: TextGroup to search in (default: the whole layout,
+                   looked up in the index built by the constructor).
         Return:
             TextGroup
         """
-        group = group or self.layout
+        if group is None or group is self.layout:
+            return self._textgroups_by_ID.get(tb.ID, None)
         if group:
             for c in group.children:
                 if isinstance(c, TextBox):
@@ -201,6 +211,14 @@ class Page(Box):
                         return rec
         return None
 
+    def _index_textgroups(self, group):
+        # First TextGroup in preorder wins (as in the recursive lookup)
+        for c in group.children:
+            if isinstance(c, TextBox):
+                self._textgroups_by_ID.setdefault(c.ID, group)
+            elif isinstance(c, TextGroup):
+                self._index_textgroups(c)
+
 
     def as_svg(self):
         svg = [SVG_HEADER]
@@ -247,14 +265,14 @@ class TextGroup(Box):
         super(TextGroup, self).__init__(bbox)
         self.parent = None
         self.children = list(children)
+        self._child_IDs = set()
         for c in self.children:
             c.parent = self
+            if isinstance(c, TextBox):
+                self._child_IDs.add(c.ID)
 
     def has_child(self, tb):
-        for c in self.children:
-            if isinstance(c, TextBox) and c.ID == tb.ID:
-                return True
-        return False
+        return tb.ID in self._child_IDs
 
     def as_svg(self):
         import random
@@ -318,22 +336,49 @@ def DOM2textline(dom_textline):
     The second entry is a list of strings marking highlighted words in
     the textline.
     """
-    dom_letters = dom_textline.getElementsByTagName("text")
+    def letters():
+        for dom_letter in dom_textline.getElementsByTagName("text"):
+            letter = u""
+            if dom_letter.firstChild:
+                letter = dom_letter.firstChild.nodeValue
+            yield (letter, dom_letter.hasAttributes(), dom_letter.getAttribute("font"), dom_letter.getAttribute("size"))
+    return _textline(letters())
+
+def layout2textline(ltline):
+    """Like DOM2textline, but for a pdfminer LTTextLine.
+    Characters are normalized the way the XML round trip did (characters
+    illegal in XML removed, carriage returns converted to newlines).
+    """
+    def clean(text):
+        return strip_control_chars(text).replace(u"\r\n", u"\n").replace(u"\r", u"\n")
+    def letters():
+        for item in ltline:
+            if isinstance(item, LTChar):
+                yield (clean(item.get_text()), True, strip_control_chars(unicode(item.fontname)), u"%.3f" % item.size)
+            elif isinstance(item, LTText):
+                yield (clean(item.get_text()), False, u"", u"")
+    return _textline(letters())
+
+def _textline(letters):
+    """Helper function for DOM2textline and layout2textline.
+    Args:
+        letters: Iterable of (text, has attributes, font, size) tuples,
+                 one per text element of the textline.
+    Return:
+        Tuple of textline string, list of fonts and list of sizes (one
+        per character).
+    """
     emph = list()
-    letters = list()
+    letters_buf = list()
     fonts = list()
     sizes = list()
     font = u""
     size = u""
     next_letter_uml = False
-    for dom_letter in dom_letters:
-        letter = u""
-        if dom_letter.firstChild:
-            letter = dom_letter.firstChild.nodeValue
-
-        if dom_letter.hasAttributes() or letter.strip() != "":
-            font = unicode(dom_letter.getAttribute("font"))
-            size = unicode(dom_letter.getAttribute("size"))
+    for (letter, has_attrs, letter_font, letter_size) in letters:
+        if has_attrs or letter.strip() != "":
+            font = unicode(letter_font)
+            size = unicode(letter_size)
             #if re.match(PDFMINER_CID, letter):
             #    print "FOUND CID: %s" % letter
             letter = _escape_pdfminer_cid(letter)
@@ -344,14 +389,14 @@ def DOM2textline(dom_textline):
                     letter = _convert2uml(letter)
                     next_letter_uml = False
                 for c in letter:
-                    letters.append(unicode(c))
+                    letters_buf.append(unicode(c))
                     fonts.append(font)
                     sizes.append(size)
         else:
-            letters.append(u" ")
+            letters_buf.append(u" ")
             fonts.append(font)
             sizes.append(size)
-    line = u"".join(letters)
+    line = u"".join(letters_buf)
     #emph = find_emphasis(line, fonts, sizes)
     return (line, fonts, sizes)
 
@@ -376,7 +421,23 @@ def DOM2textbox(dom_textbox):
     ID = unicode(dom_textbox.getAttribute("id"))
     bbox = str2bbox(dom_textbox.getAttribute("bbox"))
     dom_lines = dom_textbox.getElementsByTagName("textline")
-    lines_fonts_sizes = map(DOM2textline, dom_lines)
+    return _textbox(ID, bbox, map(DOM2textline, dom_lines))
+
+def layout2textbox(ltbox, with_lines=True):
+    """Like DOM2textbox, but for a pdfminer LTTextBox.
+    Args:
+        with_lines: False for the (empty) textboxes of the page layout.
+    """
+    ID = u"%d" % ltbox.index
+    bbox = str2bbox(bbox2str(ltbox.bbox))
+    lines = list()
+    if with_lines:
+        lines = [layout2textline(item) for item in ltbox if isinstance(item, LTTextLine)]
+    return _textbox(ID, bbox, lines)
+
+def _textbox(ID, bbox, lines_fonts_sizes):
+    """Helper function for DOM2textbox and layout2textbox.
+    """
     lines = map(lambda t: t[0], lines_fonts_sizes)
     fonts = map(lambda t: t[1], lines_fonts_sizes)
     sizes = map(lambda t: t[2], lines_fonts_sizes)
@@ -480,6 +541,12 @@ def DOM2textgroup(dom_textgroup):
                   , xml_util.getChildElementsByTagName(dom_textgroup, "textgroup"))
     return TextGroup(bbox, textboxes + children)
 
+def layout2textgroup(ltgroup):
+    bbox = str2bbox(bbox2str(ltgroup.bbox))
+    textboxes = [layout2textbox(c, False) for c in ltgroup if isinstance(c, LTTextBox)]
+    children = [layout2textgroup(c) for c in ltgroup if isinstance(c, LTTextGroup)]
+    return TextGroup(bbox, textboxes + children)
+
 
 def DOM2page(dom_page):
     page_id = unicode(dom_page.getAttribute("id"))
@@ -499,6 +566,23 @@ def DOM2page(dom_page):
 
     return Page(page_id, page_bbox, textboxes, layout)
 
+def layout2page(ltpage):
+    """Converts a pdfminer LTPage to a Page.
+    Counterpart of DOM2page without the XML round trip (see
+    pdfminer_wrapper.PageConverter).
+    """
+    page_id = unicode(ltpage.pageid)
+    page_bbox = str2bbox(bbox2str(ltpage.bbox))
+    textboxes = [layout2textbox(item) for item in ltpage if isinstance(item, LTTextBox)]
+
+    layout = None
+    if ltpage.groups is not None:
+        textgroups = [g for g in ltpage.groups if isinstance(g, LTTextGroup)]
+        if len(textgroups):
+            layout = layout2textgroup(textgroups[0])
+
+    return Page(page_id, page_bbox, textboxes, layout)
+
 
 ## Analysis functions
 
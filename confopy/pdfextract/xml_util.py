@@ -1,8 +1,30 @@
 # coding: utf-8
 
+import re
 from xml.dom import Node
 import xml.sax.saxutils as SU
 
+RE_XML_ILLEGAL = u'([\u0000-\u0008\u000b-\u000c\u000e-\u001f\ufffe-\uffff])' + \
+                    u'|' + \
+                    u'([%s-%s][^%s-%s])|([^%s-%s][%s-%s])|([%s-%s]$)|(^[%s-%s])' % \
+                    (unichr(0xd800),unichr(0xdbff),unichr(0xdc00),unichr(0xdfff),
+                    unichr(0xd800),unichr(0xdbff),unichr(0xdc00),unichr(0xdfff),
+                    unichr(0xd800),unichr(0xdbff),unichr(0xdc00),unichr(0xdfff),
+                    )
+RE_XML_ILLEGAL_ASCII = r"[\x01-\x09\x0B\x0C\x0E-\x1F\x7F]"
+
+
+def strip_control_chars(s, replace=u""):
+    """Removes characters that are illegal in XML from a unicode string.
+    Stolen from:
+    http://chase-seibert.github.io/blog/2011/05/20/stripping-control-characters-in-python.html
+    """
+    # unicode invalid characters
+    s = re.sub(RE_XML_ILLEGAL, replace, s)
+    # ascii control characters
+    #s = re.sub(r"[\x01-\x1F\x7F]", replace, s)
+    return re.sub(RE_XML_ILLEGAL_ASCII, replace, s)
+
 def getChildElementsByTagName(node, tagName):
     children = node.childNodes
     elems = list()
@@ -0,0 +1,289 @@
+# coding: utf-8
+'''
+File: storage.py
+Author: Oliver Zscheyge
+Description:
+    Helpers for files Confopy keeps in its cache directory.
+'''
+
+import hashlib
+import json
+import os
+import os.path as op
+import sys
+from contextlib import contextmanager
+from cPickle import UnpicklingError, dumps, loads
+
+import confopy
+import confopy.config as C
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+CHECKSUMS_FILE = u"checksums.json"
+_BLOCK_SIZE = 1 << 20
+
+
+def cache_path(name):
+    """Path of a file in the cache directory.
+    Creates the cache directory if necessary.
+    Args:
+        name: File name.
+    Return:
+        Unicode string.
+    """
+    if not op.isdir(C.CACHE_DIR):
+        os.makedirs(C.CACHE_DIR)
+    return op.join(C.CACHE_DIR, name)
+
+@contextmanager
+def atomic_file(path):
+    """Opens a temporary file for writing which is renamed to path once
+    the with block is left without errors.
+    Readers never see half written files.
+    Args:
+        path: Target file path.
+    """
+    tmp_path = u"%s.%d.tmp" % (path, os.getpid())
+    try:
+        with open(tmp_path, "wb") as f:
+            yield f
+        os.rename(tmp_path, path)
+    finally:
+        if op.exists(tmp_path):
+            os.remove(tmp_path)
+
+@contextmanager
+def file_lock(path):
+    """Holds an exclusive lock on path (created if missing) while the with
+    block runs. Other processes wait until the lock is released.
+    Without fcntl (e.g. on Windows) nothing is locked.
+    Args:
+        path: Path of the lock file.
+    """
+    if fcntl is None:
+        yield
+        return
+    with open(path, "ab") as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+def write_atomic(path, data):
+    """Writes data to path using atomic_file.
+    Args:
+        path: Target file path.
+        data: Byte string to write.
+    """
+    with atomic_file(path) as f:
+        f.write(data)
+
+_checksums = None
+def file_checksum(path):
+    """SHA-256 hex digest of a file.
+    Digests of large files (e.g. corpora) are remembered together with
+    the file's size and modification time in CHECKSUMS_FILE, so unchanged
+    files are only hashed once.
+    Args:
+        path: Path of the file to hash.
+    Return:
+        Hex digest (unicode string).
+    """
+    global _checksums
+    path = op.realpath(path)
+    stat = os.stat(path)
+    if _checksums is None:
+        try:
+            with open(cache_path(CHECKSUMS_FILE), "rb") as f:
+                _checksums = json.load(f)
+        except (IOError, OSError, ValueError):
+            _checksums = dict()
+    known = _checksums.get(path, None)
+    if known is not None and known[0] == stat.st_size and known[1] == stat.st_mtime:
+        return known[2]
+
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        block = f.read(_BLOCK_SIZE)
+        while block:
+            sha.update(block)
+            block = f.read(_BLOCK_SIZE)
+    digest = unicode(sha.hexdigest())
+    _checksums[path] = [stat.st_size, stat.st_mtime, digest]
+    try:
+        write_atomic(cache_path(CHECKSUMS_FILE), json.dumps(_checksums))
+    except (IOError, OSError):
+        pass
+    return digest
+
+
+def load_pickle(path):
+    """Return:
+        The unpickled content of path.
+    """
+    with open(path, "rb") as f:
+        return loads(f.read())
+
+def save_pickle(obj, path):
+    """Pickles obj to path using write_atomic.
+    """
+    write_atomic(path, dumps(obj, -1))
+
+
+class ArtifactStore(object):
+    """Files derived from expensive computations, e.g. taggers trained on a
+    corpus. An artifact is keyed by its name, the checksum of its source
+    (e.g. the corpus file), its version and the Confopy version, so a
+    changed source or code leads to a new file instead of a stale one.
+    Building an artifact is guarded by a file lock: concurrent processes
+    wait for the first one and load its result.
+    """
+
+    DIR = u"artifacts"
+
+    _instance = None
+
+    @staticmethod
+    def instance():
+        """Yields the process wide ArtifactStore.
+        """
+        if ArtifactStore._instance is None:
+            ArtifactStore._instance = ArtifactStore()
+        return ArtifactStore._instance
+
+    def __init__(self, directory=None):
+        """Initializer.
+        Args:
+            directory: Directory to keep the artifacts in.
+                       Default: DIR in the Confopy cache directory.
+        """
+        super(ArtifactStore, self).__init__()
+        self._dir = directory
+
+    def _directory(self):
+        if self._dir is None:
+            self._dir = cache_path(ArtifactStore.DIR)
+        if not op.isdir(self._dir):
+            os.makedirs(self._dir)
+        return self._dir
+
+    def path(self, name, checksum, version, suffix=u".pkl"):
+        """Path of an artifact.
+        Args:
+            name:     Name of the artifact (e.g. u"tiger_tagger").
+            checksum: Checksum of the source the artifact is built from.
+            version:  Version of the artifact, anything convertible to
+                      unicode. Change it whenever the build changes.
+            suffix:   File extension.
+        Return:
+            Unicode string.
+        """
+        sha = hashlib.sha256()
+        for part in [checksum, unicode(version), confopy.__version__]:
+            sha.update(part.encode(u"utf-8"))
+            sha.update("\x00")
+        return op.join(self._directory(), u"%s-%s%s" % (name, sha.hexdigest()[:16], suffix))
+
+    def get(self, name, checksum, version, build, load=load_pickle, save=save_pickle, suffix=u".pkl"):
+        """Loads an artifact or builds and stores it if it doesn't exist yet.
+        Args:
+            name, checksum, version, suffix: See path().
+            build: Function creating the artifact.
+            load:  Function path --> artifact. May return None for files
+                   it can't use.
+            save:  Function (artifact, path) writing the artifact
+                   atomically (e.g. via atomic_file).
+        Return:
+            The artifact. If it can't be stored, it is built anyway.
+        Raises:
+            Whatever build raises.
+        """
+        try:
+            path = self.path(name, checksum, version, suffix)
+        except (IOError, OSError) as e:
+            sys.stderr.write(u"Could not create artifact directory: %s\n" % e)
+            return build()
+        artifact = self._load(load, path)
+        if artifact is not None:
+            return artifact
+        building = False
+        try:
+            with file_lock(path + u".lock"):
+                # Another process may have built it while we were waiting
+                artifact = self._load(load, path)
+                if artifact is None:
+                    building = True
+                    artifact = build()
+                    building = False
+                    save(artifact, path)
+        except (IOError, OSError) as e:
+            if building:
+                # The build itself failed, building again won't help
+                raise
+            sys.stderr.write(u"Could not store artifact %s: %s\n" % (path, e))
+            if artifact is None:
+                artifact = build()
+        return artifact
+
+    def _load(self, load, path):
+        if not op.exists(path):
+            return None
+        try:
+            return load(path)
+        except (IOError, OSError, EOFError, ValueError, UnpicklingError, AttributeError, ImportError):
+            return None
+
+
+
+if __name__ == '__main__':
+    print u"Test for %s" % __file__
+    import shutil
+    import tempfile
+
+    print u"  Testing file_checksum..."
+    directory = tempfile.mkdtemp()
+    C.CACHE_DIR = op.join(directory, u"cache")
+    (fd, source) = tempfile.mkstemp(dir=directory)
+    os.write(fd, "corpus")
+    os.close(fd)
+    checksum = file_checksum(source)
+    assert checksum == hashlib.sha256("corpus").hexdigest()
+    assert file_checksum(source) == checksum
+
+    print u"  Testing ArtifactStore..."
+    store = ArtifactStore()
+    builds = list()
+    def build():
+        builds.append(1)
+        return {u"model": len(builds)}
+    assert store.get(u"test", checksum, 1, build) == {u"model": 1}
+    assert store.get(u"test", checksum, 1, build) == {u"model": 1}
+    assert len(builds) == 1
+    assert store.get(u"test", checksum, 2, build) == {u"model": 2}
+    assert store.path(u"test", checksum, 1) != store.path(u"test", u"other", 1)
+    assert op.dirname(store.path(u"test", checksum, 1)) == op.join(C.CACHE_DIR, ArtifactStore.DIR)
+
+    print u"  Testing unusable artifacts..."
+    with open(store.path(u"test", checksum, 1), "wb") as f:
+        f.write("garbage")
+    assert store.get(u"test", checksum, 1, build) == {u"model": 3}
+    assert store.get(u"test", checksum, 1, build, load=lambda path: None) == {u"model": 4}
+    def failing_save(artifact, path):
+        raise IOError(u"read-only")
+    assert store.get(u"test", checksum, 3, build, save=failing_save) == {u"model": 5}
+    def failing_build():
+        builds.append(1)
+        raise IOError(u"corpus missing")
+    try:
+        store.get(u"test", checksum, 4, failing_build)
+        assert False, u"Build error swallowed!"
+    except IOError:
+        pass
+    assert len(builds) == 6
+    shutil.rmtree(directory)
+
+    print u"Passed all tests!"
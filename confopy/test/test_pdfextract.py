@@ -2,8 +2,10 @@
 # coding: utf-8
 
 import unittest
+from xml.dom.minidom import parseString
 
 from confopy.pdfextract.pdfminer_wrapper import *
+from confopy.pdfextract.pdfminer_xml_bindings import DOM2pages, Page, TextBox, TextGroup
 
 TEST_FILE = "./confopy/test/data/test_doc.pdf"
 
@@ -22,6 +24,54 @@ This is a test PDF document. \
 """.strip()
         self.assertEqual(result, expected)
 
+    def test_pdf2pages(self):
+        """ Direct layout conversion yields the same pages as the XML/DOM based one. """
+        w = PDFMinerWrapper()
+        expected = DOM2pages(parseString(w.pdf2xml(TEST_FILE)))
+        result = w.pdf2pages(TEST_FILE)
+        self.assertEqual(map(_page_tuple, result), map(_page_tuple, expected))
+        streamed = list()
+        self.assertEqual(w.pdf2pages(TEST_FILE, callback=streamed.append), [])
+        self.assertEqual(map(_page_tuple, streamed), map(_page_tuple, expected))
+
+    def test_page_range(self):
+        """ Page ranges keep the page numbers of the document. """
+        w = PDFMinerWrapper()
+        self.assertEqual(w.page_count(TEST_FILE), 1)
+        options = Options()
+        options.pagenos = set([0])
+        options.pageno = 1
+        pages = w.pdf2pages(TEST_FILE, options)
+        self.assertEqual([p.ID for p in pages], [u"1"])
+        self.assertEqual(map(_page_tuple, pages), map(_page_tuple, w.pdf2pages(TEST_FILE)))
+
+    def test_textgroup_index(self):
+        """ Sibling lookups use the layout index of a page. """
+        def box(ID):
+            return TextBox(ID, [0, 0, 1, 1], [u"x"], (u"Font", u"10.000"), [])
+        boxes = [box(u"%d" % i) for i in range(5)]
+        inner = TextGroup([0, 0, 1, 1], [box(u"1"), box(u"2")])
+        layout = TextGroup([0, 0, 1, 1], [box(u"0"), inner, box(u"3"), box(u"1")])
+        page = Page(u"1", [0, 0, 1, 1], boxes, layout)
+        self.assertTrue(page.get_textgroup(boxes[0]) is layout)
+        self.assertTrue(page.get_textgroup(boxes[1]) is inner)
+        self.assertTrue(page.get_textgroup(boxes[4]) is None)
+        self.assertTrue(page.get_textgroup(boxes[3], inner) is None)
+        self.assertTrue(page.is_sibling(boxes[1], boxes[2]))
+        self.assertTrue(page.is_sibling(boxes[1], boxes[2], boxes[3]))
+        self.assertFalse(page.is_sibling(boxes[1], boxes[2], boxes[4]))
+        self.assertFalse(page.is_sibling(boxes[0], boxes[2]))
+        self.assertTrue(Page(u"2", [0, 0, 1, 1], boxes).get_textgroup(boxes[0]) is None)
+
+def _page_tuple(page):
+    def box_tuple(box):
+        if box is None:
+            return None
+        if isinstance(box, TextBox):
+            return (box.ID, box.bbox, box.lines, box.font, sorted(box.emph))
+        return (box.bbox, map(box_tuple, box.children))
+    return (page.ID, page.bbox, map(box_tuple, page.textboxes), box_tuple(page.layout))
+
 if __name__ == "__main__":
     unittest.main()
 
@@ -0,0 +1,81 @@
+# coding: utf-8
+'''
+File: timing.py
+Author: Oliver Zscheyge
+Description:
+    Optional wall clock breakdown of a Confopy run (option --timing).
+'''
+
+import time
+from contextlib import contextmanager
+
+_enabled = False
+_start = time.time()
+_records = list()
+
+
+def enable():
+    """Starts recording timings.
+    The time since this module was imported (i.e. importing Confopy and
+    parsing the command line) is recorded as "startup".
+    """
+    global _enabled
+    _enabled = True
+    del _records[:]
+    _records.append((u"startup", time.time() - _start))
+
+def enabled():
+    return _enabled
+
+@contextmanager
+def timed(label):
+    """Records the time spent in a with block under the given label.
+    Does nothing unless enable() was called.
+    Args:
+        label: Unicode string describing the timed step.
+    """
+    if not _enabled:
+        yield
+        return
+    start = time.time()
+    try:
+        yield
+    finally:
+        _records.append((label, time.time() - start))
+
+def records():
+    """Return:
+        List of (label, seconds) tuples in the order the steps finished.
+    """
+    return list(_records)
+
+def summary():
+    """Pretty formatted timing breakdown.
+    Return:
+        A unicode string.
+    """
+    buf = [u"Timing:"]
+    width = reduce(max, [len(label) for (label, _) in _records], len(u"total")) + 2
+    for (label, seconds) in _records:
+        buf.append(u"  %s%8.3f s" % (label.ljust(width), seconds))
+    buf.append(u"  %s%8.3f s" % (u"total".ljust(width), time.time() - _start))
+    return u"\n".join(buf)
+
+
+if __name__ == '__main__':
+    print u"Test for %s" % __file__
+
+    print u"  Testing timed..."
+    with timed(u"disabled"):
+        pass
+    assert records() == []
+    enable()
+    with timed(u"step"):
+        pass
+    assert [label for (label, _) in records()] == [u"startup", u"step"]
+    lines = summary().split(u"\n")
+    assert lines[0] == u"Timing:"
+    assert lines[2].startswith(u"  step")
+    assert lines[3].startswith(u"  total")
+
+    print u"Passed all tests!"
@@ -2,13 +2,31 @@
 
 export PYTHONPATH=$PYTHONPATH:./:confopy/
 
+python confopy/parallel.py
+python confopy/storage.py
+python confopy/timing.py
+
 python confopy/model/lines.py
 python confopy/model/document.py
 python confopy/model/document_converter.py
+python confopy/model/tokens.py
 
 python confopy/analysis/analyzer.py
+python confopy/analysis/compiled_tagger.py
+python confopy/analysis/context.py
+python confopy/analysis/lexicon.py
+python confopy/analysis/lookup.py
+python confopy/analysis/metric.py
+python confopy/analysis/mmapstore.py
+python confopy/analysis/reference.py
+python confopy/analysis/results.py
 python confopy/analysis/rule.py
 python confopy/analysis/spellcheck.py
 python confopy/analysis/statistics.py
+python confopy/analysis/tagging.py
+
+python confopy/localization/de/corpus_de/tiger_compiled.py
+
+python confopy/pdfextract/document_cache.py
 
 python confopy/test/test_pdfextract.py
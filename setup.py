@@ -1,4 +1,5 @@
 import os
+import re
 import sys
 
 try:
@@ -12,9 +13,14 @@ if sys.argv[-1] == 'publish':
     os.system('python setup.py sdist upload')
     sys.exit()
 
+# confopy/__init__.py holds the version, it isn't imported here because
+# that requires the dependencies to be installed already
+with open(os.path.join("confopy", "__init__.py")) as f:
+    version = re.search(r"__version__ = u?[\"']([^\"']+)[\"']", f.read()).group(1)
+
 setup(
     name="Confopy",
-    version="0.4.11",
+    version=version,
     url="https://github.com/ooz/Confopy",
     author="Oliver Zscheyge",
     author_email="oliverzscheyge@gmail.com",